@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+beautify_markdown 吞吐量基准
+
+用 corpus.py 生成一份固定随机种子的大型 markdown 文档（标题、列表、步骤、
+代码块、图片、多余空行和行尾空格混合），多次运行 beautify_markdown，按中位数计算 MB/s。
+测量前先用 EQUIVALENCE_FIXTURES 检查输出与旧的正则美化规则一致。输出不一致或
+中位数低于 BEAUTIFY_TARGET_MBPS 时以退出码 1 结束。
+
+用法:
+    python bench_beautify.py [--size-mb 20] [--repeat 5] [--target MB/s]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from corpus import generate_document  # noqa: E402
+from organize_markdown import BEAUTIFY_TARGET_MBPS, beautify_markdown  # noqa: E402
+
+# (输入, 旧的正则美化规则的输出)：文档开头和末尾的空行、只含空白的行、列表标记
+EQUIVALENCE_FIXTURES = [
+    ("text\n# H\n\n\n", "text\n\n# H\n\n"),
+    ("\n\n\n# H", "\n\n# H"),
+    ("text\n   \n\n# H", "text\n\n\n# H"),
+    ("a\n \n\n\nb", "a\n\n\nb"),
+    ("a\n\t\n \nb", "a\n\n\nb"),
+    ("a\n \n\n\n", "a\n\n\n"),
+    ("# H\ntext\n* one\n+ two\n", "# H\n\ntext\n- one\n- two\n"),
+    ("a\n\n\n\nb  \n", "a\n\nb\n"),
+]
+
+
+def check_equivalence() -> list[str]:
+    """返回输出与预期不一致的用例说明"""
+    failures = []
+    for source, expected in EQUIVALENCE_FIXTURES:
+        actual = beautify_markdown(source)
+        if actual != expected:
+            failures.append(f"{source!r}: 期望 {expected!r}，实际 {actual!r}")
+    return failures
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="beautify_markdown 吞吐量基准")
+    parser.add_argument("--size-mb", type=float, default=20.0, help="文档大小（MB）")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子")
+    parser.add_argument(
+        "--target",
+        type=float,
+        default=BEAUTIFY_TARGET_MBPS,
+        help=f"吞吐量目标 MB/s（默认 {BEAUTIFY_TARGET_MBPS:g}）",
+    )
+    args = parser.parse_args()
+
+    failures = check_equivalence()
+    if failures:
+        print("❌ 输出与旧规则不一致:")
+        for line in failures:
+            print(f"  - {line}")
+        sys.exit(1)
+    print(f"✅ {len(EQUIVALENCE_FIXTURES)} 个等价性用例通过")
+
+    content = generate_document(
+        int(args.size_mb * 1024 * 1024), images=200, code_density=0.1, seed=args.seed
+    )
+    size_mb = len(content.encode("utf-8")) / (1024 * 1024)
+    print(f"📄 文档大小: {size_mb:.1f} MB，{content.count(chr(10))} 行")
+
+    # 预热一次，排除首次分配的影响
+    beautify_markdown(content)
+
+    rates = []
+    for i in range(max(1, args.repeat)):
+        start = time.perf_counter()
+        beautify_markdown(content)
+        elapsed = time.perf_counter() - start
+        rates.append(size_mb / elapsed)
+        print(f"  第 {i + 1} 次: {elapsed:.3f}s，{rates[-1]:.1f} MB/s")
+
+    median = statistics.median(rates)
+    print(f"\n中位数: {median:.1f} MB/s，目标: {args.target:g} MB/s")
+    if median < args.target:
+        print("❌ 低于吞吐量目标")
+        sys.exit(1)
+    print("✅ 达到吞吐量目标")
+
+
+if __name__ == "__main__":
+    main()
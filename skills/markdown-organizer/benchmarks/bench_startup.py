@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+启动开销基准（导入时间预算）
+
+技能会频繁启动脚本，短调用的耗时主要花在导入上。用 `python -X importtime`
+在新进程中导入每个入口模块，取多次运行累计导入时间的中位数，与预算比较；
+同时检查导入时不应加载的重型模块（requests、asyncio、sqlite3 等只在用到时
+才导入）。超出预算或加载了这些模块时以退出码 1 结束。
+
+测量前先编译 scripts 目录下的 .pyc，设置了 PYTHONDONTWRITEBYTECODE 时结果
+同样稳定。
+
+用法:
+    python bench_startup.py [--repeat 7] [--scale 1.0]
+"""
+
+import argparse
+import compileall
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "scripts"
+
+# 入口模块 → 累计导入时间预算（毫秒）
+IMPORT_BUDGETS_MS = {
+    "organize_markdown": 40.0,
+    "enhance_content": 15.0,
+    "worker_client": 15.0,
+}
+
+# 导入入口模块时不应加载的模块（及其子模块）
+FORBIDDEN_MODULES = (
+    "requests",
+    "urllib3",
+    "asyncio",
+    "sqlite3",
+    "PIL",
+    "concurrent.futures",
+)
+
+# 子进程：导入入口模块，输出导入过程中新加载的模块名
+_PROBE = """
+import sys
+before = set(sys.modules)
+import {module}
+print("\\n".join(sorted(set(sys.modules) - before)))
+"""
+
+
+def measure_import(module: str) -> tuple[float, list[str]]:
+    """
+    在新进程中导入 module
+
+    Returns:
+        (累计导入时间毫秒, 导入过程中新加载的模块名)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module)],
+        cwd=SCRIPTS_DIR,
+        env={**os.environ, "PYTHONPATH": str(SCRIPTS_DIR)},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # 每行：import time: 自身耗时 | 累计耗时 | 缩进的模块名（顶层模块缩进一格）
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2] == f" {module}":
+            return int(parts[1]) / 1000, result.stdout.split()
+    raise RuntimeError(f"未找到 {module} 的导入记录:\n{result.stderr[-2000:]}")
+
+
+def forbidden(loaded: list[str]) -> list[str]:
+    """loaded 中属于 FORBIDDEN_MODULES 的顶层模块"""
+    return sorted(
+        {
+            name
+            for name in FORBIDDEN_MODULES
+            for module in loaded
+            if module == name or module.startswith(name + ".")
+        }
+    )
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="启动开销基准（导入时间预算）")
+    parser.add_argument("--repeat", type=int, default=7, help="每个模块的测量次数")
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="预算倍数，较慢的机器上可适当放宽（默认 1.0）",
+    )
+    parser.add_argument(
+        "--modules",
+        default=",".join(IMPORT_BUDGETS_MS),
+        help=f"逗号分隔的入口模块（默认 {','.join(IMPORT_BUDGETS_MS)}）",
+    )
+    args = parser.parse_args()
+
+    modules = [m.strip() for m in args.modules.split(",") if m.strip()]
+    unknown = [m for m in modules if m not in IMPORT_BUDGETS_MS]
+    if unknown:
+        parser.error(f"未知模块: {', '.join(unknown)}")
+
+    compileall.compile_dir(SCRIPTS_DIR, quiet=1)
+
+    failures = []
+    print(f"{'模块':<18}{'中位数(ms)':>12}{'预算(ms)':>10}")
+    for module in modules:
+        # 第一次运行预热文件系统缓存，不计入结果
+        measure_import(module)
+        timings = []
+        for _ in range(max(1, args.repeat)):
+            ms, loaded = measure_import(module)
+            timings.append(ms)
+        median = statistics.median(timings)
+        budget = IMPORT_BUDGETS_MS[module] * args.scale
+        mark = "✅" if median <= budget else "❌"
+        print(f"{module:<20}{median:>10.1f}{budget:>10.1f}  {mark}")
+        if median > budget:
+            failures.append(f"{module}: {median:.1f}ms > 预算 {budget:.1f}ms")
+        heavy = forbidden(loaded)
+        if heavy:
+            failures.append(f"{module}: 导入时加载了 {', '.join(heavy)}")
+
+    if failures:
+        print("\n❌ 超出启动预算:")
+        for line in failures:
+            print(f"  - {line}")
+        sys.exit(1)
+    print("\n✅ 所有入口模块都在启动预算内")
+
+
+if __name__ == "__main__":
+    main()
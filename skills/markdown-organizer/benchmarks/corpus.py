@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+合成 markdown 语料生成器
+
+按固定随机种子生成可复现的文档：大小、图片数量和代码块密度均可控制，
+图片 URL 指向本地桩服务器（image_server.py），也可写出一整个目录供批量模式测试。
+
+用法:
+    python corpus.py <输出目录> [--docs 10] [--size-kb 64] [--images 5] [--code-density 0.1]
+"""
+
+import argparse
+import random
+from pathlib import Path
+
+DEFAULT_IMAGE_BASE = "http://127.0.0.1:8765/img/"
+
+# 正文片段：(权重, 模板)
+PROSE_SNIPPETS = [
+    (10, "## 章节 {n}  \n"),
+    (
+        20,
+        "* 列表项，包含 `inline_code()` 和 Python、Docker 等关键词   \n+ 另一个列表项\n",
+    ),
+    (8, "\n\n\n"),
+    (5, "1. 第一步操作说明\n2. 第二步操作说明\n"),
+    (
+        57,
+        "普通段落文字 Some paragraph text about the REST API and git workflow, "
+        "with more words to fill the line number {n}.\n",
+    ),
+]
+
+CODE_SNIPPET = (
+    "```python\n# 注释\ndef handler_{n}(x):\n    return x * 2   \n\n\n* 不是列表\n```\n"
+)
+
+IMAGE_EXTS = (".png", ".jpg", ".gif", ".webp")
+
+
+def generate_document(
+    size_bytes: int,
+    images: int = 0,
+    code_density: float = 0.1,
+    seed: int = 1,
+    image_base: str = DEFAULT_IMAGE_BASE,
+) -> str:
+    """
+    生成约 size_bytes 字节（UTF-8）的文档
+
+    Args:
+        size_bytes: 目标大小
+        images: 图片引用数量（均匀分布在文档中，URL 各不相同）
+        code_density: 每个片段是代码块的概率（0 ~ 1）
+        seed: 随机种子
+        image_base: 图片 URL 前缀
+    """
+    rng = random.Random(seed)
+    weights = [w for w, _ in PROSE_SNIPPETS]
+    templates = [t for _, t in PROSE_SNIPPETS]
+
+    parts = [f"# 合成文档 {seed}\n\n"]
+    size = len(parts[0].encode("utf-8"))
+    # 每写出 image_every 字节插入一张图片
+    image_every = size_bytes // (images + 1) if images else None
+    next_image = image_every
+    image_no = 0
+
+    while size < size_bytes:
+        if rng.random() < code_density:
+            part = CODE_SNIPPET.format(n=rng.randint(1, 9999))
+        else:
+            template = rng.choices(templates, weights)[0]
+            part = template.format(n=rng.randint(1, 9999))
+
+        if next_image is not None and size >= next_image and image_no < images:
+            ext = IMAGE_EXTS[image_no % len(IMAGE_EXTS)]
+            part += f"\n![图 {image_no}]({image_base}{seed}-{image_no}{ext})\n"
+            image_no += 1
+            next_image += image_every
+
+        parts.append(part)
+        size += len(part.encode("utf-8"))
+
+    # 文档过短时补齐剩余图片
+    for i in range(image_no, images):
+        ext = IMAGE_EXTS[i % len(IMAGE_EXTS)]
+        parts.append(f"\n![图 {i}]({image_base}{seed}-{i}{ext})\n")
+
+    return "".join(parts)
+
+
+def generate_corpus(
+    out_dir: str | Path,
+    docs: int,
+    size_bytes: int,
+    images: int = 0,
+    code_density: float = 0.1,
+    seed: int = 1,
+    image_base: str = DEFAULT_IMAGE_BASE,
+) -> list[Path]:
+    """在 out_dir 下写出 docs 篇文档（每篇使用不同的种子），返回文件列表"""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(docs):
+        path = out_dir / f"doc-{i:04d}.md"
+        content = generate_document(
+            size_bytes, images, code_density, seed + i, image_base
+        )
+        path.write_text(content, encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="生成合成 markdown 语料")
+    parser.add_argument("out_dir", help="输出目录")
+    parser.add_argument("--docs", type=int, default=10, help="文档数量")
+    parser.add_argument("--size-kb", type=float, default=64, help="每篇文档大小（KB）")
+    parser.add_argument("--images", type=int, default=5, help="每篇文档的图片数量")
+    parser.add_argument(
+        "--code-density", type=float, default=0.1, help="代码块密度（0 ~ 1）"
+    )
+    parser.add_argument("--seed", type=int, default=1, help="随机种子")
+    parser.add_argument(
+        "--image-base", default=DEFAULT_IMAGE_BASE, help="图片 URL 前缀"
+    )
+    args = parser.parse_args()
+
+    paths = generate_corpus(
+        args.out_dir,
+        args.docs,
+        int(args.size_kb * 1024),
+        args.images,
+        args.code_density,
+        args.seed,
+        args.image_base,
+    )
+    print(f"✅ 已生成 {len(paths)} 篇文档: {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
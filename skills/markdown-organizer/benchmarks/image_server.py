@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+本地图片桩服务器
+
+代替真实图床用于基准测试：按路径返回确定性的图片字节，可配置响应延迟、
+带宽限制、错误率和传输中断率。支持 ETag / If-None-Match（304）、
+Range / If-Range（206）和 Content-Length。
+
+用法:
+    python image_server.py [--port 8765] [--latency-ms 50] [--bandwidth-kbps 0] [--error-rate 0] [--drop-rate 0]
+"""
+
+import argparse
+import hashlib
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_IMAGE_SIZE = 64 * 1024  # 每张图片的字节数
+_WRITE_CHUNK = 16 * 1024
+
+
+class ImageServerConfig:
+    """
+    桩服务器行为配置
+
+    Args:
+        latency: 每个请求返回响应头之前的延迟（秒）
+        bandwidth: 每个连接的发送速率（字节/秒），0 表示不限制
+        error_rate: 返回 503 的概率（0 ~ 1）
+        image_size: 每张图片的字节数
+        seed: 错误注入使用的随机种子
+        drop_rate: 发送一半内容后断开连接的概率（0 ~ 1）
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        bandwidth: int = 0,
+        error_rate: float = 0.0,
+        image_size: int = DEFAULT_IMAGE_SIZE,
+        seed: int = 1,
+        drop_rate: float = 0.0,
+    ):
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.image_size = image_size
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.conditional = 0
+        self.errors = 0
+        self.drops = 0
+        self.bytes_sent = 0
+
+    def should_fail(self) -> bool:
+        """按错误率决定本次请求是否失败，并计数"""
+        with self._lock:
+            self.requests += 1
+            fail = self.error_rate > 0 and self._rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+            return fail
+
+    def count_conditional(self) -> None:
+        with self._lock:
+            self.conditional += 1
+
+    def should_drop(self) -> bool:
+        """按中断率决定本次传输是否中途断开，并计数"""
+        with self._lock:
+            drop = self.drop_rate > 0 and self._rng.random() < self.drop_rate
+            if drop:
+                self.drops += 1
+            return drop
+
+    def add_bytes(self, n: int) -> None:
+        with self._lock:
+            self.bytes_sent += n
+
+
+def image_bytes(path: str, size: int) -> bytes:
+    """路径对应的确定性内容（相同路径每次返回相同字节）"""
+    seed = hashlib.sha256(path.encode("utf-8")).digest()
+    repeat = size // len(seed) + 1
+    return (seed * repeat)[:size]
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    """GET /img/<名称> 返回图片，其余路径 404"""
+
+    protocol_version = "HTTP/1.1"
+    config: ImageServerConfig  # 由 make_server 绑定
+
+    def log_message(self, format, *args):  # noqa: A002 - 覆盖基类签名
+        pass
+
+    def do_GET(self):
+        config = self.config
+        if config.latency:
+            time.sleep(config.latency)
+
+        if not self.path.startswith("/img/"):
+            self._send_empty(404)
+            return
+        if "If-None-Match" in self.headers:
+            config.count_conditional()
+        if config.should_fail():
+            self._send_empty(503)
+            return
+
+        body = image_bytes(self.path, config.image_size)
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        # If-Range 与当前 ETag 一致时才按范围返回，否则返回完整内容
+        start = self._range_start(len(body))
+        if_range = self.headers.get("If-Range")
+        if start is not None and if_range not in (None, etag):
+            start = None
+        if start == len(body):
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{len(body)}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if start is None:
+            self.send_response(200)
+            start = 0
+        else:
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}"
+            )
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body) - start))
+        self.send_header("ETag", etag)
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+        payload = body[start:]
+        if config.should_drop():
+            # 只发送一半就断开，模拟不稳定的链路
+            self._send_body(payload[: len(payload) // 2])
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        self._send_body(payload)
+
+    def _range_start(self, size: int) -> int | None:
+        """解析 Range: bytes=N-，只支持从 N 到末尾的单个范围"""
+        value = self.headers.get("Range", "")
+        if not value.startswith("bytes=") or "," in value:
+            return None
+        first, _, last = value[len("bytes=") :].partition("-")
+        if last or not first.isdigit():
+            return None
+        return min(int(first), size)
+
+    def _send_empty(self, status: int) -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _send_body(self, body: bytes) -> None:
+        """按带宽限制分块发送"""
+        bandwidth = self.config.bandwidth
+        start = time.perf_counter()
+        sent = 0
+        for offset in range(0, len(body), _WRITE_CHUNK):
+            chunk = body[offset : offset + _WRITE_CHUNK]
+            self.wfile.write(chunk)
+            sent += len(chunk)
+            if bandwidth:
+                # 按已发送字节数计算应到达的时间点，提前则等待
+                delay = sent / bandwidth - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+        self.config.add_bytes(sent)
+
+
+class ImageServer:
+    """
+    在后台线程中运行的桩服务器，可作为上下文管理器使用
+
+    Args:
+        config: 行为配置
+        host: 监听地址
+        port: 监听端口，0 表示随机端口
+    """
+
+    def __init__(
+        self,
+        config: ImageServerConfig | None = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.config = config or ImageServerConfig()
+        handler = type("BoundImageHandler", (ImageHandler,), {"config": self.config})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        """图片 URL 前缀，例如 http://127.0.0.1:54321/img/"""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/img/"
+
+    def start(self) -> "ImageServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "ImageServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main():
+    """命令行入口：前台运行桩服务器"""
+    parser = argparse.ArgumentParser(description="本地图片桩服务器")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    parser.add_argument("--latency-ms", type=float, default=0, help="响应延迟（毫秒）")
+    parser.add_argument(
+        "--bandwidth-kbps", type=float, default=0, help="单连接带宽（KB/s），0 为不限"
+    )
+    parser.add_argument("--error-rate", type=float, default=0, help="503 错误率")
+    parser.add_argument(
+        "--drop-rate", type=float, default=0, help="传输到一半断开连接的概率"
+    )
+    parser.add_argument(
+        "--image-size", type=int, default=DEFAULT_IMAGE_SIZE, help="图片字节数"
+    )
+    args = parser.parse_args()
+
+    config = ImageServerConfig(
+        latency=args.latency_ms / 1000,
+        bandwidth=int(args.bandwidth_kbps * 1024),
+        error_rate=args.error_rate,
+        image_size=args.image_size,
+        drop_rate=args.drop_rate,
+    )
+    server = ImageServer(config, args.host, args.port)
+    print(f"🖼️ 图片桩服务器: {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+分阶段基准测试
+
+用 corpus.py 生成固定种子的文档、用 image_server.py 代替图床，分别测量
+分词、美化、结构分析、前置知识检测、图片下载、完整处理流程、带 base_url 的
+修改后重新处理和 --refresh 重新验证，输出每个阶段的延迟分位数（p50/p90/p99）
+和吞吐量。
+
+基准线保存在 JSON 文件中（默认 benchmarks/baseline.json，机器相关，不提交），
+p50 比基准线慢超过阈值的阶段视为回归，以退出码 1 结束。
+
+用法:
+    python run_benchmarks.py [--stages beautify,analyze] [--repeat 10]
+    python run_benchmarks.py --save-baseline
+    python run_benchmarks.py --latency-ms 50 --bandwidth-kbps 512 --error-rate 0.05 --drop-rate 0.1
+"""
+
+import argparse
+import io
+import json
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "scripts"))
+
+import enhance_content  # noqa: E402
+import organize_markdown  # noqa: E402
+from corpus import generate_document  # noqa: E402
+from download_scheduler import configure_host_health  # noqa: E402
+from fetch_client import configure_client  # noqa: E402
+from image_server import ImageServer, ImageServerConfig  # noqa: E402
+from image_store import configure_store  # noqa: E402
+from markdown_tokens import tokenize  # noqa: E402
+
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+DEFAULT_THRESHOLD = 0.2  # p50 变慢超过 20% 视为回归
+
+STAGES = (
+    "tokenize",
+    "beautify",
+    "analyze",
+    "prerequisites",
+    "download",
+    "organize",
+    "rerun",
+    "refresh",
+)
+
+# 这些参数不同时，与基准线的比较没有意义
+COMPARED_PARAMS = (
+    "size_kb",
+    "images",
+    "code_density",
+    "seed",
+    "latency_ms",
+    "bandwidth_kbps",
+    "error_rate",
+    "drop_rate",
+    "image_size",
+)
+
+
+def percentile(values: list[float], q: float) -> float:
+    """线性插值分位数，q 取 0 ~ 100"""
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    pos = (len(ordered) - 1) * q / 100
+    lower = int(pos)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (pos - lower)
+
+
+def measure(run, repeat: int) -> list[float]:
+    """预热一次后运行 repeat 次，返回每次的耗时（秒）"""
+    run()
+    timings = []
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _quiet(func, *args, **kwargs):
+    """运行 func 并丢弃其打印输出"""
+    with redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def build_stages(
+    content: str,
+    urls: list[str],
+    work_dir: Path,
+    relative: str,
+    base_url: str,
+    server: ImageServerConfig,
+) -> dict:
+    """
+    构建各阶段的测量函数
+
+    relative 是图片引用为相对路径的同一文档，rerun 阶段以 base_url 处理它。
+    server 是图床的配置和计数，refresh 阶段据此确认发出了条件请求。
+
+    Returns:
+        {阶段: (无参函数, 每次处理的数量, 数量单位)}
+    """
+    size_mb = len(content.encode("utf-8")) / (1024 * 1024)
+    tokens = tokenize(content)
+
+    def download():
+        img_dir = Path(tempfile.mkdtemp(prefix="img-", dir=work_dir))
+        try:
+            _quiet(organize_markdown.download_images, urls, img_dir)
+        finally:
+            shutil.rmtree(img_dir, ignore_errors=True)
+
+    def organize():
+        doc_dir = Path(tempfile.mkdtemp(prefix="doc-", dir=work_dir))
+        try:
+            doc = doc_dir / "doc.md"
+            doc.write_text(content, encoding="utf-8")
+            _quiet(organize_markdown.organize_markdown, doc, force=True)
+        finally:
+            shutil.rmtree(doc_dir, ignore_errors=True)
+
+    def rerun():
+        doc_dir = Path(tempfile.mkdtemp(prefix="doc-", dir=work_dir))
+        try:
+            doc = doc_dir / "doc.md"
+            doc.write_text(relative, encoding="utf-8")
+            _quiet(organize_markdown.organize_markdown, doc, base_url, force=True)
+            # 修改后重新处理：写回的 ./img/ 引用是本地图片，不应再与
+            # base_url 组合后下载
+            with open(doc, "a", encoding="utf-8") as f:
+                f.write("\n追加的段落。\n")
+            summary = _quiet(organize_markdown.organize_markdown, doc, base_url)
+            if summary["skipped"] or summary["images"] or summary["failed"]:
+                raise RuntimeError(
+                    f"重新处理结果异常: 跳过 {summary['skipped']}，"
+                    f"图片 {summary['images']}，失败 {summary['failed']}"
+                )
+        finally:
+            shutil.rmtree(doc_dir, ignore_errors=True)
+
+    def refresh():
+        doc_dir = Path(tempfile.mkdtemp(prefix="doc-", dir=work_dir))
+        try:
+            doc = doc_dir / "doc.md"
+            doc.write_text(content, encoding="utf-8")
+            first = _quiet(organize_markdown.organize_markdown, doc, force=True)
+            # 图片引用已改写为 ./img/，--refresh 应按清单中的来源 URL 发送条件请求
+            local = first["images"] - first["failed"]
+            before = server.conditional
+            _quiet(organize_markdown.organize_markdown, doc, refresh=True)
+            sent = server.conditional - before
+            if sent != local:
+                raise RuntimeError(f"--refresh 发出 {sent} 个条件请求，应为 {local}")
+        finally:
+            shutil.rmtree(doc_dir, ignore_errors=True)
+
+    return {
+        "tokenize": (lambda: tokenize(content), size_mb, "MB"),
+        "beautify": (
+            lambda: organize_markdown.beautify_markdown(content),
+            size_mb,
+            "MB",
+        ),
+        "analyze": (
+            lambda: enhance_content.analyze_document(None, tokens=tokens),
+            size_mb,
+            "MB",
+        ),
+        "prerequisites": (
+            lambda: enhance_content.detect_prerequisites(content),
+            size_mb,
+            "MB",
+        ),
+        "download": (download, len(urls), "images"),
+        "organize": (organize, size_mb, "MB"),
+        "rerun": (rerun, size_mb, "MB"),
+        "refresh": (refresh, len(urls), "images"),
+    }
+
+
+def summarize(timings: list[float], units: float, unit: str) -> dict:
+    """计算分位数（毫秒）和基于 p50 的吞吐量"""
+    p50 = percentile(timings, 50)
+    return {
+        "p50_ms": p50 * 1000,
+        "p90_ms": percentile(timings, 90) * 1000,
+        "p99_ms": percentile(timings, 99) * 1000,
+        "throughput": units / p50 if p50 > 0 else 0.0,
+        "unit": f"{unit}/s",
+        "runs": len(timings),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """返回相对基准线出现回归的阶段说明"""
+    regressions = []
+    for stage, result in results["stages"].items():
+        base = baseline.get("stages", {}).get(stage)
+        if not base:
+            continue
+        limit = base["p50_ms"] * (1 + threshold)
+        if result["p50_ms"] > limit:
+            regressions.append(
+                f"{stage}: p50 {result['p50_ms']:.1f}ms > 基准线 "
+                f"{base['p50_ms']:.1f}ms × {1 + threshold:.2f}"
+            )
+    return regressions
+
+
+def print_report(results: dict) -> None:
+    print(f"\n{'阶段':<14}{'p50(ms)':>10}{'p90(ms)':>10}{'p99(ms)':>10}  吞吐量")
+    for stage, r in results["stages"].items():
+        print(
+            f"{stage:<16}{r['p50_ms']:>10.1f}{r['p90_ms']:>10.1f}{r['p99_ms']:>10.1f}"
+            f"  {r['throughput']:.1f} {r['unit']}"
+        )
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="分阶段基准测试")
+    parser.add_argument(
+        "--stages",
+        default=",".join(STAGES),
+        help=f"逗号分隔的阶段（默认全部: {','.join(STAGES)}）",
+    )
+    parser.add_argument("--repeat", type=int, default=10, help="每个阶段的重复次数")
+    parser.add_argument("--size-kb", type=float, default=512, help="文档大小（KB）")
+    parser.add_argument("--images", type=int, default=20, help="图片数量")
+    parser.add_argument(
+        "--code-density", type=float, default=0.1, help="代码块密度（0 ~ 1）"
+    )
+    parser.add_argument("--seed", type=int, default=1, help="随机种子")
+    parser.add_argument("--latency-ms", type=float, default=20, help="图床响应延迟")
+    parser.add_argument(
+        "--bandwidth-kbps", type=float, default=0, help="图床单连接带宽，0 为不限"
+    )
+    parser.add_argument("--error-rate", type=float, default=0, help="图床 503 错误率")
+    parser.add_argument(
+        "--drop-rate", type=float, default=0, help="图床传输到一半断开连接的概率"
+    )
+    parser.add_argument(
+        "--image-size", type=int, default=64 * 1024, help="每张图片的字节数"
+    )
+    parser.add_argument(
+        "--baseline", default=str(DEFAULT_BASELINE), help="基准线 JSON 文件"
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="把本次结果保存为基准线"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=f"回归阈值（默认 {DEFAULT_THRESHOLD:g}，即 p50 变慢 20%%）",
+    )
+    parser.add_argument("--json", dest="json_path", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"未知阶段: {', '.join(unknown)}")
+
+    params = {
+        "size_kb": args.size_kb,
+        "images": args.images,
+        "code_density": args.code_density,
+        "seed": args.seed,
+        "latency_ms": args.latency_ms,
+        "bandwidth_kbps": args.bandwidth_kbps,
+        "error_rate": args.error_rate,
+        "drop_rate": args.drop_rate,
+        "image_size": args.image_size,
+        "repeat": args.repeat,
+    }
+
+    server_config = ImageServerConfig(
+        latency=args.latency_ms / 1000,
+        bandwidth=int(args.bandwidth_kbps * 1024),
+        error_rate=args.error_rate,
+        image_size=args.image_size,
+        seed=args.seed,
+        drop_rate=args.drop_rate,
+    )
+    # 基准测试不使用全局图片仓库，也不重试，测量的是单次下载路径；
+    # 传输中断（--drop-rate）仍从 .part 文件续传；所有图片来自同一个桩服务器，
+    # 不熔断，--error-rate 下每张图片都实际发出请求
+    configure_store(None)
+    configure_client(retries=0, resume_attempts=3)
+    configure_host_health(failure_threshold=0)
+
+    results = {"params": params, "stages": {}}
+    with ImageServer(server_config) as server, tempfile.TemporaryDirectory() as tmp:
+        content = generate_document(
+            int(args.size_kb * 1024),
+            args.images,
+            args.code_density,
+            args.seed,
+            server.url,
+        )
+        relative = generate_document(
+            int(args.size_kb * 1024), args.images, args.code_density, args.seed, ""
+        )
+        urls = organize_markdown.collect_image_urls(content, "")
+        print(
+            f"📄 文档 {len(content.encode('utf-8')) / 1024:.0f} KB，"
+            f"图片 {len(urls)} 张，图床 {server.url}"
+        )
+
+        available = build_stages(
+            content, urls, Path(tmp), relative, server.url, server_config
+        )
+        for stage in stages:
+            run, units, unit = available[stage]
+            print(f"  ⏱️ {stage} ...")
+            results["stages"][stage] = summarize(measure(run, args.repeat), units, unit)
+
+        results["server"] = {
+            "requests": server_config.requests,
+            "conditional": server_config.conditional,
+            "errors": server_config.errors,
+            "drops": server_config.drops,
+            "bytes_sent": server_config.bytes_sent,
+        }
+
+    print_report(results)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+        print(f"\n💾 已保存基准线: {baseline_path}")
+        return
+
+    if not baseline_path.exists():
+        print("\n（无基准线，使用 --save-baseline 保存本次结果）")
+        return
+
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    mismatched = [
+        k for k in COMPARED_PARAMS if baseline.get("params", {}).get(k) != params[k]
+    ]
+    if mismatched:
+        print(f"\n⚠️ 参数与基准线不同（{', '.join(mismatched)}），跳过回归比较")
+        return
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print("\n❌ 性能回归:")
+        for line in regressions:
+            print(f"  - {line}")
+        sys.exit(1)
+    print("\n✅ 与基准线相比无回归")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+持久化的文档分析缓存
+
+enhance_content.py 的 --analyze / --suggest 经常在同一批文档上反复调用，每次都
+要启动解释器并重新分析。分析结果按（文件内容摘要, 种类, 分析版本）保存在缓存
+目录下的 SQLite 数据库中，内容不变时直接返回。
+
+为避免每次都对大文件计算摘要，另记录 路径 → (大小, 修改时间, 摘要)，stat 一致
+时直接使用记录的摘要。缓存总大小超过上限时，按最近访问时间淘汰最久未用的条目。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from file_index import CACHE_ENV_VAR, get_cache_dir
+from image_store import file_digest
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024  # 缓存条目总大小上限
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    digest TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    version TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (digest, kind, version)
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL
+);
+"""
+
+
+class AnalysisCache:
+    """
+    文件内容摘要 → 分析结果 缓存
+
+    Args:
+        path: SQLite 数据库文件，None 时使用 get_cache_dir("analysis")/analysis.sqlite3
+        max_bytes: 条目总大小上限（字节），超出时按 LRU 淘汰
+    """
+
+    def __init__(
+        self, path: str | Path | None = None, max_bytes: int = DEFAULT_MAX_BYTES
+    ):
+        if path is None:
+            path = get_cache_dir("analysis") / "analysis.sqlite3"
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # 多个命令行进程可能同时读写，等待锁而不是立即失败
+        self._db = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def digest(self, file_path: str | Path) -> str:
+        """文件内容的 SHA-256；大小和修改时间与上次相同时不重新计算"""
+        path = Path(file_path).resolve()
+        stat = path.stat()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime_ns, digest FROM files WHERE path = ?", (str(path),)
+            ).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+
+        digest = file_digest(path)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                (str(path), stat.st_size, stat.st_mtime_ns, digest),
+            )
+        return digest
+
+    def get(self, digest: str, kind: str, version: str):
+        """查询缓存，未命中时返回 None；命中时更新访问时间"""
+        key = (digest, kind, version)
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT value FROM entries "
+                "WHERE digest = ? AND kind = ? AND version = ?",
+                key,
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE entries SET accessed = ? "
+                "WHERE digest = ? AND kind = ? AND version = ?",
+                (time.time(), *key),
+            )
+        return json.loads(row[0])
+
+    def put(self, digest: str, kind: str, version: str, value) -> None:
+        """写入缓存（value 需可 JSON 序列化），然后按上限淘汰"""
+        data = json.dumps(value, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (digest, kind, version, data, size, time.time()),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        """删除最久未访问的条目，直到总大小不超过上限"""
+        (total,) = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        stale = []
+        for rowid, size in self._db.execute(
+            "SELECT rowid, size FROM entries ORDER BY accessed"
+        ):
+            if total <= self.max_bytes:
+                break
+            stale.append((rowid,))
+            total -= size
+        self._db.executemany("DELETE FROM entries WHERE rowid = ?", stale)
+        # 不再有任何条目的文件记录一并删除
+        self._db.execute(
+            "DELETE FROM files WHERE digest NOT IN (SELECT digest FROM entries)"
+        )
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM entries")
+            self._db.execute("DELETE FROM files")
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def cached(
+    cache: "AnalysisCache | None",
+    file_path: str | Path,
+    kind: str,
+    version: str,
+    compute,
+):
+    """
+    返回 file_path 的 kind 分析结果：缓存命中时直接返回，否则调用 compute() 并写入
+
+    cache 为 None 或缓存不可用（数据库损坏、目录不可写等）时直接计算。
+    """
+    if cache is None:
+        return compute()
+    try:
+        digest = cache.digest(file_path)
+        value = cache.get(digest, kind, version)
+    except (sqlite3.Error, ValueError):
+        return compute()
+    if value is not None:
+        return value
+
+    value = compute()
+    try:
+        cache.put(digest, kind, version, value)
+    except sqlite3.Error:
+        pass
+    return value
+
+
+_default_cache: AnalysisCache | None = None
+_cache_configured = False
+_cache_enabled = True
+_cache_max_bytes = DEFAULT_MAX_BYTES
+_cache_root: str | None = None  # 打开缓存时的 MARKDOWN_ORGANIZER_CACHE
+_cache_lock = threading.Lock()
+
+
+def _open_default() -> None:
+    """按当前设置（重新）打开共享缓存，调用方持有 _cache_lock"""
+    global _default_cache, _cache_configured, _cache_root
+    if _default_cache is not None:
+        _default_cache.close()
+    _default_cache = None
+    _cache_root = os.environ.get(CACHE_ENV_VAR)
+    if _cache_enabled:
+        try:
+            _default_cache = AnalysisCache(max_bytes=_cache_max_bytes)
+        except (OSError, sqlite3.Error):
+            # 缓存目录不可写或数据库损坏时不使用缓存
+            _default_cache = None
+    _cache_configured = True
+
+
+def get_cache() -> AnalysisCache | None:
+    """
+    获取进程内共享的分析缓存（首次调用时打开），不可用或已禁用时返回 None
+
+    缓存根目录（MARKDOWN_ORGANIZER_CACHE）变化时改用新目录下的数据库：常驻
+    worker 按请求切换客户端的环境变量。
+    """
+    with _cache_lock:
+        if not _cache_configured or (
+            _cache_enabled and os.environ.get(CACHE_ENV_VAR) != _cache_root
+        ):
+            _open_default()
+        return _default_cache
+
+
+def configure_cache(
+    enabled: bool = True, max_bytes: int = DEFAULT_MAX_BYTES
+) -> AnalysisCache | None:
+    """设置分析缓存，enabled 为 False 时禁用"""
+    global _cache_enabled, _cache_max_bytes
+    with _cache_lock:
+        _cache_enabled = enabled
+        _cache_max_bytes = max_bytes
+        _open_default()
+        return _default_cache
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+文档处理清单
+
+为每个 img 目录记录同目录下已处理文档的输入摘要、输出摘要、处理版本和引用的图片。
+再次运行时，文件未被修改（stat 一致，或内容摘要与上次输出一致）、版本相同且
+图片齐全的文档直接跳过，不再扫描图片、美化和增强。
+"""
+
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from image_store import file_digest
+
+# 清单文件名（位于 img 目录内，与图片缓存清单并列）
+DOCUMENTS_NAME = ".documents.json"
+
+
+class DocumentManifest:
+    """
+    文档名 → 处理记录 清单
+
+    每个条目：{"version", "base_url", "input_digest", "output_digest",
+    "size", "mtime_ns", "images", "failed"}
+
+    Args:
+        img_dir: 文档所在目录下的图片目录
+    """
+
+    def __init__(self, img_dir: Path):
+        self.img_dir = Path(img_dir)
+        self.path = self.img_dir / DOCUMENTS_NAME
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = self._load()
+        self._dirty = False
+
+    def _load(self) -> dict[str, dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def get(self, name: str) -> dict | None:
+        """查询文档的处理记录"""
+        with self._lock:
+            return self._entries.get(name)
+
+    def is_current(self, path: Path, version: str, base_url: str) -> bool:
+        """
+        判断文档自上次处理后是否无需再处理
+
+        先比较 stat（大小、修改时间），一致则不读文件；修改时间变化但大小相同时
+        再计算一次摘要，与上次的输出摘要比较。上次有原文中的远程图片下载失败、
+        处理版本或 base_url 不同、引用的图片已缺失时都需要重新处理。
+        """
+        entry = self.get(path.name)
+        if not entry:
+            return False
+        if entry.get("version") != version or entry.get("base_url") != base_url:
+            return False
+        if entry.get("failed"):
+            return False
+
+        try:
+            stat = path.stat()
+        except OSError:
+            return False
+        if stat.st_size != entry.get("size"):
+            return False
+        if stat.st_mtime_ns != entry.get("mtime_ns"):
+            if file_digest(path) != entry.get("output_digest"):
+                return False
+            # 内容未变（只是被 touch 过），更新修改时间，下次无需再计算摘要
+            self.record(path.name, mtime_ns=stat.st_mtime_ns)
+
+        return all((self.img_dir / name).is_file() for name in entry.get("images", []))
+
+    def record(self, name: str, **fields) -> None:
+        """记录（或更新）文档的处理信息"""
+        with self._lock:
+            entry = self._entries.setdefault(name, {})
+            entry.update(fields)
+            self._dirty = True
+
+    def save(self) -> None:
+        """原子写入清单文件（与其他进程写入的条目合并）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            merged = self._load()
+            merged.update(self._entries)
+            self._entries = merged
+
+            fd, tmp_name = tempfile.mkstemp(
+                prefix=".documents.", suffix=".tmp", dir=self.path.parent
+            )
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(merged, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_name, self.path)
+            self._dirty = False
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+asyncio 下载调度器
+
+多个文档在同一个事件循环中并发处理时共用一个调度器：全局并发数和单主机并发数
+由信号量限制，阻塞的下载调用在调度器自己的有界线程池中执行（线程数等于全局
+并发数，不会随文档数量增长），同一目标的并发请求合并为一次。
+
+HostHealth 按主机跟踪下载健康状况，同步和异步两条路径的每次网络请求都经过它：
+令牌桶限制请求速率，429（以及带 Retry-After 的 503）让整个主机暂停到
+Retry-After 指定的时间，连续失败达到阈值后熔断，冷却期内该主机的其余图片
+立即失败（保留原链接），不再逐个等待超时。
+
+asyncio 在创建调度器时才导入：同步的命令行路径只用到本模块的默认值常量和
+HostHealth。
+"""
+
+import threading
+import time
+import urllib.parse
+from typing import TYPE_CHECKING, Any, Callable, Hashable
+
+if TYPE_CHECKING:
+    import asyncio
+
+
+DEFAULT_MAX_WORKERS = 8  # 全局最大并发下载数
+DEFAULT_PER_HOST_LIMIT = 4  # 单个主机最大并发下载数
+DEFAULT_HOST_RATE = 0.0  # 单个主机每秒最多发起的请求数，0 表示不限制
+DEFAULT_FAILURE_THRESHOLD = 3  # 连续失败多少次后熔断，0 表示不熔断
+DEFAULT_COOLDOWN = 30.0  # 熔断后多久允许一次试探请求（秒）
+DEFAULT_MAX_RETRY_AFTER = 60.0  # 愿意等待的最长 Retry-After（秒），更长时直接熔断
+DEFAULT_THROTTLE_RETRIES = 2  # 被限流后同一 URL 的最大重试次数
+DEFAULT_THROTTLE_BACKOFF = 1.0  # 429 未给出 Retry-After 时的暂停（秒），逐次翻倍
+
+# 视为限流的状态码（503 只在带 Retry-After 时）
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+class HostUnavailableError(IOError):
+    """主机处于熔断状态，请求未发出"""
+
+
+class DownloadScheduler:
+    """
+    有界的异步下载调度器，可作为异步上下文管理器使用
+
+    Args:
+        max_workers: 全局最大并发数（也是线程池大小）
+        per_host_limit: 单个主机的最大并发数
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        per_host_limit: int = DEFAULT_PER_HOST_LIMIT,
+    ):
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.max_workers = max(1, max_workers)
+        self.per_host_limit = max(1, per_host_limit)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="download"
+        )
+        self._global = asyncio.Semaphore(self.max_workers)
+        self._hosts: dict[str, asyncio.Semaphore] = {}
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+    def _host_semaphore(self, url: str) -> "asyncio.Semaphore":
+        import asyncio
+
+        host = urllib.parse.urlparse(url).netloc.lower()
+        semaphore = self._hosts.get(host)
+        if semaphore is None:
+            semaphore = self._hosts[host] = asyncio.Semaphore(self.per_host_limit)
+        return semaphore
+
+    async def run(self, func: Callable, *args) -> Any:
+        """在调度器的线程池中执行阻塞调用（读写文件等），不占用下载名额"""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def fetch(
+        self,
+        url: str,
+        func: Callable,
+        *args,
+        key: Hashable | None = None,
+        on_join: Callable[[Any], None] | None = None,
+    ) -> Any:
+        """
+        占用全局和 url 所在主机的并发名额后执行 func(*args)
+
+        key 相同的请求正在进行时直接等待其结果，不再重复执行（默认以 url 为 key），
+        得到结果后调用 on_join(result)，调用方可据此记录这次共用。
+        排队等待名额的秒数通过关键字参数 wait_seconds 传给 func。
+        """
+        import asyncio
+
+        key = url if key is None else key
+        pending = self._inflight.get(key)
+        if pending is not None:
+            result = await asyncio.shield(pending)
+            if on_join is not None:
+                on_join(result)
+            return result
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._inflight[key] = future
+        try:
+            queued = loop.time()
+            async with self._host_semaphore(url), self._global:
+                wait_seconds = loop.time() - queued
+                result = await loop.run_in_executor(
+                    self._executor, lambda: func(*args, wait_seconds=wait_seconds)
+                )
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # 没有其他等待者时，避免 "Future exception was never retrieved"
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def aclose(self) -> None:
+        """等待线程池中的任务结束并关闭线程池"""
+        import asyncio
+
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+    async def __aenter__(self) -> "DownloadScheduler":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+
+class TokenBucket:
+    """
+    令牌桶：每秒补充 rate 个令牌，最多积累 burst 个（调用方负责加锁）
+
+    Args:
+        rate: 每秒补充的令牌数，0 表示不限制
+        burst: 令牌上限（允许的瞬时并发请求数）
+    """
+
+    def __init__(self, rate: float, burst: int, clock=time.monotonic):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self._clock = clock
+        self._updated = clock()
+
+    def reserve(self) -> float:
+        """取走一个令牌，返回需要等待的秒数（令牌不足时预支，后来者依次顺延）"""
+        if self.rate <= 0:
+            return 0.0
+        now = self._clock()
+        elapsed = now - self._updated
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self._updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class _HostState:
+    """单个主机的令牌桶、限流暂停和熔断状态（closed → open → half_open）"""
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.state = "closed"
+        self.failures = 0  # 连续失败次数
+        self.throttled = 0  # 连续被限流次数
+        self.open_until = 0.0
+        self.paused_until = 0.0
+        self.probing = False  # half_open 时试探请求是否已发出
+        self.lock = threading.Lock()
+
+
+class HostHealth:
+    """
+    按主机跟踪下载健康状况（线程安全，进程内共享）
+
+    Args:
+        rate: 单个主机每秒最多发起的请求数，0 表示不限制
+        burst: 令牌桶容量
+        failure_threshold: 连续失败多少次后熔断，0 表示不熔断
+        cooldown: 熔断持续的秒数，之后放行一个试探请求，成功则恢复
+        max_retry_after: 愿意等待的最长 Retry-After（秒），更长时直接熔断
+        throttle_retries: 被限流后同一 URL 按 Retry-After 重试的次数
+    """
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_HOST_RATE,
+        burst: int = DEFAULT_PER_HOST_LIMIT,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        cooldown: float = DEFAULT_COOLDOWN,
+        max_retry_after: float = DEFAULT_MAX_RETRY_AFTER,
+        throttle_retries: int = DEFAULT_THROTTLE_RETRIES,
+        clock=time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_retry_after = max_retry_after
+        self.throttle_retries = throttle_retries
+        self._clock = clock
+        self._hosts: dict[str, _HostState] = {}
+        self._lock = threading.Lock()
+
+    def _host(self, url: str) -> tuple[str, _HostState]:
+        host = urllib.parse.urlparse(url).netloc.lower()
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                bucket = TokenBucket(self.rate, self.burst, self._clock)
+                state = self._hosts[host] = _HostState(bucket)
+        return host, state
+
+    def acquire(self, url: str) -> float:
+        """
+        请求发出前调用，返回需要等待的秒数（令牌桶和限流暂停）
+
+        Raises:
+            HostUnavailableError: 主机处于熔断状态，或恢复试探请求正在进行
+        """
+        host, state = self._host(url)
+        now = self._clock()
+        with state.lock:
+            if state.state == "open":
+                if now < state.open_until:
+                    raise HostUnavailableError(
+                        f"{host} 已熔断，{state.open_until - now:.0f} 秒后再试"
+                    )
+                state.state = "half_open"
+                state.probing = False
+            if state.state == "half_open":
+                if state.probing:
+                    raise HostUnavailableError(f"{host} 已熔断，正在试探是否恢复")
+                state.probing = True
+            return max(0.0, state.paused_until - now) + state.bucket.reserve()
+
+    def success(self, url: str) -> None:
+        """记录一次成功的请求，关闭熔断器"""
+        _, state = self._host(url)
+        with state.lock:
+            state.state = "closed"
+            state.failures = 0
+            state.throttled = 0
+            state.probing = False
+
+    def failure(self, url: str, error: Exception) -> float | None:
+        """
+        记录一次失败的请求
+
+        Returns:
+            被限流且 Retry-After 可以接受时，返回重试前需要等待的秒数（主机的
+            其他请求也会等待这段时间）；不应重试时返回 None
+        """
+        host, state = self._host(url)
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+        now = self._clock()
+        with state.lock:
+            state.probing = False
+            retry_after = None
+            if status in THROTTLE_STATUS_CODES:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if status == 429 or retry_after is not None:
+                # 主机仍在响应，只是要求放慢：暂停整个主机，不计入连续失败
+                if retry_after is None:
+                    retry_after = DEFAULT_THROTTLE_BACKOFF * 2**state.throttled
+                state.throttled += 1
+                state.state = "closed"
+                if retry_after > self.max_retry_after:
+                    self._open(state, now + retry_after)
+                    return None
+                state.paused_until = max(state.paused_until, now + retry_after)
+                return retry_after
+
+            if not _is_host_failure(error, status):
+                # 404 之类的错误说明主机正常，只是这张图片不可用
+                state.state = "closed"
+                state.failures = 0
+                return None
+            state.failures += 1
+            if state.state == "half_open" or (
+                self.failure_threshold and state.failures >= self.failure_threshold
+            ):
+                self._open(state, now + self.cooldown)
+            return None
+
+    def release(self, url: str) -> None:
+        """请求被中断（既未成功也未失败）时调用，释放半开状态下的试探名额"""
+        _, state = self._host(url)
+        with state.lock:
+            state.probing = False
+
+    @staticmethod
+    def _open(state: _HostState, until: float) -> None:
+        state.state = "open"
+        state.open_until = max(state.open_until, until)
+
+    def call(self, url: str, func: Callable[[], Any]) -> Any:
+        """
+        在主机健康检查下执行一次网络请求 func()
+
+        先等待令牌和限流暂停，成功或失败都记录下来；被限流时按 Retry-After
+        重试，最多 throttle_retries 次。
+
+        Raises:
+            HostUnavailableError: 主机处于熔断状态（func 未执行）
+        """
+        attempt = 0
+        while True:
+            delay = self.acquire(url)
+            try:
+                if delay > 0:
+                    time.sleep(delay)
+                result = func()
+            except Exception as e:
+                retry = self.failure(url, e)
+                attempt += 1
+                if retry is None or attempt > self.throttle_retries:
+                    raise
+                continue
+            except BaseException:
+                # KeyboardInterrupt、取消等：不计入成败，但必须释放试探名额，
+                # 否则半开的主机之后的请求都会被拒绝
+                self.release(url)
+                raise
+            self.success(url)
+            return result
+
+    def status(self) -> dict[str, dict]:
+        """各主机当前的状态 {主机: {"state", "failures", "throttled"}}"""
+        with self._lock:
+            hosts = dict(self._hosts)
+        return {
+            host: {
+                "state": state.state,
+                "failures": state.failures,
+                "throttled": state.throttled,
+            }
+            for host, state in hosts.items()
+        }
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """解析 Retry-After（秒数或 HTTP 日期），返回距现在的秒数，无效时返回 None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    from email.utils import parsedate_to_datetime
+
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def _is_host_failure(error: Exception, status: int | None) -> bool:
+    """连接失败、超时和 5xx 说明主机不健康；4xx、体积超限等不计入"""
+    if status is not None:
+        return status >= 500
+    import requests
+
+    return isinstance(
+        error,
+        (
+            requests.ConnectionError,
+            requests.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+        ),
+    )
+
+
+_default_health: HostHealth | None = None
+_default_health_kwargs: dict = {}
+_health_lock = threading.Lock()
+
+
+def get_host_health() -> HostHealth:
+    """获取进程内共享的主机健康跟踪器（首次调用时创建）"""
+    global _default_health
+    with _health_lock:
+        if _default_health is None:
+            _default_health = HostHealth()
+        return _default_health
+
+
+def configure_host_health(**kwargs) -> HostHealth:
+    """
+    用指定参数重建共享的主机健康跟踪器，参数同 HostHealth
+
+    参数与当前相同时直接复用，保留已记录的熔断和限流状态。
+    """
+    global _default_health, _default_health_kwargs
+    with _health_lock:
+        if _default_health is None or kwargs != _default_health_kwargs:
+            _default_health = HostHealth(**kwargs)
+            _default_health_kwargs = kwargs
+        return _default_health
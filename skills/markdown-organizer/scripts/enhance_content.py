@@ -11,8 +11,25 @@ Markdown 内容增强辅助工具
 import re
 import sys
 from collections import Counter
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Set, Tuple
+from typing import TYPE_CHECKING, Dict, Iterator, List, Set, Tuple
+
+from markdown_tokens import (
+    CODE,
+    FENCE_CLOSE,
+    FENCE_OPEN,
+    HEADING,
+    HEADING_PATTERN,
+    STEP,
+    FileLines,
+    MarkdownTokens,
+    iter_kinds,
+    tokenize,
+)
+
+if TYPE_CHECKING:
+    from term_index import TermIndex
 
 
 # 常见技术栈关键词库，用于识别前置知识
@@ -61,6 +78,80 @@ TECH_STACK_KEYWORDS = {
     "cloud": ["云", "Cloud", "Serverless"],
 }
 
+# 技术栈类别对应的前置知识条目（未列出的类别只用于统计）
+CATEGORY_PREREQUISITES = {
+    "python": "Python 基础",
+    "javascript": "JavaScript 基础",
+    "typescript": "TypeScript 基础",
+    "shell": "命令行基础",
+    "git": "Git 版本控制",
+    "html_css": "HTML/CSS 基础",
+    "sql": "数据库基础",
+    "api": "API 概念",
+    "docker": "Docker 基础",
+}
+
+# 不超过该长度的关键词（如 py、ts、Go、JS）按原样区分大小写匹配，
+# 更长的关键词忽略大小写
+CASE_SENSITIVE_MAX_LEN = 3
+
+_ASCII_WORD_PATTERN = re.compile(r"[A-Za-z0-9_]+")
+
+
+def _keyword_key(keyword: str) -> str:
+    """关键词的查表键：短关键词保留大小写，长关键词转小写"""
+    return keyword if len(keyword) <= CASE_SENSITIVE_MAX_LEN else keyword.lower()
+
+
+@lru_cache(maxsize=None)
+def _compile_tech_keywords() -> Tuple[re.Pattern, Dict]:
+    """
+    把 TECH_STACK_KEYWORDS 编译成单遍扫描用的正则和查找表（首次扫描时编译一次）
+
+    扫描正则只匹配完整的 ASCII 单词和中文关键词，因此 "py" 不会命中 "happy"。
+    含标点或空格的关键词（Node.js、C++、.NET、Machine Learning）以其中第一个
+    单词为入口，命中入口后再比较前后文。
+
+    Returns:
+        (扫描正则, 查表键 → (类别或 None, [(前缀, 后缀, 类别, 是否区分大小写)]))
+    """
+    index: Dict[str, Tuple[str | None, list]] = {}
+    cjk = []
+    for category, keywords in TECH_STACK_KEYWORDS.items():
+        for keyword in keywords:
+            head = _ASCII_WORD_PATTERN.search(keyword)
+            if head is None:
+                cjk.append(keyword)
+                key = keyword
+            else:
+                key = _keyword_key(head.group())
+            word_category, compounds = index.get(key, (None, []))
+
+            if head is None or head.group() == keyword:
+                index[key] = (word_category or category, compounds)
+                continue
+
+            prefix = keyword[: head.start()]
+            suffix = keyword[head.end() :]
+            case_sensitive = len(keyword) <= CASE_SENSITIVE_MAX_LEN
+            if not case_sensitive:
+                prefix, suffix = prefix.lower(), suffix.lower()
+            compounds.append((prefix, suffix, category, case_sensitive))
+            # 同一入口的复合关键词，更长的优先
+            compounds.sort(key=lambda c: len(c[0]) + len(c[1]), reverse=True)
+            index[key] = (word_category, compounds)
+
+    alternatives = [r"[A-Za-z0-9_]+"]
+    alternatives += [re.escape(k) for k in sorted(set(cjk), key=len, reverse=True)]
+    return re.compile("|".join(alternatives)), index
+
+
+# 标题中的单词（学习目标的章节主题）
+WORD_PATTERN = re.compile(r"\b\w+\b")
+
+# 大写缩写词 | 函数/方法调用
+TERM_PATTERN = re.compile(r"\b([A-Z]{3,})\b|(\w+)\s*\(")
+
 # 常见前置知识要求
 PREREQUISITE_TEMPLATES = {
     "编程语言基础": [
@@ -106,17 +197,42 @@ PREREQUISITE_TEMPLATES = {
 }
 
 
-def analyze_document(file_path: str | Path) -> Dict:
-    """分析文档结构，返回分析结果"""
-    if isinstance(file_path, str):
-        file_path = Path(file_path)
+# 分析规则或结果格式变化时修改，使持久化的分析缓存失效
+ANALYSIS_VERSION = "2"
+
+KEY_TERMS_LIMIT = 15  # 关键术语的最大数量
+
+# 统计术语时每段的大致字节数
+TERMS_CHUNK_SIZE = 1024 * 1024
+
+_COMMON_FUNCS = {
+    "print",
+    "return",
+    "if",
+    "else",
+    "for",
+    "while",
+    "def",
+    "class",
+    "import",
+    "from",
+    "export",
+    "default",
+    "const",
+    "let",
+    "var",
+    "function",
+}
+
 
+def read_markdown(file_path: str | Path) -> str:
+    """读取 markdown 文件内容"""
     with open(file_path, "r", encoding="utf-8") as f:
-        content = f.read()
+        return f.read()
 
-    lines = content.split("\n")
 
-    analysis = {
+def _new_analysis() -> Dict:
+    return {
         "title": "",
         "headings": [],
         "code_blocks": [],
@@ -128,42 +244,122 @@ def analyze_document(file_path: str | Path) -> Dict:
         "suggestions": [],
     }
 
-    # 提取标题（第一个 # 标题）
-    for line in lines:
-        if line.startswith("# "):
-            analysis["title"] = line[2:].strip()
-            break
-
-    # 提取所有标题层级
-    for i, line in enumerate(lines):
-        match = re.match(r"^(#{1,6})\s+(.+)$", line)
-        if match:
-            level = len(match.group(1))
-            heading = match.group(2).strip()
-            analysis["headings"].append(
-                {"level": level, "text": heading, "line": i + 1}
-            )
 
-    # 提取代码块
-    in_code_block = False
+def _add_heading(analysis: Dict, line: str, line_no: int) -> None:
+    """记录一个标题，第一个一级标题作为文档标题"""
+    match = HEADING_PATTERN.match(line)
+    level = len(match.group(1))
+    heading = match.group(2).strip()
+    analysis["headings"].append({"level": level, "text": heading, "line": line_no})
+    if level == 1 and not analysis["title"]:
+        analysis["title"] = heading
+
+
+def analyze_document(
+    file_path: str | Path | None,
+    content: str | None = None,
+    tokens: MarkdownTokens | None = None,
+) -> Dict:
+    """
+    分析文档结构，返回分析结果
+
+    Args:
+        file_path: markdown 文件路径
+        content: 已读入内存的文档内容，提供时不再读取文件
+        tokens: 已有的分词结果，提供时不再重新分词
+    """
+    if tokens is None:
+        if content is None:
+            content = read_markdown(file_path)
+        tokens = tokenize(content)
+
+    lines = tokens.lines
+    analysis = _new_analysis()
+
+    # 一次遍历行类型，提取标题、代码块和步骤
     code_block_start = None
-    for i, line in enumerate(lines):
-        if line.startswith("```"):
-            if not in_code_block:
-                in_code_block = True
-                code_block_start = i
-                lang = line[3:].strip() if len(line) > 3 else ""
-                analysis["code_blocks"].append(
-                    {"start_line": i, "language": lang, "content": []}
+    for i, kind in enumerate(tokens.kinds):
+        if kind == HEADING:
+            _add_heading(analysis, lines[i], i + 1)
+        elif kind == STEP:
+            analysis["steps"].append({"line": i + 1, "text": lines[i].strip()})
+        elif kind == FENCE_OPEN:
+            code_block_start = i
+            lang = lines[i][3:].strip()
+            analysis["code_blocks"].append(
+                {"start_line": i, "language": lang, "content": []}
+            )
+        elif kind == FENCE_CLOSE:
+            analysis["code_blocks"][-1]["end_line"] = i
+            analysis["code_blocks"][-1]["content"] = lines[code_block_start : i + 1]
+        elif kind == CODE:
+            analysis["code_blocks"][-1]["content"].append(lines[i])
+
+    return _finish_analysis(analysis)
+
+
+def analyze_document_stream(
+    file_path: str | Path, terms: "TermScan | None" = None
+) -> Dict:
+    """
+    逐行读取文件分析文档结构，内存占用与文档大小无关
+
+    结果与 analyze_document 相同，只是代码块不复制内容，而是记录它在文件中的
+    字节范围 "start_offset" / "end_offset"（从开始围栏到结束围栏的换行符），
+    需要时用 read_code_block 读取。
+
+    Args:
+        terms: 提供时在同一遍读取中分段统计前置知识和关键术语
+    """
+    analysis = _new_analysis()
+    code_blocks = analysis["code_blocks"]
+    chunks = TextChunks() if terms is not None else None
+    with open(file_path, "rb") as f:
+        reader = FileLines(f)
+        for i, kind in enumerate(iter_kinds(reader)):
+            if chunks is not None:
+                text = chunks.add(reader, kind)
+                if text is not None:
+                    terms.feed(text)
+            if kind == HEADING:
+                _add_heading(analysis, reader.line, i + 1)
+            elif kind == STEP:
+                analysis["steps"].append({"line": i + 1, "text": reader.line.strip()})
+            elif kind == FENCE_OPEN:
+                code_blocks.append(
+                    {
+                        "start_line": i,
+                        "language": reader.line[3:].strip(),
+                        "start_offset": reader.start,
+                    }
                 )
-            else:
-                in_code_block = False
-                analysis["code_blocks"][-1]["end_line"] = i
-                analysis["code_blocks"][-1]["content"] = lines[code_block_start : i + 1]
-        elif in_code_block:
-            analysis["code_blocks"][-1]["content"].append(line)
-
-    # 检测已有结构
+            elif kind == FENCE_CLOSE:
+                code_blocks[-1]["end_line"] = i
+                code_blocks[-1]["end_offset"] = reader.end
+        # 未闭合的代码块延续到文件末尾
+        if code_blocks and "end_offset" not in code_blocks[-1]:
+            code_blocks[-1]["end_offset"] = reader.end
+    if chunks is not None:
+        text = chunks.flush()
+        if text is not None:
+            terms.feed(text)
+
+    return _finish_analysis(analysis)
+
+
+def read_code_block(file_path: str | Path, block: Dict) -> List[str]:
+    """读取 analyze_document_stream 记录的代码块（含围栏行）"""
+    with open(file_path, "rb") as f:
+        f.seek(block["start_offset"])
+        data = f.read(block["end_offset"] - block["start_offset"])
+    text = data.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+    if text.endswith("\n"):
+        text = text[:-1]
+    return text.split("\n")
+
+
+def _finish_analysis(analysis: Dict) -> Dict:
+    """检测已有结构并生成增强建议"""
     for heading in analysis["headings"]:
         text_lower = heading["text"].lower()
         if "学习目标" in text_lower or "学习目标" in text_lower:
@@ -173,12 +369,6 @@ def analyze_document(file_path: str | Path) -> Dict:
         if "常见问题" in text_lower or "faq" in text_lower:
             analysis["has_faq"] = True
 
-    # 检测步骤模式
-    step_pattern = r"^\d+[.)]\s+|^步骤\s*\d+|^第\s*\d+\s*步"
-    for i, line in enumerate(lines):
-        if re.search(step_pattern, line, re.IGNORECASE):
-            analysis["steps"].append({"line": i + 1, "text": line.strip()})
-
     # 生成增强建议
     if not analysis["has_learning_objectives"]:
         analysis["suggestions"].append(
@@ -221,72 +411,298 @@ def analyze_document(file_path: str | Path) -> Dict:
     return analysis
 
 
-def extract_key_terms(content: str) -> List[str]:
-    """从文档内容中提取关键技术术语"""
-    # 提取被反引号包裹的代码词汇
-    code_terms = re.findall(r"`([^`]+)`", content)
-
-    # 提取大写的英文缩写词（3个字母以上）
-    acronyms = re.findall(r"\b([A-Z]{3,})\b", content)
-
-    # 提取常见的函数/方法名模式
-    function_patterns = re.findall(r"(\w+)\s*\(", content)
-    common_funcs = {
-        "print",
-        "return",
-        "if",
-        "else",
-        "for",
-        "while",
-        "def",
-        "class",
-        "import",
-        "from",
-        "export",
-        "default",
-        "const",
-        "let",
-        "var",
-        "function",
-    }
-    functions = [
-        f for f in function_patterns if f.lower() not in common_funcs and len(f) > 2
-    ]
-
-    # 合并并去重
-    all_terms = list(set(code_terms + acronyms + functions))
-    return all_terms[:15]  # 限制返回数量
-
+def extract_key_terms(
+    content: str | None = None,
+    tokens: MarkdownTokens | None = None,
+    index: "TermIndex | None" = None,
+) -> List[str]:
+    """
+    从文档内容中提取关键技术术语
+
+    Args:
+        content: 文档内容
+        tokens: 已有的分词结果，提供时直接复用其中的行内代码片段
+        index: 语料术语索引（见 term_index.py），提供时按 TF-IDF 排序，
+            否则按首次出现的顺序
+    """
+    if tokens is None:
+        tokens = tokenize(content)
+
+    code_terms, acronyms, functions = _key_term_candidates(tokens)
+    if index is not None:
+        counts = Counter(code_terms + acronyms + functions)
+        return index.rank("terms", counts, KEY_TERMS_LIMIT)
+
+    # 合并并按首次出现的顺序去重
+    all_terms = list(dict.fromkeys(code_terms + acronyms + functions))
+    return all_terms[:KEY_TERMS_LIMIT]  # 限制返回数量
+
+
+def _key_term_candidates(
+    tokens: MarkdownTokens,
+) -> Tuple[List[str], List[str], List[str]]:
+    """返回 (行内代码, 大写缩写词, 函数/方法名) 三类候选术语"""
+    # 被反引号包裹的代码词汇（分词时已提取）
+    code_terms = tokens.code_spans
+
+    # 一次扫描同时提取大写缩写词（3个字母以上）和函数/方法名
+    acronyms = []
+    functions = []
+    for match in TERM_PATTERN.finditer(tokens.text):
+        if match.group(1) is not None:
+            acronyms.append(match.group(1))
+        else:
+            name = match.group(2)
+            if name.lower() not in _COMMON_FUNCS and len(name) > 2:
+                functions.append(name)
+    return code_terms, acronyms, functions
+
+
+class TermScan:
+    """
+    逐段累计前置知识、关键术语和术语出现次数，内存占用与文档大小无关
+
+    Args:
+        prerequisites: 是否检测前置知识（语料索引只需要术语出现次数）
+    """
+
+    def __init__(self, prerequisites: bool = True):
+        self.detect = prerequisites
+        self.prerequisites: Set[str] = set()
+        # 三类候选术语各自按首次出现的顺序保留，每类最多 KEY_TERMS_LIMIT 个即可
+        self.seen: Tuple[Dict, Dict, Dict] = ({}, {}, {})
+        self.terms: Dict[str, int] = {}
+        self.headings: Dict[str, int] = {}
+
+    def feed(self, text: str) -> None:
+        """统计一段内容（段在代码块之外的行边界切分）"""
+        if self.detect:
+            self.prerequisites.update(detect_prerequisites(text))
+        tokens = tokenize(text)
+        for found, first in zip(_key_term_candidates(tokens), self.seen):
+            for term in found:
+                self.terms[term] = self.terms.get(term, 0) + 1
+                if len(first) < KEY_TERMS_LIMIT:
+                    first.setdefault(term)
+        for line, kind in zip(tokens.lines, tokens.kinds):
+            if kind == HEADING:
+                for word in _topic_words(HEADING_PATTERN.match(line).group(2)):
+                    self.headings[word] = self.headings.get(word, 0) + 1
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """{"terms": {术语: 次数}, "headings": {标题主题词: 次数}}，按首次出现的顺序"""
+        return {"terms": self.terms, "headings": self.headings}
+
+    def result(self) -> Dict:
+        """
+        Returns:
+            {"prerequisites": [排序后的前置知识], "key_terms": [关键术语],
+            "counts": counts()}
+        """
+        key_terms = list(dict.fromkeys([t for terms in self.seen for t in terms]))
+        return {
+            "prerequisites": sorted(self.prerequisites),
+            "key_terms": key_terms[:KEY_TERMS_LIMIT],
+            "counts": self.counts(),
+        }
+
+
+class TextChunks:
+    """把逐行读到的内容按约 TERMS_CHUNK_SIZE 字节分段，只在代码块之外的行边界切分"""
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self.size = 0
+
+    def add(self, reader: FileLines, kind: str) -> str | None:
+        """加入 reader 当前行，凑满一段时返回该段"""
+        self.lines.append(reader.line)
+        self.size += reader.end - reader.start
+        if self.size >= TERMS_CHUNK_SIZE and kind not in (FENCE_OPEN, CODE):
+            return self.flush()
+        return None
+
+    def flush(self) -> str | None:
+        """返回剩余内容，没有时返回 None"""
+        if not self.lines:
+            return None
+        text = "\n".join(self.lines)
+        self.lines.clear()
+        self.size = 0
+        return text
+
+
+def scan_document_terms(file_path: str | Path) -> Dict:
+    """
+    逐段读取文件，检测前置知识并提取关键术语，内存占用与文档大小无关
+
+    关键术语按首次出现的顺序保留，结果与整篇调用 detect_prerequisites /
+    extract_key_terms 相同。
+
+    Returns:
+        TermScan.result() 的结果
+    """
+    scan = TermScan()
+    for text in _iter_text_chunks(file_path):
+        scan.feed(text)
+    return scan.result()
+
+
+def count_document_terms(file_path: str | Path) -> Dict[str, Dict[str, int]]:
+    """
+    逐段读取文件，统计候选关键术语和标题主题词的出现次数（供语料索引使用）
+
+    Returns:
+        {"terms": {术语: 次数}, "headings": {标题主题词: 次数}}，按首次出现的顺序
+    """
+    scan = TermScan(prerequisites=False)
+    for text in _iter_text_chunks(file_path):
+        scan.feed(text)
+    return scan.counts()
+
+
+def _iter_text_chunks(file_path: str | Path) -> Iterator[str]:
+    """按约 TERMS_CHUNK_SIZE 字节逐段产出文件内容，只在代码块之外的行边界切分"""
+    chunks = TextChunks()
+    with open(file_path, "rb") as f:
+        reader = FileLines(f)
+        for kind in iter_kinds(reader):
+            text = chunks.add(reader, kind)
+            if text is not None:
+                yield text
+    text = chunks.flush()
+    if text is not None:
+        yield text
+
+
+def _topic_words(text: str) -> List[str]:
+    """标题中可作为主题的词（小写，长度大于 3）"""
+    return [w for w in WORD_PATTERN.findall(text.lower()) if len(w) > 3]
+
+
+def cached_analysis(
+    file_path: str | Path, use_cache: bool = True, with_terms: bool = False
+) -> Tuple[Dict, Dict | None]:
+    """
+    analyze_document_stream 的结果，文件内容未变时从分析缓存读取
+
+    with_terms 为 True 时另外返回 scan_document_terms 的结果（否则为 None），
+    两者都需要计算时只读一遍文件。文档所在目录树有语料术语索引时，关键术语
+    改为按 TF-IDF 排序（见 term_index.py）。
+
+    Returns:
+        (结构分析, 前置知识和关键术语)
+    """
+    # 分析缓存（sqlite3）只有命令行分析用到，organize 流程导入本模块时不加载
+    from analysis_cache import cached, get_cache
+
+    cache = get_cache() if use_cache else None
+    if not with_terms:
+        analysis = cached(
+            cache,
+            file_path,
+            "analysis",
+            ANALYSIS_VERSION,
+            lambda: analyze_document_stream(file_path),
+        )
+        return analysis, None
+
+    scanned = {}
+
+    def scan() -> Dict:
+        terms = TermScan()
+        scanned["analysis"] = analyze_document_stream(file_path, terms)
+        return terms.result()
+
+    terms = cached(cache, file_path, "terms", ANALYSIS_VERSION, scan)
+    analysis = cached(
+        cache,
+        file_path,
+        "analysis",
+        ANALYSIS_VERSION,
+        lambda: scanned.get("analysis") or analyze_document_stream(file_path),
+    )
 
-def detect_prerequisites(content: str) -> Set[str]:
-    """根据文档内容检测相关的前置知识要求"""
-    content_lower = content.lower()
-    detected_prereqs = set()
+    from term_index import find_index
+
+    index = find_index(file_path)
+    if index is not None:
+        ranked = index.key_terms(file_path, KEY_TERMS_LIMIT, terms["counts"])
+        if ranked is not None:
+            terms = {**terms, "key_terms": ranked}
+    return analysis, terms
+
+
+def scan_tech_keywords(content: str) -> Dict[str, Dict]:
+    """
+    一次扫描文档，找出所有技术栈关键词
+
+    Returns:
+        {类别: {"count": 命中次数, "positions": [起始偏移], "terms": Counter(原文写法)}}
+    """
+    hits: Dict[str, Dict] = {}
+    token_pattern, keyword_index = _compile_tech_keywords()
+    lookup = keyword_index.get
+    covered = 0  # 已被复合关键词覆盖到的位置
+    for match in token_pattern.finditer(content):
+        word = match.group()
+        entry = lookup(word)
+        if entry is None and len(word) > CASE_SENSITIVE_MAX_LEN:
+            entry = lookup(word.lower())
+        if entry is None:
+            continue
+
+        start, end = match.span()
+        if start < covered:
+            continue
+        category, compounds = entry
+        for prefix, suffix, compound_category, case_sensitive in compounds:
+            left = start - len(prefix)
+            right = end + len(suffix)
+            if left < 0:
+                continue
+            before = content[left:start]
+            after = content[end:right]
+            if not case_sensitive:
+                before, after = before.lower(), after.lower()
+            if before != prefix or after != suffix:
+                continue
+            # 以单词字符结尾的复合关键词同样要求右侧词边界（Node.js ≠ Node.jsx）
+            if suffix[-1:].isalnum() and _ASCII_WORD_PATTERN.match(content, right):
+                continue
+            category = compound_category
+            start, end = left, right
+            covered = right
+            break
 
-    for category, keywords in TECH_STACK_KEYWORDS.items():
-        for keyword in keywords:
-            if keyword.lower() in content_lower:
-                if category == "python":
-                    detected_prereqs.add("Python 基础")
-                elif category == "javascript":
-                    detected_prereqs.add("JavaScript 基础")
-                elif category == "typescript":
-                    detected_prereqs.add("TypeScript 基础")
-                elif category == "shell":
-                    detected_prereqs.add("命令行基础")
-                elif category == "git":
-                    detected_prereqs.add("Git 版本控制")
-                elif category == "Markdown语法":
-                    detected_prereqs.add("Markdown 语法")
-                elif category == "html_css":
-                    detected_prereqs.add("HTML/CSS 基础")
-                elif category == "sql":
-                    detected_prereqs.add("数据库基础")
-                elif category == "api":
-                    detected_prereqs.add("API 概念")
-                elif category == "docker":
-                    detected_prereqs.add("Docker 基础")
-                break
+        if category is None:
+            continue
+        hit = hits.get(category)
+        if hit is None:
+            hit = hits[category] = {"count": 0, "positions": [], "terms": Counter()}
+        hit["count"] += 1
+        hit["positions"].append(start)
+        hit["terms"][content[start:end]] += 1
+    return hits
+
+
+def detect_prerequisites(
+    content: str, tech_hits: Dict[str, Dict] | None = None
+) -> Set[str]:
+    """
+    根据文档内容检测相关的前置知识要求
+
+    Args:
+        content: 文档内容
+        tech_hits: scan_tech_keywords 的结果，提供时不再重新扫描
+    """
+    if tech_hits is None:
+        tech_hits = scan_tech_keywords(content)
+    detected_prereqs = {
+        CATEGORY_PREREQUISITES[category]
+        for category in tech_hits
+        if category in CATEGORY_PREREQUISITES
+    }
 
     # 检测是否需要特定深度的基础知识
     if any(
@@ -298,11 +714,25 @@ def detect_prerequisites(content: str) -> Set[str]:
 
 
 def generate_learning_objectives(
-    content: str, title: str, headings: List[Dict]
+    content: str,
+    title: str,
+    headings: List[Dict],
+    tech_hits: Dict[str, Dict] | None = None,
+    index: "TermIndex | None" = None,
 ) -> List[str]:
-    """根据文档内容生成个性化的学习目标"""
+    """
+    根据文档内容生成个性化的学习目标
+
+    Args:
+        content: 文档内容
+        title: 文档标题
+        headings: analyze_document 提取的标题列表
+        tech_hits: scan_tech_keywords 的结果，标题中找不到主题词时
+            以出现最多的技术栈关键词作为主题
+        index: 语料术语索引，提供时章节主题词按 TF-IDF 选取（各文档都有的
+            泛用词排在后面），否则按出现次数
+    """
     objectives = []
-    content_lower = content.lower()
 
     # 从标题提取关键词
     title_keywords = re.findall(r"\b\w+\b", title.lower())
@@ -315,16 +745,21 @@ def generate_learning_objectives(
         ),
         None,
     )
+    if main_topic is None and tech_hits:
+        top = max(tech_hits.values(), key=lambda hit: hit["count"])
+        main_topic = top["terms"].most_common(1)[0][0]
 
     # 提取文档中的主要章节主题
     topic_words = []
     for heading in headings[:5]:
-        words = re.findall(r"\b\w+\b", heading["text"].lower())
-        topic_words.extend([w for w in words if len(w) > 3])
+        topic_words.extend(_topic_words(heading["text"]))
 
     # 统计高频主题词
     topic_counter = Counter(topic_words)
-    main_topics = [word for word, _ in topic_counter.most_common(3)]
+    if index is not None:
+        main_topics = index.rank("headings", topic_counter, 3)
+    else:
+        main_topics = [word for word, _ in topic_counter.most_common(3)]
 
     # 检测文档类型
     is_tutorial = any(
@@ -403,9 +838,17 @@ def generate_learning_objectives_content(objectives: List[str]) -> str:
     return "\n".join(lines)
 
 
-def generate_enhanced_content(file_path: str | Path) -> str:
-    """生成增强后的文档内容建议"""
-    analysis = analyze_document(file_path)
+def generate_enhanced_content(
+    file_path: str | Path, use_cache: bool = True, with_terms: bool = False
+) -> str:
+    """
+    生成增强后的文档内容建议
+
+    逐行读取文件分析，不把文档读入内存；分析结果按文件内容缓存（use_cache 为
+    False 时不读写缓存），文件未变时不再重新分析。with_terms 为 True 时报告
+    末尾附加检测到的前置知识和关键术语。
+    """
+    analysis, terms = cached_analysis(file_path, use_cache, with_terms)
 
     suggestions = []
     suggestions.append(f"# 内容增强分析报告: {Path(file_path).name}")
@@ -438,31 +881,53 @@ def generate_enhanced_content(file_path: str | Path) -> str:
     if len(analysis["headings"]) > 10:
         suggestions.append(f"... 及其他 {len(analysis['headings']) - 10} 个标题")
 
-    return "\n".join(suggestions)
+    if terms is not None:
+        suggestions.append(f"\n## 检测到的前置知识")
+        for prereq in terms["prerequisites"] or ["（未检测到特定技术栈）"]:
+            suggestions.append(f"- {prereq}")
 
+        if terms["key_terms"]:
+            suggestions.append(f"\n## 关键术语")
+            suggestions.append(", ".join(terms["key_terms"]))
 
-def enhance_markdown_content(file_path: str | Path) -> str:
-    """增强 markdown 内容（在原内容基础上添加缺失部分）"""
-    if isinstance(file_path, str):
-        file_path = Path(file_path)
+    return "\n".join(suggestions)
 
-    with open(file_path, "r", encoding="utf-8") as f:
-        content = f.read()
 
-    analysis = analyze_document(file_path)
+def enhance_markdown_content(
+    file_path: str | Path | None,
+    content: str | None = None,
+    tokens: MarkdownTokens | None = None,
+    index: "TermIndex | None" = None,
+) -> str:
+    """
+    增强 markdown 内容（在原内容基础上添加缺失部分）
+
+    Args:
+        file_path: markdown 文件路径
+        content: 已读入内存的文档内容，提供时不再读取文件
+        tokens: 已有的分词结果，提供时不再重新分词
+        index: 语料术语索引，提供时学习目标的章节主题按 TF-IDF 选取
+    """
+    if tokens is None:
+        if content is None:
+            content = read_markdown(file_path)
+        tokens = tokenize(content)
+    content = tokens.text
+
+    analysis = analyze_document(file_path, tokens=tokens)
     enhanced_content = content
 
-    # 找到第一个标题的位置（用于插入学习目标和前置知识）
-    first_heading_match = re.search(r"^#{1,6}\s+.+$", content, re.MULTILINE)
-
-    if first_heading_match:
-        heading_pos = first_heading_match.start()
+    # 第一个标题的位置（用于插入学习目标和前置知识）
+    if analysis["headings"]:
+        heading_pos = tokens.line_offset(analysis["headings"][0]["line"] - 1)
+        # 技术栈关键词只扫描一次，学习目标和前置知识共用
+        tech_hits = scan_tech_keywords(content)
 
         # 如果缺少学习目标，生成个性化内容
         if not analysis["has_learning_objectives"]:
             # 根据文档实际内容生成个性化的学习目标
             learning_objectives = generate_learning_objectives(
-                content, analysis["title"], analysis["headings"]
+                content, analysis["title"], analysis["headings"], tech_hits, index
             )
             learning_section = generate_learning_objectives_content(learning_objectives)
 
@@ -476,7 +941,7 @@ def enhance_markdown_content(file_path: str | Path) -> str:
         # 如果缺少前置知识，生成个性化内容
         if not analysis["has_prerequisites"]:
             # 根据文档内容检测需要的前置知识
-            detected_prereqs = detect_prerequisites(content)
+            detected_prereqs = detect_prerequisites(content, tech_hits)
             prerequisites_section = generate_prerequisites_content(
                 content, detected_prereqs
             )
@@ -515,9 +980,14 @@ def enhance_markdown_content(file_path: str | Path) -> str:
     return enhanced_content
 
 
-def main():
-    """命令行入口"""
-    if len(sys.argv) < 2:
+def main(argv: List[str] | None = None):
+    """命令行入口，argv 为 None 时使用 sys.argv"""
+    args = sys.argv[1:] if argv is None else list(argv)
+    use_cache = "--no-cache" not in args
+    with_terms = "--terms" in args
+    args = [arg for arg in args if arg not in ("--no-cache", "--terms")]
+
+    if not args:
         print("用法:")
         print("  分析文档结构:")
         print("    python enhance_content.py --analyze <markdown文件路径>")
@@ -525,30 +995,37 @@ def main():
         print("    python enhance_content.py --suggest <markdown文件路径>")
         print("  自动增强内容:")
         print("    python enhance_content.py --enhance <markdown文件路径>")
+        print("  --no-cache: 不读写分析缓存")
+        print("  --terms: --analyze / --suggest 同时输出前置知识和关键术语")
         sys.exit(1)
 
-    command = sys.argv[1]
-    file_path = sys.argv[2] if len(sys.argv) > 2 else None
+    command = args[0]
+    file_path = args[1] if len(args) > 1 else None
 
     if not file_path:
         print("错误: 请指定 markdown 文件路径")
         sys.exit(1)
 
     if command == "--analyze":
-        analysis = analyze_document(file_path)
+        analysis, terms = cached_analysis(file_path, use_cache, with_terms)
         print(f"文档分析结果: {file_path}")
         print(f"- 标题: {analysis['title']}")
         print(f"- 标题层级数: {len(analysis['headings'])}")
         print(f"- 代码块数: {len(analysis['code_blocks'])}")
         print(f"- 步骤数: {len(analysis['steps'])}")
         print(f"- 增强建议数: {len(analysis['suggestions'])}")
+        if terms is not None:
+            print(f"- 前置知识: {', '.join(terms['prerequisites']) or '无'}")
+            print(f"- 关键术语: {', '.join(terms['key_terms']) or '无'}")
 
     elif command == "--suggest":
-        suggestions = generate_enhanced_content(file_path)
+        suggestions = generate_enhanced_content(file_path, use_cache, with_terms)
         print(suggestions)
 
     elif command == "--enhance":
-        enhanced = enhance_markdown_content(file_path)
+        from term_index import find_index
+
+        enhanced = enhance_markdown_content(file_path, index=find_index(file_path))
 
         # 写入增强后的内容
         output_path = Path(file_path)
@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+"""
+共享 HTTP 下载客户端
+
+功能：
+1. 复用连接（按主机维护连接池，保持 keep-alive）
+2. 对幂等请求的临时失败进行指数退避重试（带随机抖动）
+3. 分别配置连接超时和读取超时
+4. 流式写入临时文件，限制最大体积，完整后原子替换到目标路径
+5. 传输中断后保留 .part 文件，用 Range / If-Range 续传
+
+requests / urllib3 在第一次发出请求时才导入，不访问网络的调用不承担其导入开销。
+"""
+
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import requests
+
+
+# 默认配置
+DEFAULT_CONNECT_TIMEOUT = 10.0  # 连接超时（秒）
+DEFAULT_READ_TIMEOUT = 30.0  # 读取超时（秒）
+DEFAULT_RETRIES = 3  # 最大重试次数
+DEFAULT_BACKOFF_FACTOR = 0.5  # 退避基数（秒）：0.5, 1, 2, 4 ...
+DEFAULT_BACKOFF_MAX = 20.0  # 单次退避上限（秒）
+DEFAULT_POOL_CONNECTIONS = 16  # 缓存的主机连接池数量
+DEFAULT_POOL_MAXSIZE = 8  # 每个主机连接池的最大连接数
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024  # 单个文件的最大体积（字节）
+DEFAULT_CHUNK_SIZE = 64 * 1024  # 流式写入的块大小（字节）
+
+# 值得重试的临时性状态码（429 不在其中：限流由 download_scheduler.HostHealth
+# 按主机处理，暂停该主机的所有请求，而不是让一个线程独自等待 Retry-After）
+RETRY_STATUS_CODES = (408, 425, 500, 502, 503, 504)
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
+}
+
+
+class DownloadError(IOError):
+    """下载未能完整完成（超出体积上限、内容不完整等）"""
+
+
+@lru_cache(maxsize=None)
+def _interrupted() -> tuple:
+    """传输中断：连接断开、读取超时、分块传输不完整、收到的字节数不足"""
+    import requests
+
+    return (
+        requests.ConnectionError,
+        requests.Timeout,
+        requests.exceptions.ChunkedEncodingError,
+        DownloadError,
+    )
+
+
+@lru_cache(maxsize=None)
+def _jitter_retry_class() -> type:
+    """JitterRetry 类（首次使用时导入 urllib3 并定义）"""
+    from urllib3.util.retry import Retry
+
+    class JitterRetry(Retry):
+        """在 urllib3 指数退避的基础上叠加随机抖动，避免重试请求同时涌向同一主机"""
+
+        def get_backoff_time(self) -> float:
+            backoff = super().get_backoff_time()
+            if backoff <= 0:
+                return 0
+            # 在 [backoff/2, backoff] 之间随机取值
+            return min(DEFAULT_BACKOFF_MAX, random.uniform(backoff / 2, backoff))
+
+    return JitterRetry
+
+
+class FetchClient:
+    """
+    带连接池和重试策略的 HTTP 客户端
+
+    Args:
+        connect_timeout: 建立连接的超时时间（秒）
+        read_timeout: 两次读取数据之间的超时时间（秒）
+        retries: 临时失败的最大重试次数
+        backoff_factor: 指数退避基数（秒）
+        pool_connections: 缓存的主机连接池数量
+        pool_maxsize: 每个主机连接池的最大连接数
+        max_bytes: 单个文件的最大体积（字节），None 表示不限制
+        resume_attempts: 传输中断后立即续传的次数，None 时与 retries 相同
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+        backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+        pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        max_bytes: int | None = DEFAULT_MAX_BYTES,
+        resume_attempts: int | None = None,
+    ):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_bytes = max_bytes
+        self.resume_attempts = retries if resume_attempts is None else resume_attempts
+        self._session: "requests.Session | None" = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self) -> "requests.Session":
+        """连接池会话，第一次使用时创建"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def _create_session(self) -> "requests.Session":
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        retry = _jitter_retry_class()(
+            total=self.retries,
+            connect=self.retries,
+            read=self.retries,
+            status=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            # Retry-After 可能长达数小时，urllib3 会在当前线程中照等；
+            # 交给 HostHealth 判断是暂停主机还是熔断
+            respect_retry_after_header=False,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=retry,
+        )
+
+        session = requests.Session()
+        session.headers.update(DEFAULT_HEADERS)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    @property
+    def timeout(self) -> tuple[float, float]:
+        """requests 使用的 (连接超时, 读取超时)"""
+        return (self.connect_timeout, self.read_timeout)
+
+    def get(self, url: str, **kwargs) -> "requests.Response":
+        """发送 GET 请求，未指定超时时使用客户端配置"""
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def download_to_file(self, url: str, dest: Path, **kwargs) -> dict:
+        """
+        流式下载 url 到 dest
+
+        数据先分块写入同目录下的 .<文件名>.part，校验完整后再原子替换为 dest，
+        因此 dest 要么不存在，要么是完整的文件。请求头中带有 If-None-Match /
+        If-Modified-Since 且服务器返回 304 时，不写入任何内容。
+
+        服务器声明 Accept-Ranges: bytes 并提供 ETag 或 Last-Modified 时，传输中断
+        后保留 .part 文件：本次调用内立即用 Range / If-Range 续传（最多
+        resume_attempts 次），之后的调用也会从已下载的位置继续。资源已变化时
+        服务器返回完整内容，.part 从头重写。
+
+        Returns:
+            {"status", "size", "digest", "etag", "last_modified", "resumed_from"}，
+            304 时 size 为 0、digest 为 None
+
+        Raises:
+            requests.RequestException: 网络或 HTTP 状态错误
+            DownloadError: 超出体积上限或内容不完整
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        headers = dict(kwargs.pop("headers", None) or {})
+        # 条件请求（刷新）不与续传混用
+        conditional = "If-None-Match" in headers or "If-Modified-Since" in headers
+
+        with PartFile(dest, url) as part:
+            if part.locked is False:
+                # 另一个进程正在下载同一文件，改用独立的临时文件，不续传
+                return self._download_once(url, dest, None, headers, kwargs)
+            if conditional:
+                part.discard()
+            attempt = 0
+            while True:
+                try:
+                    return self._download_once(url, dest, part, headers, kwargs)
+                except _interrupted():
+                    # 只有留下了可续传的 .part 时才立即重试
+                    attempt += 1
+                    if attempt > self.resume_attempts or not part.offset():
+                        raise
+
+    def _download_once(
+        self,
+        url: str,
+        dest: Path,
+        part: "PartFile | None",
+        headers: dict,
+        kwargs: dict,
+    ) -> dict:
+        """发送一次请求并写入 .part（part 为 None 时写入独立的临时文件）"""
+        offset = part.offset() if part is not None else 0
+        request_headers = dict(headers)
+        if offset:
+            request_headers["Range"] = f"bytes={offset}-"
+            request_headers["If-Range"] = part.validator
+
+        with self.session.get(
+            url, stream=True, headers=request_headers, **kwargs
+        ) as response:
+            if response.status_code == 416 and offset:
+                # 续传位置无效（资源变短等），丢弃后从头下载
+                part.discard()
+                return self._download_once(url, dest, part, headers, kwargs)
+            response.raise_for_status()
+
+            result = {
+                "status": response.status_code,
+                "size": 0,
+                "digest": None,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "resumed_from": 0,
+            }
+            if response.status_code == 304:
+                return result
+
+            encoded = response.headers.get("Content-Encoding", "identity")
+            if response.status_code == 206:
+                start, total = _content_range(response)
+                if start != offset or encoded != "identity":
+                    if not offset:
+                        # 未发送 Range 却收到不匹配的部分内容，重试也无济于事
+                        raise DownloadError(
+                            f"服务器返回了不匹配的部分内容: 从 {start} 字节开始"
+                        )
+                    # 续传位置不符，丢弃 .part 后不带 Range 重新下载
+                    if part is not None:
+                        part.discard()
+                    return self._download_once(url, dest, part, headers, kwargs)
+                expected = total
+                result["resumed_from"] = offset
+            else:
+                # 服务器忽略了 Range，或资源已变化（If-Range 不匹配）
+                offset = 0
+                expected = _content_length(response)
+                # 经过压缩传输时 Content-Length 是压缩后的长度，无法比较
+                if encoded != "identity":
+                    expected = None
+
+            # 根据声明的长度提前拒绝超大文件
+            if self.max_bytes is not None and expected is not None:
+                if expected > self.max_bytes:
+                    if part is not None:
+                        part.discard()
+                    raise DownloadError(
+                        f"文件过大: {expected} 字节，超过上限 {self.max_bytes} 字节"
+                    )
+
+            if part is None:
+                fd, tmp_name = tempfile.mkstemp(
+                    prefix=f".{dest.name}.", suffix=".tmp", dir=dest.parent
+                )
+                out = os.fdopen(fd, "wb")
+                tmp_path = Path(tmp_name)
+                resumable = False
+            else:
+                # 可续传的前提：服务器支持按字节范围请求，有校验用的 ETag /
+                # Last-Modified，且内容未经压缩
+                resumable = (
+                    encoded == "identity"
+                    and response.headers.get("Accept-Ranges", "").lower() == "bytes"
+                    and part.start(response.headers, offset, expected)
+                )
+                out = part.open(offset)
+                tmp_path = part.path
+
+            digest = hashlib.sha256()
+            if offset:
+                _hash_prefix(tmp_path, offset, digest)
+            written = offset
+            try:
+                with out:
+                    for chunk in response.iter_content(DEFAULT_CHUNK_SIZE):
+                        written += len(chunk)
+                        # 服务器未声明或谎报长度时，按实际字节数中止
+                        if self.max_bytes is not None and written > self.max_bytes:
+                            resumable = False
+                            raise DownloadError(
+                                f"文件过大: 超过上限 {self.max_bytes} 字节"
+                            )
+                        out.write(chunk)
+                        digest.update(chunk)
+                    out.flush()
+                    os.fsync(out.fileno())
+
+                # 完整性校验：实际字节数必须与声明的长度一致
+                if expected is not None and written != expected:
+                    if written > expected:
+                        resumable = False
+                    raise DownloadError(
+                        f"内容不完整: 收到 {written} 字节，应为 {expected} 字节"
+                    )
+                if written == 0:
+                    resumable = False
+                    raise DownloadError("响应内容为空")
+
+                os.replace(tmp_path, dest)
+            except BaseException:
+                # 可续传时保留 .part，否则删除
+                if part is None:
+                    tmp_path.unlink(missing_ok=True)
+                elif not resumable:
+                    part.discard()
+                raise
+
+        if part is not None:
+            part.finish()
+        result["size"] = written
+        result["digest"] = digest.hexdigest()
+        return result
+
+    def close(self) -> None:
+        """关闭所有连接池"""
+        if self._session is not None:
+            self._session.close()
+
+
+def _content_length(response: "requests.Response") -> int | None:
+    """解析响应的 Content-Length，缺失或非法时返回 None"""
+    value = response.headers.get("Content-Length")
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _content_range(response: "requests.Response") -> tuple[int | None, int | None]:
+    """解析 206 响应的 Content-Range: bytes 起始-结束/总长，返回 (起始, 总长)"""
+    value = response.headers.get("Content-Range", "")
+    try:
+        unit, _, rest = value.partition(" ")
+        span, _, total = rest.partition("/")
+        start = int(span.split("-", 1)[0])
+        if unit.lower() != "bytes":
+            return None, None
+        return start, int(total) if total != "*" else None
+    except ValueError:
+        return None, None
+
+
+def _hash_prefix(path: Path, size: int, digest) -> None:
+    """把文件前 size 字节计入摘要（续传时已下载的部分）"""
+    with open(path, "rb") as f:
+        remaining = size
+        while remaining:
+            chunk = f.read(min(DEFAULT_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise DownloadError("续传文件比记录的短")
+            digest.update(chunk)
+            remaining -= len(chunk)
+
+
+class PartFile:
+    """
+    续传用的 .<文件名>.part 及其说明文件 .<文件名>.part.json
+
+    说明文件记录 URL、用于 If-Range 的校验值（强 ETag 优先，否则
+    Last-Modified）和总长度；与当前 URL 不符或缺失时不续传。进入上下文时
+    尝试对 .part 加排他锁（fcntl 可用时），locked 为 False 表示另一个进程
+    正在下载同一文件。
+    """
+
+    def __init__(self, dest: Path, url: str):
+        dest = Path(dest)
+        self.path = dest.with_name(f".{dest.name}.part")
+        self.meta_path = dest.with_name(f".{dest.name}.part.json")
+        self.url = url
+        self.validator: str | None = None
+        self.locked: bool | None = None
+        self._lock_fd: int | None = None
+
+    def __enter__(self) -> "PartFile":
+        try:
+            import fcntl
+        except ImportError:  # 非 POSIX 平台不加锁
+            return self
+        lock_path = self.path.with_name(self.path.name + ".lock")
+        self._lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self.locked = True
+        except OSError:
+            self.locked = False
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._lock_fd is not None:
+            if self.locked:
+                # 不在 img 目录中留下锁文件（极少数情况下刚打开旧锁文件的进程
+                # 会与之后的进程同时写入，最终仍由长度和摘要校验兜底）
+                self.path.with_name(self.path.name + ".lock").unlink(missing_ok=True)
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def offset(self) -> int:
+        """可续传的字节数，没有有效的 .part 时为 0"""
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            size = self.path.stat().st_size
+        except (OSError, ValueError):
+            return 0
+        if meta.get("url") != self.url or not meta.get("validator"):
+            return 0
+        if meta.get("length") is not None and size >= meta["length"]:
+            return 0
+        self.validator = meta["validator"]
+        return size
+
+    def start(self, headers, offset: int, length: int | None) -> bool:
+        """
+        开始写入：记录响应的校验值，返回中断后是否可以续传
+
+        If-Range 只接受强 ETag，弱 ETag（W/ 开头）时改用 Last-Modified。
+        """
+        etag = headers.get("ETag")
+        if etag and not etag.startswith("W/"):
+            validator = etag
+        else:
+            validator = headers.get("Last-Modified")
+        if not validator:
+            self._remove(self.meta_path)
+            return False
+        if offset and validator != self.validator:
+            return False
+        meta = {"url": self.url, "validator": validator, "length": length}
+        with open(self.meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        self.validator = validator
+        return True
+
+    def open(self, offset: int):
+        """从 offset 开始写入 .part（offset 为 0 时清空）"""
+        f = open(self.path, "r+b" if offset else "wb")
+        if offset:
+            f.seek(offset)
+            f.truncate()
+        return f
+
+    def finish(self) -> None:
+        """.part 已替换为目标文件，删除说明文件"""
+        self._remove(self.meta_path)
+
+    def discard(self) -> None:
+        """删除 .part 和说明文件"""
+        self._remove(self.path)
+        self._remove(self.meta_path)
+        self.validator = None
+
+    @staticmethod
+    def _remove(path: Path) -> None:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def is_complete_file(path: Path) -> bool:
+    """判断本地文件是否可以当作已下载的缓存（存在且非空）"""
+    try:
+        return path.is_file() and path.stat().st_size > 0
+    except OSError:
+        return False
+
+
+_default_client: FetchClient | None = None
+_default_kwargs: dict = {}
+_default_lock = threading.Lock()
+
+
+def get_client() -> FetchClient:
+    """获取进程内共享的默认客户端（首次调用时创建）"""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = FetchClient()
+        return _default_client
+
+
+def configure_client(**kwargs) -> FetchClient:
+    """
+    用指定参数重建共享客户端，参数同 FetchClient
+
+    参数与当前客户端相同时直接复用，保留已建立的连接（常驻的 worker 进程中
+    每个请求都会重新配置一次）。
+    """
+    global _default_client, _default_kwargs
+    with _default_lock:
+        if _default_client is not None:
+            if kwargs == _default_kwargs:
+                return _default_client
+            _default_client.close()
+        _default_client = FetchClient(**kwargs)
+        _default_kwargs = kwargs
+        return _default_client
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+带缓存的文件名索引
+
+resolve_file_path 在工作目录和 $HOME 中按文件名查找文档时使用。首次使用时
+遍历一次目录树（限制深度，跳过 .git、node_modules 等大目录），把每个目录的
+文件列表和修改时间写入缓存；之后每次只需 stat 已索引的目录，修改时间变化的
+目录才重新列出。按文件名查询是一次字典查找，候选 .md 文件列表来自同一份索引。
+"""
+
+import json
+import os
+import tempfile
+from pathlib import Path
+
+# 环境变量：缓存根目录（默认 $XDG_CACHE_HOME/markdown-organizer 或 ~/.cache/markdown-organizer）
+CACHE_ENV_VAR = "MARKDOWN_ORGANIZER_CACHE"
+
+# 默认索引深度：根目录为第 0 层，索引第 0 ~ 2 层目录中的文件
+DEFAULT_MAX_DEPTH = 3
+
+# 索引时跳过的目录（另外跳过所有隐藏目录）
+INDEX_SKIP_DIRS = {
+    "node_modules",
+    "__pycache__",
+    "venv",
+    "site-packages",
+    "Library",
+    "AppData",
+    "target",
+    "build",
+    "dist",
+}
+
+
+def get_cache_dir(name: str) -> Path:
+    """返回（并创建）缓存根目录下的子目录"""
+    root = os.environ.get(CACHE_ENV_VAR)
+    if root:
+        base = Path(root).expanduser()
+    else:
+        xdg = os.environ.get("XDG_CACHE_HOME")
+        base = (Path(xdg) if xdg else Path.home() / ".cache") / "markdown-organizer"
+    path = base / name
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _skip_dir(name: str) -> bool:
+    return name.startswith(".") or name in INDEX_SKIP_DIRS
+
+
+class FileIndex:
+    """
+    单个根目录的文件名索引
+
+    缓存内容：{"root", "max_depth", "dirs": {相对目录: {"mtime_ns", "depth",
+    "files": [文件名], "subdirs": [子目录名]}}}
+
+    Args:
+        root: 索引的根目录
+        max_depth: 索引深度（根目录为第 0 层，只索引深度小于该值的目录）
+        cache_dir: 缓存目录，None 时使用 get_cache_dir("file-index")
+    """
+
+    def __init__(
+        self,
+        root: str | Path,
+        max_depth: int = DEFAULT_MAX_DEPTH,
+        cache_dir: Path | None = None,
+    ):
+        self.root = Path(root).resolve()
+        self.max_depth = max_depth
+        import hashlib
+
+        key = hashlib.sha1(f"{self.root}\0{max_depth}".encode("utf-8")).hexdigest()
+        try:
+            cache_dir = cache_dir or get_cache_dir("file-index")
+            self.cache_path: Path | None = Path(cache_dir) / f"{key[:16]}.json"
+        except OSError:
+            # 缓存目录不可写时只在内存中索引
+            self.cache_path = None
+
+        self._dirs: dict[str, dict] = self._load()
+        self._dirty = False
+        self._by_name: dict[str, list[str]] | None = None
+
+    def _load(self) -> dict[str, dict]:
+        if self.cache_path is None:
+            return {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        if data.get("root") != str(self.root):
+            return {}
+        if data.get("max_depth") != self.max_depth:
+            return {}
+        return data.get("dirs", {})
+
+    def _abs(self, rel: str) -> Path:
+        return self.root / rel if rel else self.root
+
+    def _scan(self, rel: str, depth: int) -> None:
+        """列出一个目录，记录文件和子目录，并递归扫描新出现的子目录"""
+        path = self._abs(rel)
+        files = []
+        subdirs = []
+        try:
+            mtime_ns = path.stat().st_mtime_ns
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not _skip_dir(entry.name):
+                                subdirs.append(entry.name)
+                        elif entry.is_file():
+                            files.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError:
+            self._dirs.pop(rel, None)
+            return
+
+        old = self._dirs.get(rel)
+        self._dirs[rel] = {
+            "mtime_ns": mtime_ns,
+            "depth": depth,
+            "files": files,
+            "subdirs": subdirs,
+        }
+        self._dirty = True
+
+        # 消失的子目录连同其下的记录一起删除
+        if old:
+            for name in set(old["subdirs"]) - set(subdirs):
+                self._drop(os.path.join(rel, name) if rel else name)
+
+        if depth + 1 < self.max_depth:
+            for name in subdirs:
+                child = os.path.join(rel, name) if rel else name
+                if child not in self._dirs:
+                    self._scan(child, depth + 1)
+
+    def _drop(self, rel: str) -> None:
+        if not rel:
+            self._dirs.clear()
+            self._dirty = True
+            return
+        prefix = rel + os.sep
+        for key in [k for k in self._dirs if k == rel or k.startswith(prefix)]:
+            del self._dirs[key]
+        self._dirty = True
+
+    def refresh(self) -> None:
+        """校验缓存：stat 每个已索引目录，只重新列出修改时间变化的目录"""
+        if "" not in self._dirs:
+            self._dirs = {}
+            self._scan("", 0)
+        else:
+            # 由浅到深，父目录重新扫描时删除的子目录不再检查
+            for rel in sorted(self._dirs, key=lambda k: self._dirs[k]["depth"]):
+                entry = self._dirs.get(rel)
+                if entry is None:
+                    continue
+                try:
+                    mtime_ns = self._abs(rel).stat().st_mtime_ns
+                except OSError:
+                    self._drop(rel)
+                    continue
+                if mtime_ns != entry["mtime_ns"]:
+                    self._scan(rel, entry["depth"])
+        self._by_name = None
+
+    def _name_map(self) -> dict[str, list[str]]:
+        if self._by_name is None:
+            by_name: dict[str, list[str]] = {}
+            # 浅层目录优先，同一文件名返回最浅的匹配
+            for rel in sorted(self._dirs, key=lambda k: (self._dirs[k]["depth"], k)):
+                for name in self._dirs[rel]["files"]:
+                    by_name.setdefault(name, []).append(rel)
+            self._by_name = by_name
+        return self._by_name
+
+    def find(self, name: str) -> list[Path]:
+        """按文件名查找，返回所有匹配（浅层优先）"""
+        return [self._abs(rel) / name for rel in self._name_map().get(name, [])]
+
+    def markdown_files(self, max_depth: int = 2) -> list[Path]:
+        """深度小于 max_depth 的目录中的 .md 文件"""
+        found = []
+        for rel in sorted(self._dirs, key=lambda k: (self._dirs[k]["depth"], k)):
+            entry = self._dirs[rel]
+            if entry["depth"] >= max_depth:
+                continue
+            found.extend(
+                self._abs(rel) / name for name in entry["files"] if name.endswith(".md")
+            )
+        return found
+
+    def save(self) -> None:
+        """原子写入缓存文件"""
+        if not self._dirty or self.cache_path is None:
+            return
+        data = {
+            "root": str(self.root),
+            "max_depth": self.max_depth,
+            "dirs": self._dirs,
+        }
+        try:
+            fd, tmp_name = tempfile.mkstemp(
+                prefix=".index.", suffix=".tmp", dir=self.cache_path.parent
+            )
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_name, self.cache_path)
+        except OSError:
+            # 缓存写入失败不影响查找结果
+            return
+        self._dirty = False
+
+
+def open_index(root: str | Path, max_depth: int = DEFAULT_MAX_DEPTH) -> FileIndex:
+    """打开根目录的索引，校验并更新缓存后返回"""
+    index = FileIndex(root, max_depth)
+    index.refresh()
+    index.save()
+    return index
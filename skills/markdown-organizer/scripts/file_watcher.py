@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+监视目录树中 markdown 文件的变化
+
+Linux 上通过 ctypes 调用 inotify（只用标准库），其他平台、inotify 不可用或
+监视数量达到系统上限时，退回按修改时间轮询。两种方式都只报告 .md 文件，
+跳过隐藏文件（编辑器的 .draft.md 之类）、隐藏目录和 skip_dirs 中的目录（img
+等工具自己的输出目录）。
+
+每个文件记录上次见到的 (修改时间, 大小)：stat 未变的事件被忽略；处理完文件后
+调用 mark() 记录工具写回后的状态，工具自己的写入因此不会再次触发处理。
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+from pathlib import Path
+
+DEFAULT_DEBOUNCE = 0.2  # 最后一次写入后等待多久再处理（秒）
+DEFAULT_POLL_INTERVAL = 0.5  # 轮询模式的扫描间隔（秒）
+MAX_DEBOUNCE_WAIT = 2.0  # 持续写入时最多推迟处理的时间（秒）
+
+# inotify 常量（见 <sys/inotify.h>）
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE_SELF
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _stat_key(path: Path) -> tuple[int, int] | None:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class FileWatcher:
+    """
+    监视器基类：维护文件状态，提供 mark() 和按防抖分批的 batches()
+
+    Args:
+        roots: 监视的目录
+        skip_dirs: 跳过的目录名（另外跳过所有隐藏目录）
+    """
+
+    kind = "base"
+
+    def __init__(self, roots: list[Path], skip_dirs: set[str]):
+        self.roots = [Path(r).resolve() for r in roots]
+        self.skip_dirs = skip_dirs
+        self._seen: dict[Path, tuple[int, int]] = {}
+
+    def _skip(self, name: str) -> bool:
+        return name.startswith(".") or name in self.skip_dirs
+
+    @staticmethod
+    def _is_markdown(name: str) -> bool:
+        """需要报告的文件：.md 结尾且不是隐藏文件"""
+        return name.endswith(".md") and not name.startswith(".")
+
+    def _walk(self, root: Path):
+        """递归产出 (目录, [.md 文件])"""
+        for dirpath, dirs, files in os.walk(root):
+            dirs[:] = [d for d in dirs if not self._skip(d)]
+            yield Path(dirpath), [f for f in files if self._is_markdown(f)]
+
+    def snapshot(self) -> list[Path]:
+        """记录当前所有 .md 文件的状态，返回文件列表"""
+        found = []
+        for root in self.roots:
+            for directory, files in self._walk(root):
+                for name in files:
+                    path = directory / name
+                    key = _stat_key(path)
+                    if key is not None:
+                        self._seen[path] = key
+                        found.append(path)
+        return sorted(found)
+
+    def mark(self, path: Path) -> None:
+        """记录文件当前状态（工具写回文件后调用，忽略这次写入产生的事件）"""
+        key = _stat_key(path)
+        if key is None:
+            self._seen.pop(path, None)
+        else:
+            self._seen[path] = key
+
+    def _changed(self, paths) -> set[Path]:
+        """过滤出状态与上次记录不同的文件，并更新记录"""
+        changed = set()
+        for path in paths:
+            key = _stat_key(path)
+            if key is None:
+                self._seen.pop(path, None)
+            elif self._seen.get(path) != key:
+                self._seen[path] = key
+                changed.add(path)
+        return changed
+
+    def poll(self, timeout: float) -> set[Path]:
+        """等待最多 timeout 秒，返回发生变化的 .md 文件"""
+        raise NotImplementedError
+
+    def batches(
+        self,
+        debounce: float = DEFAULT_DEBOUNCE,
+        max_wait: float = MAX_DEBOUNCE_WAIT,
+    ):
+        """
+        持续产出变化的文件集合
+
+        收到第一个变化后继续收集，直到 debounce 秒内没有新的变化（或累计等待
+        超过 max_wait 秒）才产出，一次保存产生的多次写入只处理一次。
+        """
+        while True:
+            pending = self.poll(None)
+            if not pending:
+                continue
+            deadline = time.monotonic() + max_wait
+            while time.monotonic() < deadline:
+                more = self.poll(debounce)
+                if not more:
+                    break
+                pending |= more
+            yield sorted(pending)
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "FileWatcher":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class PollingWatcher(FileWatcher):
+    """按修改时间轮询的监视器"""
+
+    kind = "polling"
+
+    def __init__(
+        self,
+        roots: list[Path],
+        skip_dirs: set[str],
+        interval: float = DEFAULT_POLL_INTERVAL,
+    ):
+        super().__init__(roots, skip_dirs)
+        self.interval = interval
+
+    def _scan(self) -> set[Path]:
+        paths = set()
+        for root in self.roots:
+            for directory, files in self._walk(root):
+                paths.update(directory / name for name in files)
+        return paths
+
+    def poll(self, timeout: float | None) -> set[Path]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changed = self._changed(self._scan())
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            wait = self.interval
+            if deadline is not None:
+                wait = min(wait, max(0.0, deadline - time.monotonic()))
+            time.sleep(wait)
+
+
+class InotifyWatcher(FileWatcher):
+    """
+    基于 inotify 的监视器（仅 Linux）
+
+    Raises:
+        OSError: inotify 不可用或监视数量超过系统上限
+    """
+
+    kind = "inotify"
+
+    def __init__(self, roots: list[Path], skip_dirs: set[str]):
+        super().__init__(roots, skip_dirs)
+        name = ctypes.util.find_library("c")
+        libc = ctypes.CDLL(name or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify 不可用")
+        self._libc = libc
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._dirs: dict[int, Path] = {}
+        try:
+            for root in self.roots:
+                self._watch_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, directory: Path) -> None:
+        wd = self._libc.inotify_add_watch(
+            self._fd, os.fsencode(directory), _WATCH_MASK | _IN_ONLYDIR
+        )
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                return  # 目录已被删除或无权访问
+            raise OSError(err, f"无法监视 {directory}: {os.strerror(err)}")
+        self._dirs[wd] = directory
+
+    def _watch_tree(self, root: Path) -> set[Path]:
+        """监视 root 及其子目录，返回其中已有的 .md 文件"""
+        found = set()
+        for directory, files in self._walk(root):
+            self._add_watch(directory)
+            found.update(directory / name for name in files)
+        return found
+
+    def poll(self, timeout: float | None) -> set[Path]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self._fd], [], [], wait)
+            if not ready:
+                return set()
+            changed = self._changed(self._read_events())
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def _read_events(self) -> set[Path]:
+        candidates: set[Path] = set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return candidates
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & _IN_Q_OVERFLOW:
+                # 事件队列溢出：重新扫描全部目录，由状态比较找出变化
+                for root in self.roots:
+                    candidates |= self._watch_tree(root)
+                continue
+            if mask & (_IN_IGNORED | _IN_DELETE_SELF):
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = directory / os.fsdecode(name)
+            if mask & _IN_ISDIR:
+                # 新建或移入的目录：开始监视，并检查其中已有的文件
+                if mask & (_IN_CREATE | _IN_MOVED_TO) and not self._skip(path.name):
+                    candidates |= self._watch_tree(path)
+            elif self._is_markdown(path.name) and mask & (
+                _IN_CLOSE_WRITE | _IN_MOVED_TO
+            ):
+                candidates.add(path)
+        return candidates
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def open_watcher(
+    roots: list[Path],
+    skip_dirs: set[str],
+    poll: bool = False,
+    interval: float = DEFAULT_POLL_INTERVAL,
+) -> FileWatcher:
+    """优先使用 inotify，不可用（或 poll 为 True）时使用轮询"""
+    if not poll and hasattr(os, "O_CLOEXEC"):
+        try:
+            return InotifyWatcher(roots, skip_dirs)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(roots, skip_dirs, interval)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+图片缓存清单
+
+为每个 img 目录记录已下载图片的 HTTP 缓存信息（ETag、Last-Modified、大小、摘要），
+刷新时据此发送条件请求，未变化的图片只需一次 304 往返。
+"""
+
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+# 清单文件名（位于 img 目录内）
+MANIFEST_NAME = ".manifest.json"
+
+
+class ImageManifest:
+    """
+    img 目录的 URL → 缓存信息 清单
+
+    每个条目：{"filename", "etag", "last_modified", "size", "digest"}
+
+    Args:
+        img_dir: 图片目录
+    """
+
+    def __init__(self, img_dir: Path):
+        self.path = Path(img_dir) / MANIFEST_NAME
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = self._load()
+        self._dirty = False
+
+    def _load(self) -> dict[str, dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def get(self, url: str) -> dict | None:
+        """查询 URL 的缓存信息"""
+        with self._lock:
+            return self._entries.get(url)
+
+    def record(self, url: str, **fields) -> None:
+        """记录（或更新）URL 的缓存信息"""
+        with self._lock:
+            entry = self._entries.setdefault(url, {})
+            entry.update({k: v for k, v in fields.items() if v is not None})
+            self._dirty = True
+
+    def sources(self) -> dict[str, str]:
+        """
+        文件名 → 来源 URL（优化后的文件名也指向原 URL），
+        用于由文档中的 ./img/<文件名> 引用找回原图地址
+        """
+        with self._lock:
+            found = {}
+            for url, entry in self._entries.items():
+                for name in (entry.get("filename"), entry.get("optimized")):
+                    if name:
+                        found[name] = url
+            return found
+
+    def conditional_headers(self, url: str) -> dict[str, str]:
+        """生成条件请求头，无缓存信息时返回空字典"""
+        entry = self.get(url) or {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def save(self) -> None:
+        """原子写入清单文件（与其他进程写入的条目合并）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            merged = self._load()
+            merged.update(self._entries)
+            self._entries = merged
+
+            fd, tmp_name = tempfile.mkstemp(
+                prefix=".manifest.", suffix=".tmp", dir=self.path.parent
+            )
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(merged, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_name, self.path)
+            self._dirty = False
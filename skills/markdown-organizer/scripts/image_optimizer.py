@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+下载后的图片优化（可选，需要 Pillow）
+
+功能：
+1. 宽度超过上限的图片按比例缩小
+2. 以原格式重新压缩，并可尝试转换为 WebP / AVIF，取最小的结果
+3. 去除 EXIF 等元数据（保留 ICC 色彩配置）
+4. 按源图片摘要和优化参数缓存结果，同一张图片只处理一次
+
+优化结果比原图小时，img 目录中的原图替换为 <名称>.min<扩展名>，文档引用
+指向优化后的文件；图片缓存清单记录 URL 对应的优化文件，之后再处理时
+不再下载原图。CPU 密集的编码在进程池中执行。Pillow 和进程池在第一次优化时才
+导入，未启用 --optimize 的调用不承担其开销。
+"""
+
+import atexit
+import importlib.util
+import io
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from file_index import get_cache_dir
+from image_manifest import ImageManifest
+from image_store import file_digest
+from metrics import NULL_METRICS, Metrics
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+
+DEFAULT_MAX_WIDTH = 1600  # 最大宽度（像素），0 表示不缩放
+DEFAULT_QUALITY = 82  # JPEG / WebP / AVIF 压缩质量
+CONVERT_FORMATS = ("none", "webp", "avif")
+
+# 优化后文件名的后缀：abc.png → abc.min.webp
+OPTIMIZED_SUFFIX = ".min"
+
+# Pillow 能重新编码的格式；GIF（可能是动图）、SVG 等保持原样
+_FORMATS = {
+    ".jpg": "JPEG",
+    ".jpeg": "JPEG",
+    ".png": "PNG",
+    ".webp": "WEBP",
+    ".avif": "AVIF",
+}
+
+# 缓存中表示“优化后不会更小”的标记文件扩展名
+_NO_GAIN = ".keep"
+
+
+class OptimizeOptions:
+    """
+    图片优化参数
+
+    Args:
+        max_width: 最大宽度（像素），0 表示不缩放
+        quality: 有损格式的压缩质量（1 ~ 100）
+        convert: 额外尝试的目标格式，见 CONVERT_FORMATS
+    """
+
+    def __init__(
+        self,
+        max_width: int = DEFAULT_MAX_WIDTH,
+        quality: int = DEFAULT_QUALITY,
+        convert: str = "webp",
+    ):
+        if convert not in CONVERT_FORMATS:
+            raise ValueError(
+                f"未知的目标格式: {convert}，可选: {', '.join(CONVERT_FORMATS)}"
+            )
+        self.max_width = max(0, max_width)
+        self.quality = min(100, max(1, quality))
+        self.convert = convert
+
+    @property
+    def signature(self) -> str:
+        """参数签名：用于缓存键、清单记录和文档处理版本"""
+        return f"w{self.max_width}-q{self.quality}-{self.convert}"
+
+
+def is_available() -> bool:
+    """是否安装了 Pillow（只查找，不导入）"""
+    return importlib.util.find_spec("PIL") is not None
+
+
+def _encode(image, fmt: str, quality: int, icc_profile: bytes | None) -> bytes:
+    buffer = io.BytesIO()
+    options = {"icc_profile": icc_profile} if icc_profile else {}
+    if fmt == "JPEG":
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(
+            buffer, "JPEG", quality=quality, optimize=True, progressive=True, **options
+        )
+    elif fmt == "PNG":
+        image.save(buffer, "PNG", optimize=True, **options)
+    elif fmt == "WEBP":
+        image.save(buffer, "WEBP", quality=quality, method=6, **options)
+    else:
+        image.save(buffer, fmt, quality=quality, **options)
+    return buffer.getvalue()
+
+
+def optimize_bytes(
+    data: bytes, ext: str, options: OptimizeOptions
+) -> tuple[bytes, str] | None:
+    """
+    优化一张图片
+
+    Returns:
+        (优化后的字节, 扩展名)；无法处理或结果不比原图小时返回 None
+    """
+    fmt = _FORMATS.get(ext.lower())
+    if fmt is None:
+        return None
+    from PIL import Image, ImageOps, features
+
+    with Image.open(io.BytesIO(data)) as opened:
+        if getattr(opened, "is_animated", False):
+            return None
+        icc_profile = opened.info.get("icc_profile")
+        # 按 EXIF 方向旋转后再丢弃 EXIF
+        image = ImageOps.exif_transpose(opened)
+        if options.max_width and image.width > options.max_width:
+            height = max(1, round(image.height * options.max_width / image.width))
+            image = image.resize((options.max_width, height), Image.LANCZOS)
+
+        targets = [(fmt, ext.lower())]
+        if options.convert != "none" and features.check(options.convert):
+            targets.append((options.convert.upper(), f".{options.convert}"))
+
+        best: tuple[bytes, str] | None = None
+        for target_fmt, target_ext in targets:
+            try:
+                encoded = _encode(image, target_fmt, options.quality, icc_profile)
+            except (OSError, ValueError, KeyError):
+                continue
+            if best is None or len(encoded) < len(best[0]):
+                best = (encoded, target_ext)
+
+    if best is None or len(best[0]) >= len(data):
+        return None
+    return best
+
+
+def _optimize_into_cache(
+    src: str, ext: str, cache_base: str, options: OptimizeOptions
+) -> str | None:
+    """
+    进程池任务：优化 src 并写入缓存 <cache_base><扩展名>
+
+    Returns:
+        缓存文件路径；没有收益时写入标记文件并返回 None
+    """
+    with open(src, "rb") as f:
+        data = f.read()
+    try:
+        result = optimize_bytes(data, ext, options)
+    except Exception:
+        # 无法识别或已损坏的图片保持原样
+        result = None
+    target = cache_base + (result[1] if result else _NO_GAIN)
+    fd, tmp_name = tempfile.mkstemp(
+        prefix=".opt.", suffix=".tmp", dir=os.path.dirname(target)
+    )
+    with os.fdopen(fd, "wb") as f:
+        f.write(result[0] if result else b"")
+    os.replace(tmp_name, target)
+    return target if result else None
+
+
+def _cached(cache_base: str) -> str | None | bool:
+    """查询缓存：优化文件路径、None（没有收益）或 False（未缓存）"""
+    if os.path.exists(cache_base + _NO_GAIN):
+        return None
+    for ext in _FORMATS:
+        path = cache_base + ext
+        if os.path.exists(path):
+            return path
+    return False
+
+
+def optimized_name(filename: str, ext: str) -> str:
+    """优化后的文件名：abc.png → abc.min.webp"""
+    return f"{Path(filename).stem}{OPTIMIZED_SUFFIX}{ext}"
+
+
+def reuse_optimized(
+    urls: list[str], img_dir: Path, options: OptimizeOptions
+) -> dict[str, str]:
+    """
+    已用相同参数优化过、优化文件仍在的 URL，无需再下载
+
+    Returns:
+        URL → 优化后的文件名
+    """
+    manifest = ImageManifest(img_dir)
+    reused = {}
+    for url in urls:
+        entry = manifest.get(url) or {}
+        name = entry.get("optimized")
+        if name and entry.get("optimized_with") == options.signature:
+            if (img_dir / name).is_file():
+                reused[url] = name
+    return reused
+
+
+def optimize_images(
+    results: dict[str, str | None],
+    img_dir: Path,
+    options: OptimizeOptions,
+    metrics: Metrics = NULL_METRICS,
+) -> dict[str, str | None]:
+    """
+    优化刚下载的图片
+
+    Args:
+        results: download_images 的结果（URL → 文件名，失败为 None）
+        img_dir: 图片目录
+        options: 优化参数
+
+    Returns:
+        URL → 文档中应引用的文件名（优化后的或原文件）
+    """
+    if not is_available():
+        print("  ⚠️ 未安装 Pillow，跳过图片优化（pip install Pillow）")
+        return results
+
+    cache_dir = get_cache_dir("optimized")
+    # 源文件 → 缓存位置；多个 URL 可能指向同一个文件
+    work: dict[str, dict] = {}
+    for url, filename in results.items():
+        if not filename or filename in work:
+            continue
+        src = img_dir / filename
+        ext = src.suffix.lower()
+        if ext not in _FORMATS or not src.is_file():
+            continue
+        digest = file_digest(src)
+        base = cache_dir / digest[:2] / f"{digest}-{options.signature}"
+        base.parent.mkdir(exist_ok=True)
+        work[filename] = {"src": src, "ext": ext, "base": str(base)}
+
+    # 先查缓存，只把未处理过的图片交给进程池
+    misses = []
+    for item in work.values():
+        cached = _cached(item["base"])
+        if cached is False:
+            misses.append(item)
+        else:
+            item["cached"] = cached
+            metrics.count("optimize_cache_hits")
+    if misses:
+        args = [(str(i["src"]), i["ext"], i["base"], options) for i in misses]
+        if len(misses) == 1 or _jobs == 1:
+            outputs = [_optimize_into_cache(*a) for a in args]
+        else:
+            outputs = list(_get_pool().map(_optimize_into_cache, *zip(*args)))
+        for item, output in zip(misses, outputs):
+            item["cached"] = output
+
+    # 用优化结果替换 img 中的原图
+    manifest = ImageManifest(img_dir)
+    renamed: dict[str, str] = {}
+    for filename, item in work.items():
+        cached = item["cached"]
+        if cached is None:
+            continue
+        name = optimized_name(filename, os.path.splitext(cached)[1])
+        _link_or_copy(Path(cached), img_dir / name)
+        saved = item["src"].stat().st_size - (img_dir / name).stat().st_size
+        metrics.count("optimize_saved_bytes", saved)
+        item["src"].unlink()
+        renamed[filename] = name
+        print(f"  🗜️ 已优化: {filename} → {name}（节省 {saved} 字节）")
+
+    optimized = {}
+    for url, filename in results.items():
+        name = renamed.get(filename)
+        if name:
+            manifest.record(url, optimized=name, optimized_with=options.signature)
+        optimized[url] = name or filename
+    manifest.save()
+    return optimized
+
+
+def _link_or_copy(src: Path, dest: Path) -> None:
+    """从缓存硬链接到 img 目录（跨文件系统时复制），原子替换已有文件"""
+    tmp = dest.with_name(f".{dest.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dest)
+    except BaseException:
+        if os.path.lexists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+_pool: "ProcessPoolExecutor | None" = None
+_jobs: int | None = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> "ProcessPoolExecutor":
+    """进程内共享的优化进程池（首次需要时创建，进程退出时关闭）"""
+    global _pool
+    from concurrent.futures import ProcessPoolExecutor
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=_jobs)
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def configure_optimizer(jobs: int | None = None) -> None:
+    """设置优化进程数，1 表示在当前进程中处理（批量模式的工作进程使用）"""
+    global _pool, _jobs
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+        _jobs = jobs
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+内容寻址的全局图片仓库
+
+功能：
+1. 按图片内容的 SHA-256 存储，相同字节只保存一份
+2. 维护 URL → 摘要 索引，已知 URL 无需再访问网络
+3. 通过硬链接 / reflink / 符号链接 / 复制 填充各文档的 img 目录
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+# 环境变量：设置后默认启用全局仓库
+STORE_ENV_VAR = "MARKDOWN_ORGANIZER_STORE"
+
+# 链接方式，auto 依次尝试 hardlink → reflink → symlink → copy
+LINK_MODES = ("auto", "hardlink", "reflink", "symlink", "copy")
+
+# Linux FICLONE ioctl（btrfs / xfs 等支持写时复制的文件系统）
+_FICLONE = 0x40049409
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path: Path) -> str:
+    """计算文件内容的 SHA-256"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _reflink(src: Path, dest: Path) -> None:
+    """使用 FICLONE 创建写时复制副本，不支持时抛出 OSError"""
+    import fcntl
+
+    with open(src, "rb") as s, open(dest, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            os.unlink(dest)
+            raise
+
+
+class ImageStore:
+    """
+    内容寻址图片仓库
+
+    目录结构：
+        <root>/objects/ab/abcdef....png   图片内容（按摘要命名）
+        <root>/index.json                 URL → {"digest", "ext"} 索引
+
+    Args:
+        root: 仓库根目录
+        link_mode: 填充 img 目录的方式，见 LINK_MODES
+    """
+
+    def __init__(self, root: str | Path, link_mode: str = "auto"):
+        if link_mode not in LINK_MODES:
+            raise ValueError(
+                f"未知的链接方式: {link_mode}，可选: {', '.join(LINK_MODES)}"
+            )
+        self.root = Path(root).expanduser()
+        self.objects_dir = self.root / "objects"
+        self.index_path = self.root / "index.json"
+        self.link_mode = link_mode
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._index: dict[str, dict] = self._load_index()
+        self._dirty = False
+
+    def _load_index(self) -> dict[str, dict]:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def object_path(self, digest: str, ext: str) -> Path:
+        """摘要对应的对象文件路径"""
+        return self.objects_dir / digest[:2] / f"{digest}{ext}"
+
+    def lookup(self, url: str) -> Path | None:
+        """查询 URL 对应的已存储对象，不存在时返回 None"""
+        with self._lock:
+            entry = self._index.get(url)
+        if not entry:
+            return None
+        path = self.object_path(entry["digest"], entry.get("ext", ""))
+        return path if path.is_file() else None
+
+    def adopt(self, url: str, local_path: Path, digest: str | None = None) -> Path:
+        """
+        将刚下载的文件纳入仓库，并把 local_path 替换为指向仓库对象的链接
+
+        Args:
+            url: 图片 URL
+            local_path: 已下载的完整文件
+            digest: 已知的 SHA-256（下载时已计算），None 时重新计算
+
+        Returns:
+            仓库中对象文件的路径
+        """
+        if digest is None:
+            digest = file_digest(local_path)
+        ext = local_path.suffix
+        obj = self.object_path(digest, ext)
+
+        if not obj.is_file():
+            obj.parent.mkdir(parents=True, exist_ok=True)
+            # 先写到临时名再原子替换，避免并发进程看到半成品
+            tmp = obj.with_name(f".{obj.name}.{_tmp_suffix()}")
+            try:
+                try:
+                    os.link(local_path, tmp)
+                except OSError:
+                    shutil.copyfile(local_path, tmp)
+                os.replace(tmp, obj)
+            except BaseException:
+                if os.path.lexists(tmp):
+                    os.unlink(tmp)
+                raise
+
+        # 相同内容已存在时，让 local_path 指向已有对象以节省空间
+        if not _same_file(obj, local_path):
+            self.link_into(obj, local_path)
+
+        with self._lock:
+            self._index[url] = {"digest": digest, "ext": ext}
+            self._dirty = True
+        return obj
+
+    def link_into(self, obj: Path, dest: Path) -> str:
+        """
+        在 dest 位置创建指向 obj 的链接（原子替换已有文件）
+
+        Returns:
+            实际使用的链接方式
+        """
+        if _same_file(obj, dest):
+            return "hardlink"
+
+        modes = (
+            ("hardlink", "reflink", "symlink", "copy")
+            if self.link_mode == "auto"
+            else (self.link_mode,)
+        )
+        tmp = dest.with_name(f".{dest.name}.{_tmp_suffix()}")
+
+        last_error: OSError | None = None
+        for mode in modes:
+            try:
+                if mode == "hardlink":
+                    os.link(obj, tmp)
+                elif mode == "reflink":
+                    _reflink(obj, tmp)
+                elif mode == "symlink":
+                    os.symlink(obj.resolve(), tmp)
+                else:
+                    shutil.copyfile(obj, tmp)
+                os.replace(tmp, dest)
+                return mode
+            except OSError as e:
+                last_error = e
+                if os.path.lexists(tmp):
+                    os.unlink(tmp)
+        raise last_error or OSError(f"无法链接 {obj} → {dest}")
+
+    def save(self) -> None:
+        """持久化 URL 索引（与磁盘上其他进程写入的条目合并）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            merged = self._load_index()
+            merged.update(self._index)
+            self._index = merged
+
+            fd, tmp_name = tempfile.mkstemp(
+                prefix=".index.", suffix=".tmp", dir=self.root
+            )
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(merged, f, ensure_ascii=False)
+            os.replace(tmp_name, self.index_path)
+            self._dirty = False
+
+
+def _tmp_suffix() -> str:
+    """进程内、线程间都唯一的临时文件后缀"""
+    return f"{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def _same_file(a: Path, b: Path) -> bool:
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False
+
+
+_default_store: ImageStore | None = None
+_store_configured = False
+_store_lock = threading.Lock()
+
+
+def get_store() -> ImageStore | None:
+    """获取全局图片仓库，未配置时根据环境变量决定，均未设置则返回 None"""
+    global _default_store, _store_configured
+    with _store_lock:
+        if not _store_configured:
+            root = os.environ.get(STORE_ENV_VAR)
+            _default_store = ImageStore(root) if root else None
+            _store_configured = True
+        return _default_store
+
+
+def configure_store(
+    root: str | Path | None, link_mode: str = "auto"
+) -> ImageStore | None:
+    """设置全局图片仓库，root 为 None 时禁用；与当前仓库相同时直接复用"""
+    global _default_store, _store_configured
+    with _store_lock:
+        current = _default_store
+        if (
+            root
+            and current is not None
+            and current.root == Path(root).expanduser()
+            and current.link_mode == link_mode
+        ):
+            _store_configured = True
+            return current
+        _default_store = ImageStore(root, link_mode) if root else None
+        _store_configured = True
+        return _default_store
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Markdown 单遍分词器
+
+对文档做一次逐行扫描，给每一行标注类型（空行、标题、步骤、代码围栏、代码等），
+并按需提取行内的代码片段和图片。文档分析、格式美化、图片提取和术语提取
+共用同一份结果，不再各自对全文反复扫描。
+"""
+
+import re
+from typing import BinaryIO, Iterable, Iterator, NamedTuple
+
+# 行类型
+BLANK = 0  # 空行（或只有空白）
+TEXT = 1  # 普通正文
+HEADING = 2  # ATX 标题: # ~ ######
+STEP = 3  # 步骤行: "1. " / "步骤 1" / "第 1 步"
+FENCE_OPEN = 4  # 代码块开始 ```lang
+FENCE_CLOSE = 5  # 代码块结束 ```
+CODE = 6  # 代码块内部的行
+
+FENCE = "```"
+
+HEADING_PATTERN = re.compile(r"(#{1,6})\s+(.*)")
+STEP_PATTERN = re.compile(r"\d+[.)]\s+|步骤\s*\d+|第\s*\d+\s*步", re.IGNORECASE)
+
+# 图片标题："title" / 'title' / (title)
+_TITLE = r"""(?:\s+("[^"]*"|'[^']*'|\([^)]*\)))?"""
+
+# 行内元素：代码片段在前，代码片段内的图片语法不会被当成图片
+INLINE_PATTERN = re.compile(
+    # 1 代码片段
+    r"`([^`]+)`"
+    # 2 alt，3 <url> 或 4 url，5 标题：![alt](url "title")
+    r"|!\[([^\]]*)\]\(\s*(?:<([^>]*)>|([^\s)]+))"
+    + _TITLE
+    + r"\s*\)"
+    # 6 alt，7 url：不符合规范但常见的写法，如 URL 中带空格
+    r"|!\[([^\]]*)\]\(([^)]+)\)"
+    # 8 alt，9 引用名：![alt][ref] / ![alt][]
+    r"|!\[([^\]]*)\]\[([^\]]*)\]"
+    # 10 引用名：![ref]
+    r"|!\[([^\]]+)\](?![\[(:])"
+    # 11 / 12 / 13 HTML <img src>
+    r"""|(?i:<img\b[^>]*?\bsrc\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+)))"""
+)
+
+# 引用定义：[ref]: url "title"，1 引用名，2 <url> 或 3 url，4 标题
+REFERENCE_PATTERN = re.compile(
+    r" {0,3}\[([^\]]+)\]:\s*(?:<([^>]*)>|(\S+))" + _TITLE + r"\s*$"
+)
+
+# 步骤行可能的首字符
+_STEP_LEADS = frozenset("0123456789步第")
+
+# 所有 Unicode 空白字符（最大码位为 U+3000 全角空格），用于按首字符快速分流
+WHITESPACE = frozenset(c for c in map(chr, range(0x3001)) if c.isspace())
+
+# 需要进一步判断类型的首字符（标题、步骤或空白行）
+_SPECIAL_LEADS = _STEP_LEADS | WHITESPACE | {"#"}
+
+
+class ImageRef(NamedTuple):
+    """
+    文档中的一处图片
+
+    line / start / end 是 URL 文本在行内的位置（不含尖括号和引号），
+    替换这一段即可改写图片地址，alt、标题和其余写法保持不变。
+    引用式图片指向引用定义所在的行。
+    """
+
+    line: int
+    start: int
+    end: int
+    url: str
+    alt: str
+    title: str | None
+    syntax: str  # "inline" / "reference" / "html"
+
+
+class MarkdownTokens:
+    """
+    分词结果
+
+    Attributes:
+        lines: 文档按 "\\n" 切分后的行
+        kinds: 与 lines 一一对应的行类型
+    """
+
+    def __init__(self, lines: list[str], kinds: list[int]):
+        self.lines = lines
+        self.kinds = kinds
+        self._text: str | None = None
+        self._inline: tuple[list, list] | None = None
+
+    @property
+    def text(self) -> str:
+        """还原后的完整文档"""
+        if self._text is None:
+            self._text = "\n".join(self.lines)
+        return self._text
+
+    def with_lines(self, lines: list[str]) -> "MarkdownTokens":
+        """替换行内容（行数和行类型不变）后的新结果，用于行内改写"""
+        return MarkdownTokens(lines, self.kinds)
+
+    def line_offset(self, index: int) -> int:
+        """第 index 行（从 0 开始）在 text 中的起始偏移"""
+        return sum(len(line) for line in self.lines[:index]) + index
+
+    @property
+    def images(self) -> list[ImageRef]:
+        """代码块和代码片段之外的图片（按所在位置排序）"""
+        return self._scan_inline()[0]
+
+    @property
+    def code_spans(self) -> list[str]:
+        """代码块之外的行内代码片段内容"""
+        return self._scan_inline()[1]
+
+    def _scan_inline(self) -> tuple[list, list]:
+        if self._inline is None:
+            images = []
+            spans = []
+            # 引用名 → (行号, 匹配结果)，以及引用式图片的使用处 [(引用名, alt)]
+            definitions: dict[str, tuple[int, re.Match]] = {}
+            references: list[tuple[str, str]] = []
+            for i, kind in enumerate(self.kinds):
+                if kind == BLANK or kind >= FENCE_OPEN:
+                    continue
+                line = self.lines[i]
+                if "]:" in line:
+                    match = REFERENCE_PATTERN.match(line)
+                    if match:
+                        definitions.setdefault(_label(match.group(1)), (i, match))
+                        continue
+                if "`" not in line and "![" not in line and "<" not in line:
+                    continue
+                for match in INLINE_PATTERN.finditer(line):
+                    group = match.group
+                    if group(1) is not None:
+                        spans.append(group(1))
+                    elif group(2) is not None:
+                        n = 3 if group(3) is not None else 4
+                        images.append(_image_ref(i, match, n, group(2), 5, "inline"))
+                    elif group(6) is not None:
+                        images.append(_image_ref(i, match, 7, group(6), 0, "inline"))
+                    elif group(8) is not None:
+                        references.append((group(9) or group(8), group(8)))
+                    elif group(10) is not None:
+                        references.append((group(10), group(10)))
+                    else:
+                        n = next(n for n in (11, 12, 13) if group(n) is not None)
+                        images.append(_image_ref(i, match, n, "", 0, "html"))
+
+            # 引用式图片改写的是引用定义中的 URL，同一个定义只记录一次
+            used = set()
+            for label, alt in references:
+                label = _label(label)
+                if label in used or label not in definitions:
+                    continue
+                used.add(label)
+                i, match = definitions[label]
+                n = 2 if match.group(2) is not None else 3
+                images.append(_image_ref(i, match, n, alt, 4, "reference"))
+
+            images.sort()
+            self._inline = (images, spans)
+        return self._inline
+
+
+def _label(label: str) -> str:
+    """引用名规范化：忽略大小写，连续空白视为一个空格"""
+    return " ".join(label.split()).casefold()
+
+
+def _image_ref(
+    line: int, match: re.Match, url_group: int, alt: str, title_group: int, syntax: str
+) -> ImageRef:
+    title = match.group(title_group) if title_group else None
+    return ImageRef(
+        line,
+        match.start(url_group),
+        match.end(url_group),
+        match.group(url_group),
+        alt,
+        title[1:-1] if title else None,
+        syntax,
+    )
+
+
+def classify_line(line: str) -> int:
+    """判断代码块之外的一行的类型"""
+    if not line or line.isspace():
+        return BLANK
+    lead = line[0]
+    if lead == "#" and HEADING_PATTERN.match(line):
+        return HEADING
+    if lead in _STEP_LEADS and STEP_PATTERN.match(line):
+        return STEP
+    return TEXT
+
+
+def iter_kinds(lines: Iterable[str]) -> Iterator[int]:
+    """
+    依次给出每一行的类型
+
+    每取出一个类型只消费一行，因此 lines 可以是逐行读取文件的迭代器，
+    调用方在拿到类型时仍能从迭代器上读到这一行的位置信息（见 FileLines）。
+    """
+    in_fence = False
+    for line in lines:
+        if not line:
+            yield CODE if in_fence else BLANK
+        elif line[0] == "`" and line.startswith(FENCE):
+            yield FENCE_CLOSE if in_fence else FENCE_OPEN
+            in_fence = not in_fence
+        elif in_fence:
+            yield CODE
+        elif line[0] in _SPECIAL_LEADS:
+            yield classify_line(line)
+        else:
+            # 绝大多数正文行：首字符不可能构成标题、步骤或空行
+            yield TEXT
+
+
+def tokenize(content: str) -> MarkdownTokens:
+    """对文档做一次逐行扫描，返回分词结果"""
+    lines = content.split("\n")
+    tokens = MarkdownTokens(lines, list(iter_kinds(lines)))
+    tokens._text = content
+    return tokens
+
+
+class FileLines:
+    """
+    逐行读取文件，不把整个文档读入内存
+
+    按 "\n" 切分（行尾的 "\r" 去掉，行内单独的 "\r" 也视为换行），
+    与文本模式读取后 split("\n") 得到的行相同。迭代时 line 是当前行，
+    start / end 是当前行在文件中的字节偏移（end 包含换行符）。
+
+    Args:
+        f: 以二进制模式打开的文件
+    """
+
+    def __init__(self, f: BinaryIO):
+        self._f = f
+        self.line = ""
+        self.start = 0
+        self.end = 0
+
+    def __iter__(self) -> Iterator[str]:
+        end = 0
+        ends_with_newline = True
+        for raw in self._f:
+            start = end
+            end += len(raw)
+            text = raw.decode("utf-8")
+            if "\r" in text:
+                text = text.replace("\r\n", "\n").replace("\r", "\n")
+            ends_with_newline = raw.endswith(b"\n")
+            if ends_with_newline:
+                text = text[:-1]
+            self.start, self.end = start, end
+            for line in text.split("\n") if "\n" in text else (text,):
+                self.line = line
+                yield line
+        # 文件以换行符结尾（或为空）时，split("\n") 的最后一行为空
+        if ends_with_newline:
+            self.start = self.end = end
+            self.line = ""
+            yield ""
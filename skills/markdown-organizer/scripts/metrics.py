@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+处理流程计时与计数
+
+organize_markdown 的每个阶段（读取、分词、图片发现、下载、替换、美化、增强、
+写入）以及每次图片下载都可以记录到一个 Metrics 对象中，结果以 JSON 或
+JSON-lines 报告输出。未启用时使用 NULL_METRICS，所有方法都是空操作，
+计时上下文是同一个共享对象，几乎没有额外开销。
+"""
+
+import json
+import threading
+import time
+from pathlib import Path
+
+# 报告格式
+METRICS_FORMATS = ("json", "jsonl")
+
+
+class _StageTimer:
+    """累计一个阶段的调用次数和耗时"""
+
+    __slots__ = ("_metrics", "_name", "_start")
+
+    def __init__(self, metrics: "Metrics", name: str):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._metrics.add_time(self._name, time.perf_counter() - self._start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """
+    单个文档的计时与计数（线程安全，下载线程共用同一个对象）
+
+    stages: {阶段: {"calls", "seconds"}}
+    counters: {名称: 数值}
+    downloads: 每次图片下载的记录 {"url", "cache", "status", "bytes",
+    "wait_seconds", "seconds", "error", "resumed_from"}
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: dict[str, dict] = {}
+        self.counters: dict[str, int] = {}
+        self.downloads: list[dict] = []
+
+    def stage(self, name: str):
+        """计时上下文：with metrics.stage("beautify"): ..."""
+        return _StageTimer(self, name)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        with self._lock:
+            entry = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0})
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def record_download(self, **fields) -> None:
+        """
+        记录一次图片下载，并累计 bytes_downloaded 和按 cache 分类的计数
+
+        cache 取值：local（img 中已有）、store（全局仓库命中）、
+        not_modified（条件请求返回 304）、miss（从网络下载）、error、
+        circuit_open（主机熔断，未发出请求）、coalesced（共用其他文档正在
+        进行的同一下载）
+        """
+        with self._lock:
+            self.downloads.append(fields)
+            cache = fields.get("cache")
+            key = f"cache_{cache}"
+            self.counters[key] = self.counters.get(key, 0) + 1
+            if fields.get("bytes"):
+                self.counters["bytes_downloaded"] = (
+                    self.counters.get("bytes_downloaded", 0) + fields["bytes"]
+                )
+            if fields.get("resumed_from"):
+                self.counters["resumed"] = self.counters.get("resumed", 0) + 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "stages": {k: dict(v) for k, v in self.stages.items()},
+                "counters": dict(self.counters),
+                "downloads": list(self.downloads),
+            }
+
+
+class NullMetrics(Metrics):
+    """未启用指标时使用的空实现"""
+
+    enabled = False
+
+    def __init__(self):
+        pass
+
+    def stage(self, name: str):
+        return _NULL_TIMER
+
+    def add_time(self, name: str, seconds: float) -> None:
+        pass
+
+    def count(self, name: str, value: int = 1) -> None:
+        pass
+
+    def record_download(self, **fields) -> None:
+        pass
+
+    def to_dict(self) -> dict:
+        return {"stages": {}, "counters": {}, "downloads": []}
+
+
+NULL_METRICS = NullMetrics()
+
+
+def merge_stages(reports: list[dict]) -> dict:
+    """汇总多个文档的阶段耗时和计数"""
+    stages: dict[str, dict] = {}
+    counters: dict[str, int] = {}
+    for report in reports:
+        for name, entry in report.get("stages", {}).items():
+            total = stages.setdefault(name, {"calls": 0, "seconds": 0.0})
+            total["calls"] += entry["calls"]
+            total["seconds"] += entry["seconds"]
+        for name, value in report.get("counters", {}).items():
+            counters[name] = counters.get(name, 0) + value
+    return {"stages": stages, "counters": counters}
+
+
+def write_report(summaries: list[dict], path: str | Path, fmt: str = "json") -> None:
+    """
+    把处理摘要（含 "metrics"）写成报告
+
+    json：{"documents": [...], "totals": {"stages", "counters"}}
+    jsonl：每个文档一行，最后一行 {"type": "totals", ...}
+    """
+    if fmt not in METRICS_FORMATS:
+        raise ValueError(f"未知的报告格式: {fmt}，可选: {', '.join(METRICS_FORMATS)}")
+
+    documents = [
+        {k: v for k, v in s.items() if k != "metrics"} | s.get("metrics", {})
+        for s in summaries
+    ]
+    totals = merge_stages(documents)
+
+    with open(path, "w", encoding="utf-8") as f:
+        if fmt == "json":
+            json.dump(
+                {"documents": documents, "totals": totals},
+                f,
+                ensure_ascii=False,
+                indent=1,
+            )
+            f.write("\n")
+        else:
+            for document in documents:
+                f.write(
+                    json.dumps({"type": "document", **document}, ensure_ascii=False)
+                )
+                f.write("\n")
+            f.write(json.dumps({"type": "totals", **totals}, ensure_ascii=False))
+            f.write("\n")
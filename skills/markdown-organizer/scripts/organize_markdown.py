@@ -7,17 +7,104 @@ Markdown 文档组织和图片下载工具
 2. 下载图片到本地 img 文件夹
 3. 更新 markdown 中的图片引用为本地路径
 4. 美化 markdown 格式
+
+启动开销：requests、asyncio、进程池和 Pillow 都在第一次用到时才导入，没有图片
+或不需要下载的调用只加载标准库的一小部分（预算见 benchmarks/bench_startup.py）。
 """
 
 import os
 import re
 import sys
+import io
+import time
+import glob
+import argparse
 import hashlib
-import subprocess
+import threading
 import urllib.parse
+from contextlib import contextmanager, redirect_stdout
 from pathlib import Path
 
-import requests
+from fetch_client import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_MAX_BYTES,
+    DEFAULT_READ_TIMEOUT,
+    DEFAULT_RETRIES,
+    FetchClient,
+    configure_client,
+    get_client,
+    is_complete_file,
+)
+from doc_manifest import DocumentManifest
+from download_scheduler import (
+    DEFAULT_COOLDOWN,
+    DEFAULT_FAILURE_THRESHOLD,
+    DEFAULT_HOST_RATE,
+    DEFAULT_MAX_RETRY_AFTER,
+    DEFAULT_MAX_WORKERS,
+    DEFAULT_PER_HOST_LIMIT,
+    DownloadScheduler,
+    HostHealth,
+    HostUnavailableError,
+    configure_host_health,
+    get_host_health,
+)
+from file_index import open_index
+from image_manifest import ImageManifest
+from image_optimizer import (
+    CONVERT_FORMATS,
+    DEFAULT_MAX_WIDTH,
+    DEFAULT_QUALITY,
+    OptimizeOptions,
+    configure_optimizer,
+    is_available as image_optimizer_available,
+    optimize_images,
+    reuse_optimized,
+)
+from metrics import METRICS_FORMATS, NULL_METRICS, Metrics, write_report
+from image_store import (
+    LINK_MODES,
+    STORE_ENV_VAR,
+    ImageStore,
+    configure_store,
+    get_store,
+)
+from markdown_tokens import (
+    BLANK,
+    CODE,
+    FENCE_CLOSE,
+    FENCE_OPEN,
+    HEADING,
+    TEXT,
+    WHITESPACE,
+    ImageRef,
+    MarkdownTokens,
+    tokenize,
+)
+
+try:
+    import enhance_content
+except ImportError:  # enhance_content.py 缺失时跳过内容增强
+    enhance_content = None
+
+
+# 处理流程版本：美化、图片替换或内容增强的规则改变输出时递增，
+# 使文档处理清单中的旧记录失效
+PIPELINE_VERSION = 2
+
+# 监视模式默认参数（与 file_watcher 一致；file_watcher 只在 --watch 时导入）
+DEFAULT_DEBOUNCE = 0.2
+DEFAULT_POLL_INTERVAL = 0.5
+
+# 批量和监视模式下跳过的目录
+BATCH_SKIP_DIRS = {".git", "node_modules", "img", "__pycache__", ".venv", "venv"}
+
+# 列表标记 "* " / "+ "，统一替换为 "- "
+LIST_MARKER_PATTERN = re.compile(r"(\s*)[*+]\s+")
+_LIST_MARKER_LEADS = WHITESPACE | {"*", "+"}
+
+# beautify_markdown 的吞吐量目标（MB/s），由 benchmarks/bench_beautify.py 测量
+BEAUTIFY_TARGET_MBPS = 25.0
 
 
 def sanitize_filename(url: str) -> str:
@@ -36,63 +123,416 @@ def sanitize_filename(url: str) -> str:
     return f"{url_hash}{ext}"
 
 
-def download_image(url: str, img_dir: Path) -> str | None:
-    """下载图片到本地目录"""
+def download_image(
+    url: str,
+    img_dir: Path,
+    client: FetchClient | None = None,
+    store: ImageStore | None = None,
+    manifest: ImageManifest | None = None,
+    refresh: bool = False,
+    metrics: Metrics = NULL_METRICS,
+    wait_seconds: float = 0.0,
+    health: HostHealth | None = None,
+) -> str | None:
+    """
+    下载图片到本地目录
+
+    默认使用共享的连接池客户端；配置了全局图片仓库时，已知 URL 直接从仓库链接，
+    新下载的图片按内容存入仓库，相同内容只保存一份。
+
+    网络请求经过共享的主机健康跟踪器（health）：按主机限速、遵守 429 的
+    Retry-After；主机熔断时不发出请求，直接返回 None（保留原链接）。
+
+    refresh 为 True 时，已存在的图片会根据清单中的 ETag / Last-Modified
+    发送条件请求，服务器返回 304 则保留本地文件。
+
+    metrics 记录本次下载的缓存命中情况、状态码、字节数和耗时，
+    wait_seconds 是调用前等待并发名额的时间（一并记录）。
+    """
+    start = time.perf_counter()
+    if client is None:
+        client = get_client()
+    if store is None:
+        store = get_store()
+    if health is None:
+        health = get_host_health()
+    own_manifest = manifest is None
+    if own_manifest:
+        manifest = ImageManifest(img_dir)
+
     try:
         filename = sanitize_filename(url)
         local_path = img_dir / filename
+        have_local = is_complete_file(local_path)
 
-        # 如果文件已存在，直接返回
-        if local_path.exists():
+        # 如果完整文件已存在且无需刷新，直接返回
+        if have_local and not refresh:
+            _record_download(metrics, url, "local", start, wait_seconds)
             return filename
 
-        # 下载图片
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
-        }
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
+        # 全局仓库中已有该 URL 的内容，跳过网络请求
+        if not refresh and store is not None:
+            cached = store.lookup(url)
+            if cached is not None:
+                store.link_into(cached, local_path)
+                print(f"  ♻️ 仓库命中: {filename}")
+                _record_download(metrics, url, "store", start, wait_seconds)
+                return filename
 
-        # 保存图片
-        with open(local_path, "wb") as f:
-            f.write(response.content)
+        # 刷新已有图片时发送条件请求
+        headers = manifest.conditional_headers(url) if have_local else {}
 
-        print(f"  ✅ 下载成功: {filename}")
+        # 流式下载到临时文件，完整后原子替换（连接复用、临时失败自动重试）
+        result = health.call(
+            url, lambda: client.download_to_file(url, local_path, headers=headers)
+        )
+        if result["status"] == 304:
+            print(f"  ✔️ 未变化: {filename}")
+            _record_download(
+                metrics, url, "not_modified", start, wait_seconds, status=304
+            )
+            return filename
+
+        if store is not None:
+            store.adopt(url, local_path, digest=result["digest"])
+        manifest.record(
+            url,
+            filename=filename,
+            etag=result["etag"],
+            last_modified=result["last_modified"],
+            size=result["size"],
+            digest=result["digest"],
+        )
+
+        resumed = (
+            f"，从 {result['resumed_from']} 字节处续传"
+            if result["resumed_from"]
+            else ""
+        )
+        print(f"  ✅ 下载成功: {filename} ({result['size']} 字节{resumed})")
+        _record_download(
+            metrics,
+            url,
+            "miss",
+            start,
+            wait_seconds,
+            status=result["status"],
+            size=result["size"],
+            resumed_from=result["resumed_from"],
+        )
         return filename
 
+    except HostUnavailableError as e:
+        print(f"  ⛔ 跳过: {url} - {e}")
+        _record_download(
+            metrics, url, "circuit_open", start, wait_seconds, error=str(e)
+        )
+        return None
+
     except Exception as e:
         print(f"  ❌ 下载失败: {url} - {e}")
+        response = getattr(e, "response", None)
+        _record_download(
+            metrics,
+            url,
+            "error",
+            start,
+            wait_seconds,
+            status=getattr(response, "status_code", None),
+            error=f"{type(e).__name__}: {e}",
+        )
         return None
 
+    finally:
+        if own_manifest:
+            manifest.save()
 
-def extract_and_download_images(content: str, base_url: str, img_dir: Path) -> str:
-    """提取并下载图片，返回更新后的内容"""
-    # 匹配 markdown 图片语法: ![alt](url)
-    img_pattern = r"!\[([^\]]*)\]\(([^)]+)\)"
 
-    def replace_image(match):
-        alt_text = match.group(1)
-        img_url = match.group(2).strip()
+def _record_download(
+    metrics: Metrics,
+    url: str,
+    cache: str,
+    start: float,
+    wait_seconds: float,
+    status: int | None = None,
+    size: int = 0,
+    error: str | None = None,
+    resumed_from: int = 0,
+) -> None:
+    """把一次下载的结果写入 metrics（未启用时直接返回）"""
+    if not metrics.enabled:
+        return
+    metrics.record_download(
+        url=url,
+        cache=cache,
+        status=status,
+        bytes=size,
+        wait_seconds=wait_seconds,
+        seconds=time.perf_counter() - start,
+        error=error,
+        resumed_from=resumed_from,
+    )
+
 
-        # 处理相对 URL
-        if not img_url.startswith(("http://", "https://", "/")):
-            # 是相对路径，可能需要与 base_url 组合
+def _relative_path(img_url: str) -> str | None:
+    """相对路径引用的路径部分（已解码），URL、绝对路径返回 None"""
+    parsed = urllib.parse.urlsplit(img_url)
+    if parsed.scheme or parsed.netloc or img_url.startswith("/"):
+        return None
+    return urllib.parse.unquote(parsed.path)
+
+
+def is_local_ref(img_url: str, work_dir: Path | None = None) -> bool:
+    """
+    相对路径是否指向本地图片：工具自己的 img/ 目录（上次处理写回的引用），
+    或文档所在目录 work_dir 下已存在的文件。这类引用不与 base_url 组合。
+    """
+    path = _relative_path(img_url)
+    if path is None:
+        return False
+    parts = [part for part in Path(path).parts if part != "."]
+    if not parts:
+        return False
+    if parts[0] == "img":
+        return True
+    if work_dir is None:
+        return False
+    try:
+        return (work_dir / path).is_file()
+    except OSError:
+        return False
+
+
+def local_image_name(img_url: str) -> str | None:
+    """指向工具自己 img/ 目录的引用（./img/<文件名>）中的文件名，其他引用返回 None"""
+    path = _relative_path(img_url)
+    if path is None:
+        return None
+    parts = [part for part in Path(path).parts if part != "."]
+    if len(parts) == 2 and parts[0] == "img":
+        return parts[1]
+    return None
+
+
+def local_image_sources(
+    tokens: MarkdownTokens, img_dir: Path, refresh: bool = False
+) -> tuple[dict[str, str], dict[str, str]]:
+    """
+    文档中指向 img/ 的本地图片引用
+
+    图片清单（img/.manifest.json）记录了每个文件的来源 URL：文件已缺失的图片
+    据此重新下载；refresh 为 True 时全部重新下载（已有文件发送条件请求，未变化
+    时服务器返回 304）。
+
+    Returns:
+        (引用 → 文件名, 需要重新下载的引用 → 来源 URL)
+    """
+    names = {}
+    for image in tokens.images:
+        ref = image_url(image, "")
+        name = local_image_name(ref)
+        if name:
+            names[ref] = name
+    sources = {}
+    if names:
+        known = ImageManifest(img_dir).sources()
+        for ref, name in names.items():
+            url = known.get(name)
+            if url and (refresh or not (img_dir / name).is_file()):
+                sources[ref] = url
+    return names, sources
+
+
+def resolve_image_url(img_url: str, base_url: str, work_dir: Path | None = None) -> str:
+    """
+    规范化图片 URL，相对路径与 base_url 组合，去掉不会发给服务器的 #片段
+
+    指向本地图片的相对路径（见 is_local_ref）保持原样。
+    """
+    img_url = img_url.strip()
+
+    # 处理相对 URL
+    if img_url.startswith("//"):
+        # 协议相对 URL，跟随 base_url 的协议，默认 https
+        scheme = urllib.parse.urlparse(base_url).scheme or "https"
+        img_url = f"{scheme}:{img_url}"
+    elif not img_url.startswith(("http://", "https://", "/")):
+        # 是相对路径，不是本地图片时才与 base_url 组合
+        if base_url and not is_local_ref(img_url, work_dir):
             img_url = urllib.parse.urljoin(base_url, img_url)
 
-        # 下载图片
+    return urllib.parse.urldefrag(img_url).url
+
+
+def image_url(image: ImageRef, base_url: str, work_dir: Path | None = None) -> str:
+    """图片引用对应的下载地址（HTML 属性值先还原字符实体）"""
+    import html
+
+    raw_url = html.unescape(image.url) if image.syntax == "html" else image.url
+    return resolve_image_url(raw_url, base_url, work_dir)
+
+
+def is_remote_url(url: str) -> bool:
+    """只有 http(s) 地址需要下载；本地路径、data: URI 等保持原样"""
+    return url.startswith(("http://", "https://"))
+
+
+def collect_image_urls(
+    content: str,
+    base_url: str,
+    tokens: MarkdownTokens | None = None,
+    work_dir: Path | None = None,
+) -> list[str]:
+    """
+    收集文档中需要下载的图片 URL（保持出现顺序并去重）
+
+    包括行内图片 ![alt](url "title")、引用式图片 ![alt][ref] 的引用定义和
+    HTML <img src>；代码块和代码片段中的图片语法、已是本地路径的图片不收集。
+    work_dir 为文档所在目录，其中已存在的相对路径图片视为本地图片。
+    """
+    if tokens is None:
+        tokens = tokenize(content)
+    urls = []
+    seen = set()
+    for image in tokens.images:
+        img_url = image_url(image, base_url, work_dir)
+        if img_url not in seen and is_remote_url(img_url):
+            seen.add(img_url)
+            urls.append(img_url)
+    return urls
+
+
+class HostLimiter:
+    """按主机限制并发数，避免同一图床被瞬间打满"""
+
+    def __init__(self, per_host_limit: int = DEFAULT_PER_HOST_LIMIT):
+        self.per_host_limit = max(1, per_host_limit)
+        self._lock = threading.Lock()
+        self._semaphores: dict[str, threading.Semaphore] = {}
+
+    def _semaphore(self, host: str) -> threading.Semaphore:
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.Semaphore(self.per_host_limit)
+            return self._semaphores[host]
+
+    @contextmanager
+    def slot(self, url: str):
+        """占用 url 所在主机的一个并发名额"""
+        host = urllib.parse.urlparse(url).netloc.lower()
+        semaphore = self._semaphore(host)
+        with semaphore:
+            yield
+
+
+def download_images(
+    urls: list[str],
+    img_dir: Path,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    per_host_limit: int = DEFAULT_PER_HOST_LIMIT,
+    refresh: bool = False,
+    metrics: Metrics = NULL_METRICS,
+) -> dict[str, str | None]:
+    """
+    并发下载一组图片
+
+    Args:
+        urls: 已去重的图片 URL 列表
+        img_dir: 图片保存目录
+        max_workers: 全局最大并发数
+        per_host_limit: 单个主机最大并发数
+        refresh: 是否对已有图片发送条件请求以检查更新
+        metrics: 记录每次下载的指标
+
+    Returns:
+        URL 到本地文件名的映射，下载失败的 URL 对应 None
+    """
+    if not urls:
+        return {}
+
+    limiter = HostLimiter(per_host_limit)
+    manifest = ImageManifest(img_dir)
+
+    def fetch(url: str) -> str | None:
+        queued = time.perf_counter()
+        with limiter.slot(url):
+            return download_image(
+                url,
+                img_dir,
+                manifest=manifest,
+                refresh=refresh,
+                metrics=metrics,
+                wait_seconds=time.perf_counter() - queued,
+            )
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    workers = max(1, min(max_workers, len(urls)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        filenames = list(executor.map(fetch, urls))
+
+    manifest.save()
+    store = get_store()
+    if store is not None:
+        store.save()
+
+    return dict(zip(urls, filenames))
+
+
+def extract_and_download_images(
+    content: str,
+    base_url: str,
+    img_dir: Path,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    per_host_limit: int = DEFAULT_PER_HOST_LIMIT,
+    refresh: bool = False,
+) -> str:
+    """提取并下载图片，返回更新后的内容"""
+    tokens = tokenize(content)
+
+    # 第一阶段：收集并去重所有图片 URL
+    urls = collect_image_urls(content, base_url, tokens, img_dir.parent)
+    for img_url in urls:
         print(f"\n📥 处理图片: {img_url}")
-        filename = download_image(img_url, img_dir)
 
-        if filename:
-            # 返回本地引用
-            return f"![{alt_text}](./img/{filename})"
-        else:
-            # 下载失败，保留原引用
-            return match.group(0)
+    # 第二阶段：并发下载
+    results = download_images(urls, img_dir, max_workers, per_host_limit, refresh)
 
-    # 替换所有图片引用
-    updated_content = re.sub(img_pattern, replace_image, content)
-    return updated_content
+    # 第三阶段：替换为本地引用
+    return rewrite_image_refs(tokens, base_url, results, img_dir.parent).text
+
+
+def replace_image_refs(
+    content: str, base_url: str, results: dict[str, str | None]
+) -> str:
+    """根据下载结果把图片引用替换为本地路径，下载失败的保留原引用"""
+    return rewrite_image_refs(tokenize(content), base_url, results).text
+
+
+def rewrite_image_refs(
+    tokens: MarkdownTokens,
+    base_url: str,
+    results: dict[str, str | None],
+    work_dir: Path | None = None,
+) -> MarkdownTokens:
+    """
+    在分词结果上替换图片引用，只改写含图片的行
+
+    只替换 URL 本身，alt、标题和图片写法保持不变；引用式图片改写的是引用定义。
+
+    Returns:
+        替换后的分词结果（行类型不变，可直接交给 beautify_tokens）
+    """
+    lines = list(tokens.lines)
+    # 同一行可能有多张图片，从右往左替换以保持列号有效
+    for image in reversed(tokens.images):
+        filename = results.get(image_url(image, base_url, work_dir))
+        if filename:
+            line = lines[image.line]
+            lines[image.line] = (
+                f"{line[:image.start]}./img/{filename}{line[image.end:]}"
+            )
+    return tokens.with_lines(lines)
 
 
 def resolve_file_path(file_path: str | Path) -> Path:
@@ -126,29 +566,27 @@ def resolve_file_path(file_path: str | Path) -> Path:
         if full_path.exists():
             return full_path.resolve()
 
-    # 尝试递归搜索（最多3层深度）
-    for base_path in search_paths:
-        for root, dirs, files in os.walk(base_path):
-            # 限制搜索深度
-            level = root.replace(str(base_path), "").count(os.sep)
-            if level >= 3:
-                dirs[:] = []  # 不再深入
-                continue
+    # 按文件名在缓存索引中查找（最多3层深度），候选 .md 列表来自同一份索引
+    indexes = []
+    for base_path in dict.fromkeys(p.resolve() for p in search_paths):
+        try:
+            indexes.append(open_index(base_path))
+        except OSError:
+            continue
 
-            if file_path.name in files:
-                return Path(root) / file_path.name
+    for index in indexes:
+        matches = index.find(file_path.name)
+        # 优先匹配完整的相对路径（如 docs/a.md），否则取最浅的同名文件
+        for match in matches:
+            if match.parts[-len(file_path.parts) :] == file_path.parts:
+                return match
+        if matches:
+            return matches[0]
 
     # 列出所有找到的 .md 文件供参考
-    md_files = []
-    for base_path in search_paths:
-        for root, dirs, files in os.walk(base_path):
-            level = root.replace(str(base_path), "").count(os.sep)
-            if level >= 2:
-                dirs[:] = []
-                continue
-            for f in files:
-                if f.endswith(".md"):
-                    md_files.append(str(Path(root) / f))
+    md_files = list(
+        dict.fromkeys(str(p) for index in indexes for p in index.markdown_files())
+    )
 
     error_msg = (
         f"无法找到文件: {file_path}\n搜索路径: {[str(p) for p in search_paths]}\n"
@@ -162,52 +600,302 @@ def resolve_file_path(file_path: str | Path) -> Path:
 
 def beautify_markdown(content: str) -> str:
     """美化 markdown 格式"""
-    # 1. 标题层级规范化
-    # 确保标题前后有空行
-    lines = content.split("\n")
-    beautified_lines = []
-
-    for i, line in enumerate(lines):
-        # 处理标题
-        if re.match(r"^#{1,6}\s+", line):
-            # 标题前添加空行（如果前面不是空行）
-            if i > 0 and lines[i - 1].strip():
-                beautified_lines.append("")
-            beautified_lines.append(line)
-            # 标题后添加空行（如果后面不是空行）
-            if i < len(lines) - 1 and lines[i + 1].strip():
-                beautified_lines.append("")
-        else:
-            beautified_lines.append(line)
+    return beautify_tokens(tokenize(content)).text
 
-    content = "\n".join(beautified_lines)
 
-    # 2. 列表格式化
-    # 统一使用 "- " 作为列表标记
-    content = re.sub(r"^(\s*)\*\s+", r"\1- ", content, flags=re.MULTILINE)
-    content = re.sub(r"^(\s*)\+\s+", r"\1- ", content, flags=re.MULTILINE)
+def beautify_tokens(tokens: MarkdownTokens) -> MarkdownTokens:
+    """
+    按分词结果美化 markdown 格式，返回美化后的分词结果
 
-    # 3. 代码块规范化
-    # 确保代码块前后有空行
-    content = re.sub(r"(\n)(```[^\n]*)(\n)", r"\1\n\2\3", content)
+    1. 标题、代码块前后保留空行
+    2. 列表标记统一为 "- "
+    3. 连续空行最多保留一个；文档开头和末尾的换行最多保留两个，只含空白的行
+       变为空行但不参与合并（与按换行符折叠的旧规则一致）
+    4. 去除行尾空格
 
-    # 4. 删除多余的空行（最多保留2个连续空行）
-    content = re.sub(r"\n{3,}", "\n\n", content)
+    代码块内部只去除行尾空格，其余内容保持原样。
 
-    # 5. 去除行尾空格
-    content = "\n".join(line.rstrip() for line in content.split("\n"))
+    单遍扫描：每行只处理一次，直接追加到同一个输出缓冲区，最后拼接一次。
+    吞吐量目标见 BEAUTIFY_TARGET_MBPS。
+    """
+    lines: list[str] = []
+    kinds: list[int] = []
+    add_line = lines.append
+    add_kind = kinds.append
+    match_list_marker = LIST_MARKER_PATTERN.match
 
-    return content
+    # 上一个输出行的类型，-1 表示尚未输出
+    prev = -1
+    # 标题或代码块结束之后，下一个非空行前需要补空行
+    need_blank = False
+    # 输出末尾的连续空行数：最多先留 3 个，遇到非空行或文档结束时按位置裁剪
+    blanks = 0
 
+    for line, kind in zip(tokens.lines, tokens.kinds):
+        if kind == BLANK:
+            need_blank = False
+            if line:
+                # 只含空白的行只去掉空白，不与相邻空行合并（与旧规则一致）
+                if blanks:
+                    _trim_blanks(lines, kinds, blanks, 1 if len(lines) > blanks else 2)
+                    blanks = 0
+                add_line("")
+                add_kind(BLANK)
+            elif blanks < 3:
+                add_line("")
+                add_kind(BLANK)
+                blanks += 1
+            prev = BLANK
+            continue
 
-def organize_markdown(file_path: str | Path, base_url: str = "") -> None:
+        if blanks:
+            # 文档中间的连续空行只保留一个，文档开头的最多保留两个
+            _trim_blanks(lines, kinds, blanks, 1 if len(lines) > blanks else 2)
+            blanks = 0
+
+        if kind == CODE:
+            add_line(line.rstrip())
+            add_kind(CODE)
+            prev = CODE
+            continue
+
+        # 标题和代码块开始前需要空行（文档开头除外）
+        if prev > BLANK and (need_blank or kind == HEADING or kind == FENCE_OPEN):
+            add_line("")
+            add_kind(BLANK)
+
+        line = line.rstrip()
+        if kind == TEXT and line[0] in _LIST_MARKER_LEADS:
+            match = match_list_marker(line)
+            if match:
+                line = f"{match.group(1)}- {line[match.end():]}"
+
+        add_line(line)
+        add_kind(kind)
+        prev = kind
+        need_blank = kind == HEADING or kind == FENCE_CLOSE
+
+    if blanks:
+        # 文档末尾的换行最多保留两个；全是空行的文档没有结尾的非空行，多留一个
+        _trim_blanks(lines, kinds, blanks, 2 if len(lines) > blanks else 3)
+
+    return MarkdownTokens(lines, kinds)
+
+
+def _trim_blanks(lines: list[str], kinds: list[int], blanks: int, keep: int) -> None:
+    """把输出末尾的 blanks 个连续空行裁剪为最多 keep 个"""
+    extra = blanks - keep
+    if extra > 0:
+        del lines[-extra:]
+        del kinds[-extra:]
+
+
+def organize_markdown(
+    file_path: str | Path,
+    base_url: str = "",
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    per_host_limit: int = DEFAULT_PER_HOST_LIMIT,
+    refresh: bool = False,
+    force: bool = False,
+    metrics: Metrics | None = None,
+    optimize: OptimizeOptions | None = None,
+) -> dict:
     """
     组织和美化 markdown 文件
 
     Args:
         file_path: markdown 文件路径
         base_url: 原文章页面的 URL（用于处理相对路径的图片）
+        max_workers: 图片下载的全局最大并发数
+        per_host_limit: 同一主机的最大并发下载数
+        refresh: 是否通过条件请求刷新已下载的图片
+        force: 忽略文档处理清单，即使文档未变化也重新处理
+        metrics: 记录各阶段耗时、字节数和下载情况，None 时不记录
+        optimize: 下载后优化图片的参数，None 时保存原图
+
+    Returns:
+        处理摘要 {"file", "images", "failed", "seconds", "skipped"}，
+        传入 metrics 时另有 "metrics"（见 Metrics.to_dict）
+    """
+    job = _load_document(file_path, base_url, refresh, force, metrics, optimize)
+    if not job["skipped"]:
+        with job["metrics"].stage("download"):
+            results = download_images(
+                job["pending"],
+                job["img_dir"],
+                max_workers,
+                per_host_limit,
+                refresh,
+                job["metrics"],
+            )
+        results = _optimize_downloads(job, results, optimize)
+        _save_document(job, base_url, results)
+    return _summarize(job, metrics)
+
+
+async def organize_markdown_async(
+    file_path: str | Path,
+    base_url: str = "",
+    refresh: bool = False,
+    force: bool = False,
+    metrics: Metrics | None = None,
+    scheduler: DownloadScheduler | None = None,
+    optimize: OptimizeOptions | None = None,
+) -> dict:
+    """
+    organize_markdown 的 asyncio 版本
+
+    处理步骤与 organize_markdown 相同；读写文件、美化等阻塞步骤和图片下载都在
+    调度器的有界线程池中执行，不阻塞事件循环。多个文档并发处理时应传入同一个
+    scheduler，共用全局和单主机并发限制（见 organize_documents_async）。
+
+    Args:
+        scheduler: 共享的下载调度器，None 时为本文档单独创建一个
+
+    Returns:
+        与 organize_markdown 相同的处理摘要
     """
+    if scheduler is None:
+        async with DownloadScheduler() as own:
+            return await organize_markdown_async(
+                file_path, base_url, refresh, force, metrics, own, optimize
+            )
+
+    job = await scheduler.run(
+        _load_document, file_path, base_url, refresh, force, metrics, optimize
+    )
+    if not job["skipped"]:
+        with job["metrics"].stage("download"):
+            results = await download_images_async(
+                job["pending"], job["img_dir"], scheduler, refresh, job["metrics"]
+            )
+        results = await scheduler.run(_optimize_downloads, job, results, optimize)
+        await scheduler.run(_save_document, job, base_url, results)
+    return _summarize(job, metrics)
+
+
+async def download_images_async(
+    urls: list[str],
+    img_dir: Path,
+    scheduler: DownloadScheduler,
+    refresh: bool = False,
+    metrics: Metrics = NULL_METRICS,
+) -> dict[str, str | None]:
+    """
+    download_images 的 asyncio 版本，并发限制由共享的 scheduler 决定
+
+    同一 img 目录中的同一 URL 被多个文档同时引用时只下载一次。
+    """
+    if not urls:
+        return {}
+
+    import asyncio
+
+    manifest = ImageManifest(img_dir)
+    start = time.perf_counter()
+
+    def joined(url: str):
+        # 共用其他文档正在进行的同一下载：本文档的指标也记录这张图片
+        def record(filename: str | None) -> None:
+            error = None if filename else "共用的下载失败"
+            wait_seconds = time.perf_counter() - start
+            _record_download(
+                metrics, url, "coalesced", start, wait_seconds, error=error
+            )
+
+        return record
+
+    filenames = await asyncio.gather(
+        *(
+            scheduler.fetch(
+                url,
+                download_image,
+                url,
+                img_dir,
+                None,
+                None,
+                manifest,
+                refresh,
+                metrics,
+                key=(img_dir.resolve(), url),
+                on_join=joined(url),
+            )
+            for url in urls
+        )
+    )
+
+    def save() -> None:
+        manifest.save()
+        store = get_store()
+        if store is not None:
+            store.save()
+
+    await scheduler.run(save)
+    return dict(zip(urls, filenames))
+
+
+async def organize_documents_async(
+    files: list[str | Path],
+    base_url: str = "",
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    per_host_limit: int = DEFAULT_PER_HOST_LIMIT,
+    refresh: bool = False,
+    force: bool = False,
+    metrics: bool = False,
+    optimize: OptimizeOptions | None = None,
+) -> list[dict]:
+    """
+    在同一个事件循环中并发处理多个文档，共用一个下载调度器
+
+    单个文档出错不影响其他文档，摘要中的 "status" 为 "ok" 或 "error"。
+
+    Returns:
+        每个文件的处理摘要，顺序与 files 一致
+    """
+
+    async def one(file_path: str | Path) -> dict:
+        start = time.perf_counter()
+        try:
+            summary = await organize_markdown_async(
+                file_path,
+                base_url,
+                refresh,
+                force,
+                Metrics() if metrics else None,
+                scheduler,
+                optimize,
+            )
+            summary["status"] = "ok"
+        except Exception as e:
+            summary = _error_summary(file_path, start, e)
+        return summary
+
+    import asyncio
+
+    async with DownloadScheduler(max_workers, per_host_limit) as scheduler:
+        return list(await asyncio.gather(*(one(f) for f in files)))
+
+
+def _load_document(
+    file_path: str | Path,
+    base_url: str,
+    refresh: bool,
+    force: bool,
+    metrics: Metrics | None,
+    optimize: OptimizeOptions | None = None,
+) -> dict:
+    """
+    第一阶段：检查文档处理清单，读取、分词并收集图片 URL
+
+    Returns:
+        处理状态 {"file_path", "img_dir", "documents", "version", "metrics",
+        "start", "skipped", ...}；文档需要处理时另有 "input_digest"、"tokens"、
+        "urls"、"remote_refs"（原文中就是远程地址的 URL）、"local_names" /
+        "local_sources"（见 local_image_sources）、"pending"（需要下载的 URL）和
+        "reused"（可直接引用的优化结果）
+    """
+    start = time.perf_counter()
+    m = metrics if metrics is not None else NULL_METRICS
     if isinstance(file_path, str):
         file_path = Path(file_path)
     work_dir = file_path.parent
@@ -219,58 +907,630 @@ def organize_markdown(file_path: str | Path, base_url: str = "") -> None:
     print(f"📁 工作目录: {work_dir}")
     print(f"📁 图片目录: {img_dir}")
 
-    # 读取 markdown 文件
+    job = {
+        "file_path": file_path,
+        "img_dir": img_dir,
+        "metrics": m,
+        "start": start,
+        "skipped": False,
+    }
+
+    # 上次处理后未被修改、图片齐全的文档直接跳过
+    with m.stage("manifest"):
+        documents = DocumentManifest(img_dir)
+        version = pipeline_version(optimize)
+        current = not (force or refresh) and documents.is_current(
+            file_path, version, base_url
+        )
+        if current:
+            documents.save()
+    job.update(documents=documents, version=version)
+    if current:
+        print(f"\n⏭️ 文档未变化，跳过: {file_path}")
+        job["skipped"] = True
+        return job
+
+    # 读取 markdown 文件并分词，后续各阶段共用同一份分词结果
     print(f"\n📖 读取文件: {file_path}")
-    with open(file_path, "r", encoding="utf-8") as f:
-        content = f.read()
+    with m.stage("read"):
+        with open(file_path, "rb") as f:
+            raw = f.read()
+        job["input_digest"] = hashlib.sha256(raw).hexdigest()
+        # 与文本模式读取一致：统一换行符为 \n
+        content = raw.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+    m.count("bytes_read", len(raw))
+    with m.stage("tokenize"):
+        tokens = tokenize(content)
 
-    # 提取并下载图片
+    # 提取图片，下载由调用方完成
     print("\n🔍 搜索并下载图片...")
-    content = extract_and_download_images(content, base_url, img_dir)
+    with m.stage("discover"):
+        urls = collect_image_urls(tokens.text, base_url, tokens, work_dir)
+        # 原文中就是远程地址的图片（不依赖 base_url 组合）
+        remote_refs = {
+            image_url(image, base_url, work_dir)
+            for image in tokens.images
+            if is_remote_url(image_url(image, "", work_dir))
+        }
+        # 已改写为 ./img/ 的图片：缺失时按来源 URL 重新下载，--refresh 时重新验证
+        local_names, local_sources = local_image_sources(tokens, img_dir, refresh)
+        urls += [
+            url for url in dict.fromkeys(local_sources.values()) if url not in urls
+        ]
+    m.count("images", len(urls))
+    for img_url in urls:
+        print(f"\n📥 处理图片: {img_url}")
+
+    # 已用相同参数优化过的图片不再下载原图
+    reused = reuse_optimized(urls, img_dir, optimize) if optimize else {}
+    pending = [url for url in urls if url not in reused]
+
+    job.update(
+        tokens=tokens,
+        urls=urls,
+        remote_refs=remote_refs,
+        local_names=local_names,
+        local_sources=local_sources,
+        pending=pending,
+        reused=reused,
+    )
+    return job
+
+
+def _optimize_downloads(
+    job: dict, results: dict[str, str | None], optimize: OptimizeOptions | None
+) -> dict[str, str | None]:
+    """可选的优化阶段，返回包含复用结果在内的全部 URL → 文件名"""
+    if optimize is not None and results:
+        print("\n🗜️ 优化图片...")
+        with job["metrics"].stage("optimize"):
+            results = optimize_images(results, job["img_dir"], optimize, job["metrics"])
+    return {**job["reused"], **results}
+
+
+def _save_document(job: dict, base_url: str, results: dict[str, str | None]) -> None:
+    """第二阶段：替换图片引用、美化、内容增强，写回文件并更新清单"""
+    m = job["metrics"]
+    file_path = job["file_path"]
+    # 重新下载的本地图片按原引用改写（优化后文件名可能变化）
+    relinked = {ref: results.get(url) for ref, url in job["local_sources"].items()}
+    with m.stage("rewrite"):
+        tokens = rewrite_image_refs(
+            job.pop("tokens"),
+            base_url,
+            {**results, **relinked},
+            job["img_dir"].parent,
+        )
 
     # 美化 markdown
     print("\n✨ 美化 Markdown 格式...")
-    content = beautify_markdown(content)
-
-    # 写回文件
-    print(f"\n💾 写入文件: {file_path}")
-    with open(file_path, "w", encoding="utf-8") as f:
-        f.write(content)
+    with m.stage("beautify"):
+        tokens = beautify_tokens(tokens)
+        content = tokens.text
 
-    # 调用 enhance_content.py 进行内容增强
+    # 在内存中进行内容增强，避免再启动解释器和重复读写文件
     print("\n📝 内容增强...")
-    script_dir = Path(__file__).parent
-    enhance_script = script_dir / "enhance_content.py"
-    if enhance_script.exists():
+    if enhance_content is not None:
         try:
-            result = subprocess.run(
-                [sys.executable, str(enhance_script), "--enhance", str(file_path)],
-                capture_output=True,
-                text=True,
-            )
-            if result.returncode == 0:
-                print("  ✅ 内容增强完成")
-            else:
-                print(f"  ⚠️ 内容增强提示: {result.stderr.strip()}")
+            # 所在目录树有语料术语索引时，学习目标的章节主题按 TF-IDF 选取
+            # （只读索引）；term_index 依赖 sqlite3，用到时才导入
+            from term_index import find_index
+
+            with m.stage("enhance"):
+                content = enhance_content.enhance_markdown_content(
+                    file_path, tokens=tokens, index=find_index(file_path)
+                )
+            print("  ✅ 内容增强完成")
         except Exception as e:
             print(f"  ⚠️ 内容增强跳过: {e}")
     else:
         print("  ⚠️ enhance_content.py 未找到，跳过内容增强")
 
+    # 写回文件（只写一次，换行符与文本模式写入一致）
+    print(f"\n💾 写入文件: {file_path}")
+    with m.stage("write"):
+        if os.linesep != "\n":
+            content = content.replace("\n", os.linesep)
+        data = content.encode("utf-8")
+        with open(file_path, "wb") as f:
+            f.write(data)
+    m.count("bytes_written", len(data))
+
+    # 记录本次处理结果，下次运行时据此跳过未变化的文档；清单只记录原文中
+    # 就是远程地址的图片的下载失败，相对路径与 base_url 组合出的地址下载失败
+    # 不会让文档每次都重新处理
+    failures = [url for url, name in results.items() if not name]
+    # 文档引用的全部 img/ 文件（包括未重新下载的），缺失的文件会让记录失效
+    images = {name for name in results.values() if name}
+    images.update(
+        name for ref, name in job["local_names"].items() if not relinked.get(ref)
+    )
+    failed = sum(1 for url in failures if url in job["remote_refs"])
+    with m.stage("manifest"):
+        stat = file_path.stat()
+        documents = job["documents"]
+        documents.record(
+            file_path.name,
+            version=job["version"],
+            base_url=base_url,
+            input_digest=job["input_digest"],
+            output_digest=hashlib.sha256(data).hexdigest(),
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            images=sorted(images),
+            failed=failed,
+        )
+        documents.save()
+    job["failed"] = len(failures)
+
     print("\n✅ 完成！")
 
 
-def main():
-    """命令行入口"""
-    if len(sys.argv) < 2:
-        print("用法: python organize_markdown.py <markdown文件路径> [base_url]")
+def _summarize(job: dict, metrics: Metrics | None) -> dict:
+    """处理摘要，启用指标时附加记录"""
+    file_path = job["file_path"]
+    if job["skipped"]:
+        entry = job["documents"].get(file_path.name) or {}
+        images = len(entry.get("images", []))
+    else:
+        images = len(job["urls"])
+    summary = {
+        "file": str(file_path),
+        "images": images,
+        "failed": job.get("failed", 0),
+        "seconds": time.perf_counter() - job["start"],
+        "skipped": job["skipped"],
+    }
+    if metrics is not None:
+        summary["metrics"] = metrics.to_dict()
+    return summary
+
+
+def _error_summary(file_path: str | Path, start: float, error: Exception) -> dict:
+    """处理出错的文件的摘要"""
+    return {
+        "file": str(file_path),
+        "images": 0,
+        "failed": 0,
+        "seconds": time.perf_counter() - start,
+        "skipped": False,
+        "status": "error",
+        "error": f"{type(error).__name__}: {error}",
+    }
+
+
+def pipeline_version(optimize: OptimizeOptions | None = None) -> str:
+    """
+    处理流程版本：规则版本、内容增强是否可用以及图片优化参数，
+    任一变化都会使清单记录失效
+    """
+    version = str(PIPELINE_VERSION)
+    if enhance_content is not None:
+        version += "+enhance"
+    if optimize is not None and image_optimizer_available():
+        version += f"+optimize:{optimize.signature}"
+    return version
+
+
+def find_markdown_files(targets: list[str]) -> list[Path]:
+    """
+    展开目录、glob 模式和文件路径为 markdown 文件列表（去重并排序）
+
+    目录会递归查找 .md 文件，跳过 BATCH_SKIP_DIRS 中的目录和隐藏目录。
+    """
+    found: set[Path] = set()
+    for target in targets:
+        path = Path(target).expanduser()
+        if path.is_dir():
+            for root, dirs, files in os.walk(path):
+                dirs[:] = [
+                    d
+                    for d in dirs
+                    if d not in BATCH_SKIP_DIRS and not d.startswith(".")
+                ]
+                for f in files:
+                    if f.endswith(".md"):
+                        found.add((Path(root) / f).resolve())
+        elif path.is_file():
+            found.add(path.resolve())
+        else:
+            for match in glob.glob(str(path), recursive=True):
+                if match.endswith(".md") and os.path.isfile(match):
+                    found.add(Path(match).resolve())
+    return sorted(found)
+
+
+def _init_batch_worker(args: argparse.Namespace) -> None:
+    """批量模式工作进程初始化：每个进程创建一次共享客户端和图片仓库"""
+    configure_from_args(args)
+    # 批量模式已按文件分配到多个进程，图片优化在工作进程内直接执行
+    configure_optimizer(jobs=1)
+
+
+def _organize_batch_item(
+    file_path: Path, base_url: str, args: argparse.Namespace
+) -> dict:
+    """批量模式中处理单个文件，捕获输出和异常，返回处理摘要"""
+    log = io.StringIO()
+    start = time.perf_counter()
+    try:
+        with redirect_stdout(log):
+            summary = organize_markdown(
+                file_path,
+                base_url,
+                args.max_workers,
+                args.per_host,
+                args.refresh,
+                args.force,
+                Metrics() if args.metrics else None,
+                optimize_from_args(args),
+            )
+        summary["status"] = "ok"
+    except Exception as e:
+        summary = _error_summary(file_path, start, e)
+    return summary
+
+
+def organize_batch(
+    files: list[Path],
+    base_url: str,
+    args: argparse.Namespace,
+    jobs: int | None = None,
+) -> list[dict]:
+    """
+    用进程池批量处理 markdown 文件
+
+    Args:
+        files: markdown 文件列表
+        base_url: 相对路径图片的基准 URL
+        args: 命令行参数（下载、仓库等配置，会传给每个工作进程）
+        jobs: 进程数，默认等于 CPU 核数
+
+    Returns:
+        每个文件的处理摘要，顺序与 files 一致
+    """
+    if not files:
+        return []
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(files)))
+    summaries = []
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_batch_worker, initargs=(args,)
+    ) as executor:
+        futures = [
+            executor.submit(_organize_batch_item, f, base_url, args) for f in files
+        ]
+        for i, future in enumerate(futures, 1):
+            summary = future.result()
+            mark = "✅" if summary["status"] == "ok" else "❌"
+            print(f"[{i}/{len(files)}] {mark} {summary['file']}")
+            summaries.append(summary)
+    return summaries
+
+
+def print_batch_summary(summaries: list[dict]) -> None:
+    """打印批量处理的逐文件摘要"""
+    print("\n📊 批量处理摘要")
+    for summary in summaries:
+        if summary["status"] == "ok" and summary["skipped"]:
+            print(f"  ⏭️ {summary['file']}  未变化，已跳过")
+        elif summary["status"] == "ok":
+            print(
+                f"  ✅ {summary['file']}  图片 {summary['images']}，"
+                f"失败 {summary['failed']}，耗时 {summary['seconds']:.2f}s"
+            )
+        else:
+            print(f"  ❌ {summary['file']}  {summary['error']}")
+
+    ok = sum(1 for s in summaries if s["status"] == "ok")
+    skipped = sum(1 for s in summaries if s["skipped"])
+    images = sum(s["images"] for s in summaries)
+    failed = sum(s["failed"] for s in summaries)
+    print(
+        f"\n共 {len(summaries)} 个文件：成功 {ok}（其中未变化跳过 {skipped}），"
+        f"出错 {len(summaries) - ok}；图片 {images} 张，下载失败 {failed} 张"
+    )
+
+
+def _watch_item(watcher, file_path: Path, base_url: str, args) -> dict:
+    """监视模式中处理单个文件，记录写回后的状态，变化时打印一行摘要"""
+    summary = _organize_batch_item(file_path, base_url, args)
+    watcher.mark(file_path)
+    stamp = time.strftime("%H:%M:%S")
+    if summary["status"] != "ok":
+        print(f"[{stamp}] ❌ {summary['file']}  {summary['error']}")
+    elif not summary["skipped"]:
         print(
-            "示例: python organize_markdown.py article.md https://example.com/article"
+            f"[{stamp}] ✅ {summary['file']}  图片 {summary['images']}，"
+            f"失败 {summary['failed']}，耗时 {summary['seconds']:.2f}s"
         )
-        sys.exit(1)
+    return summary
+
+
+def watch_documents(roots: list[Path], base_url: str, args) -> None:
+    """
+    监视目录树，处理新增或修改的 markdown 文件，直到按 Ctrl+C
+
+    先处理一遍已有文件（未变化的由文档处理清单跳过），之后每批变化都在当前
+    进程内逐个处理，共享的 HTTP 客户端、图片仓库和各类清单始终保持预热。
+    指定 --metrics 时每批处理后重写报告，包含本次监视处理过的所有文档。
+    """
+    from file_watcher import open_watcher
+
+    configure_from_args(args)
+    summaries: list[dict] = []
+
+    def process(files: list[Path]) -> None:
+        for file_path in files:
+            summary = _watch_item(watcher, file_path, base_url, args)
+            if not summary["skipped"]:
+                summaries.append(summary)
+        if args.metrics and summaries:
+            write_report(summaries, args.metrics, args.metrics_format)
+
+    watcher = open_watcher(roots, BATCH_SKIP_DIRS, args.poll, args.poll_interval)
+    with watcher:
+        files = watcher.snapshot()
+        print(
+            f"👀 监视 {len(roots)} 个目录（{watcher.kind}），"
+            f"已有 {len(files)} 个文件，按 Ctrl+C 结束"
+        )
+        try:
+            process(files)
+            for batch in watcher.batches(args.debounce):
+                process(batch)
+        except KeyboardInterrupt:
+            print(f"\n👋 停止监视，共处理 {len(summaries)} 次")
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(
+        description="组织和美化 markdown 文档，下载图片到本地 img 文件夹",
+        epilog=(
+            "示例: python organize_markdown.py article.md https://example.com/article\n"
+            "批量: python organize_markdown.py --batch docs/ 'notes/**/*.md'\n"
+            "监视: python organize_markdown.py --watch docs/"
+        ),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "targets",
+        nargs="+",
+        metavar="file_path [base_url]",
+        help=(
+            "markdown 文件路径和可选的原文章 URL；--batch 时为目录、glob 或文件，"
+            "--watch 时为目录"
+        ),
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="批量模式：处理目录、glob 匹配到的所有 .md 文件",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="批量模式的进程数（默认等于 CPU 核数）",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="监视模式：持续处理目录树中新增或修改的 .md 文件",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=DEFAULT_DEBOUNCE,
+        help=f"监视模式下最后一次写入后等待多少秒再处理（默认 {DEFAULT_DEBOUNCE:g}）",
+    )
+    parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="监视模式下按修改时间轮询，不使用 inotify",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=DEFAULT_POLL_INTERVAL,
+        help=f"轮询间隔秒数（默认 {DEFAULT_POLL_INTERVAL:g}）",
+    )
+    parser.add_argument(
+        "--base-url",
+        default="",
+        help="批量和监视模式下所有文件共用的原文章 URL",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=DEFAULT_MAX_WORKERS,
+        help=f"图片下载的全局最大并发数（默认 {DEFAULT_MAX_WORKERS}）",
+    )
+    parser.add_argument(
+        "--per-host",
+        type=int,
+        default=DEFAULT_PER_HOST_LIMIT,
+        help=f"同一主机的最大并发下载数（默认 {DEFAULT_PER_HOST_LIMIT}）",
+    )
+    parser.add_argument(
+        "--connect-timeout",
+        type=float,
+        default=DEFAULT_CONNECT_TIMEOUT,
+        help=f"建立连接的超时秒数（默认 {DEFAULT_CONNECT_TIMEOUT:g}）",
+    )
+    parser.add_argument(
+        "--read-timeout",
+        type=float,
+        default=DEFAULT_READ_TIMEOUT,
+        help=f"读取数据的超时秒数（默认 {DEFAULT_READ_TIMEOUT:g}）",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=DEFAULT_RETRIES,
+        help=f"临时失败的最大重试次数（默认 {DEFAULT_RETRIES}）",
+    )
+    parser.add_argument(
+        "--host-rate",
+        type=float,
+        default=DEFAULT_HOST_RATE,
+        help="单个主机每秒最多发起的请求数，0 表示不限制（默认 0）",
+    )
+    parser.add_argument(
+        "--failure-threshold",
+        type=int,
+        default=DEFAULT_FAILURE_THRESHOLD,
+        help=(
+            "同一主机连续失败多少次后熔断，其余图片直接保留原链接，"
+            f"0 表示不熔断（默认 {DEFAULT_FAILURE_THRESHOLD}）"
+        ),
+    )
+    parser.add_argument(
+        "--cooldown",
+        type=float,
+        default=DEFAULT_COOLDOWN,
+        help=f"熔断后多少秒再试探该主机（默认 {DEFAULT_COOLDOWN:g}）",
+    )
+    parser.add_argument(
+        "--max-retry-after",
+        type=float,
+        default=DEFAULT_MAX_RETRY_AFTER,
+        help=(
+            "被限流时愿意等待的最长 Retry-After 秒数，更长时直接熔断"
+            f"（默认 {DEFAULT_MAX_RETRY_AFTER:g}）"
+        ),
+    )
+    parser.add_argument(
+        "--max-bytes",
+        type=int,
+        default=DEFAULT_MAX_BYTES,
+        help=f"单张图片的最大字节数，0 表示不限制（默认 {DEFAULT_MAX_BYTES}）",
+    )
+    parser.add_argument(
+        "--store",
+        default=None,
+        help="全局内容寻址图片仓库目录（也可用环境变量 MARKDOWN_ORGANIZER_STORE）",
+    )
+    parser.add_argument(
+        "--link-mode",
+        choices=LINK_MODES,
+        default="auto",
+        help="从仓库填充 img 目录的方式（默认 auto：硬链接→reflink→符号链接→复制）",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="用 ETag / Last-Modified 条件请求检查已下载图片是否有更新",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="忽略文档处理清单，重新处理未变化的文档",
+    )
+    parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="下载后优化图片：缩小、重新压缩、去除元数据（需要 Pillow）",
+    )
+    parser.add_argument(
+        "--max-width",
+        type=int,
+        default=DEFAULT_MAX_WIDTH,
+        help=f"优化时的最大宽度，0 表示不缩放（默认 {DEFAULT_MAX_WIDTH}）",
+    )
+    parser.add_argument(
+        "--quality",
+        type=int,
+        default=DEFAULT_QUALITY,
+        help=f"优化时有损格式的压缩质量（默认 {DEFAULT_QUALITY}）",
+    )
+    parser.add_argument(
+        "--convert",
+        choices=CONVERT_FORMATS,
+        default="webp",
+        help="优化时额外尝试的目标格式，更小时才转换（默认 webp）",
+    )
+    parser.add_argument(
+        "--metrics",
+        default=None,
+        metavar="FILE",
+        help="把各阶段耗时、字节数和图片下载记录写入报告文件",
+    )
+    parser.add_argument(
+        "--metrics-format",
+        choices=METRICS_FORMATS,
+        default="json",
+        help="报告格式：json 或 jsonl（每个文档一行，默认 json）",
+    )
+    return parser
+
+
+def configure_from_args(args: argparse.Namespace) -> None:
+    """根据命令行参数配置共享客户端、主机健康跟踪器和图片仓库"""
+    # 连接池大小与单主机并发数保持一致，保证每个下载线程都能复用连接
+    configure_client(
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.read_timeout,
+        retries=args.retries,
+        pool_maxsize=max(args.per_host, 1),
+        max_bytes=args.max_bytes or None,
+    )
+    configure_host_health(
+        rate=args.host_rate,
+        burst=max(args.per_host, 1),
+        failure_threshold=args.failure_threshold,
+        cooldown=args.cooldown,
+        max_retry_after=args.max_retry_after,
+    )
+    # 未指定仓库时显式禁用，常驻进程中上一个请求的仓库设置不会沿用
+    store_root = args.store or os.environ.get(STORE_ENV_VAR)
+    configure_store(store_root or None, args.link_mode)
 
-    file_path = sys.argv[1]
-    base_url = sys.argv[2] if len(sys.argv) > 2 else ""
+
+def optimize_from_args(args: argparse.Namespace) -> OptimizeOptions | None:
+    """根据命令行参数生成图片优化参数，未指定 --optimize 时返回 None"""
+    if not args.optimize:
+        return None
+    return OptimizeOptions(args.max_width, args.quality, args.convert)
+
+
+def main(argv: list[str] | None = None):
+    """命令行入口，argv 为 None 时使用 sys.argv"""
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+
+    if args.watch:
+        if args.batch:
+            parser.error("--watch 与 --batch 不能同时使用")
+        roots = [Path(t).expanduser() for t in args.targets]
+        missing = [str(r) for r in roots if not r.is_dir()]
+        if missing:
+            parser.error(f"--watch 只接受目录: {', '.join(missing)}")
+        watch_documents(roots, args.base_url, args)
+        return
+
+    if args.batch:
+        files = find_markdown_files(args.targets)
+        if not files:
+            print(f"❌ 错误: 未找到 markdown 文件: {args.targets}", file=sys.stderr)
+            sys.exit(1)
+        print(f"📚 批量处理 {len(files)} 个文件...")
+        summaries = organize_batch(files, args.base_url, args, args.jobs)
+        print_batch_summary(summaries)
+        if args.metrics:
+            write_report(summaries, args.metrics, args.metrics_format)
+            print(f"\n📈 指标报告: {args.metrics}")
+        if any(s["status"] != "ok" for s in summaries):
+            sys.exit(1)
+        return
+
+    if len(args.targets) > 2:
+        parser.error("单文件模式只接受 <file_path> [base_url]，批量处理请使用 --batch")
+    file_path = args.targets[0]
+    base_url = args.targets[1] if len(args.targets) > 1 else args.base_url
 
     # 解析文件路径
     try:
@@ -279,7 +1539,20 @@ def main():
         print(f"❌ 错误: {e}", file=sys.stderr)
         sys.exit(1)
 
-    organize_markdown(resolved_path, base_url)
+    configure_from_args(args)
+    summary = organize_markdown(
+        resolved_path,
+        base_url,
+        args.max_workers,
+        args.per_host,
+        args.refresh,
+        args.force,
+        Metrics() if args.metrics else None,
+        optimize_from_args(args),
+    )
+    if args.metrics:
+        write_report([summary], args.metrics, args.metrics_format)
+        print(f"\n📈 指标报告: {args.metrics}")
 
 
 if __name__ == "__main__":
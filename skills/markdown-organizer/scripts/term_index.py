@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+语料级术语索引：按 TF-IDF 排序文档的关键术语和章节主题词
+
+extract_key_terms 默认按首次出现的顺序截取前 15 个术语，各文档都会出现的
+泛用词（API、print 之类）和真正有区分度的术语同等对待。索引对一棵文档树
+统计每个术语出现在多少篇文档中（文档频率），单篇文档的术语按
+    (1 + ln 词频) × (ln((1 + 文档总数) / (1 + 文档频率)) + 1)
+排序（词频取对数，避免反复出现的泛用词压过稀有术语），只需查询该文档自己
+的术语，与语料规模无关。
+
+索引保存在文档树根目录的 .term-index.sqlite3 中，同时记录每篇文档的术语和
+词频（按首次出现的顺序）以及建立索引时的大小和修改时间。建立时用进程池并行
+统计所有文档；之后可以逐篇添加、更新或删除，也可以用 sync 只处理有变化的
+文档，不需要重建。enhance_content.py 分析文档时会向上查找所在目录树的索引，
+找到时自动使用（只读，索引由 build / sync / add / remove 维护）。
+
+用法:
+    python term_index.py build <目录> [--jobs N]      # 重建索引
+    python term_index.py sync <目录> [--jobs N]       # 只更新有变化的文档
+    python term_index.py add|remove <文件...>
+    python term_index.py terms <文件> [--limit 15]    # 按 TF-IDF 排序的关键术语
+"""
+
+import argparse
+import math
+import os
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+
+from enhance_content import KEY_TERMS_LIMIT, count_document_terms
+
+INDEX_FILENAME = ".term-index.sqlite3"
+
+# 术语统计规则（count_document_terms）变化时修改，旧索引会被清空后重建
+INDEX_VERSION = "1"
+
+# 索引的术语种类：count_document_terms 返回的键
+TERM_KINDS = ("terms", "headings")
+
+_SQL_VARIABLES = 500  # 每条 IN (...) 查询的参数个数
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    doc INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    term TEXT NOT NULL,
+    tf INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (doc, kind, term)
+);
+CREATE TABLE IF NOT EXISTS frequencies (
+    kind TEXT NOT NULL,
+    term TEXT NOT NULL,
+    df INTEGER NOT NULL,
+    PRIMARY KEY (kind, term)
+);
+"""
+
+
+class TermIndex:
+    """
+    一棵文档树的术语文档频率索引
+
+    Args:
+        path: 索引文件（SQLite），文档路径相对其所在目录保存
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path).resolve()
+        self.root = self.path.parent
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT value FROM meta WHERE key = 'version'"
+            ).fetchone()
+            if row is None or row[0] != INDEX_VERSION:
+                self._clear()
+
+    def _key(self, file_path: str | Path) -> str:
+        """文档在索引中的路径（相对索引目录）"""
+        path = Path(file_path).resolve()
+        try:
+            return path.relative_to(self.root).as_posix()
+        except ValueError:
+            raise ValueError(f"{path} 不在索引目录 {self.root} 下") from None
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._db.execute("SELECT COUNT(*) FROM documents").fetchone()
+        return count
+
+    def is_current(self, file_path: str | Path) -> bool:
+        """文档已索引，且大小和修改时间与索引时相同"""
+        try:
+            stat = Path(file_path).stat()
+        except OSError:
+            return False
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime_ns FROM documents WHERE path = ?",
+                (self._key(file_path),),
+            ).fetchone()
+        return row is not None and row == (stat.st_size, stat.st_mtime_ns)
+
+    def add(self, file_path: str | Path, counts: dict | None = None) -> None:
+        """
+        添加或更新一篇文档
+
+        Args:
+            file_path: 文档路径
+            counts: count_document_terms 的结果，None 时现在统计
+        """
+        stat = Path(file_path).stat()
+        if counts is None:
+            counts = count_document_terms(file_path)
+        key = self._key(file_path)
+        with self._lock, self._db:
+            self._remove(key)
+            cursor = self._db.execute(
+                "INSERT INTO documents (path, size, mtime_ns) VALUES (?, ?, ?)",
+                (key, stat.st_size, stat.st_mtime_ns),
+            )
+            doc = cursor.lastrowid
+            for kind in TERM_KINDS:
+                terms = counts.get(kind, {})
+                self._db.executemany(
+                    "INSERT INTO postings VALUES (?, ?, ?, ?, ?)",
+                    (
+                        (doc, kind, term, tf, position)
+                        for position, (term, tf) in enumerate(terms.items())
+                    ),
+                )
+                self._db.executemany(
+                    "INSERT INTO frequencies VALUES (?, ?, 1) "
+                    "ON CONFLICT (kind, term) DO UPDATE SET df = df + 1",
+                    ((kind, term) for term in terms),
+                )
+
+    def remove(self, file_path: str | Path) -> bool:
+        """删除一篇文档，返回它是否在索引中"""
+        with self._lock, self._db:
+            return self._remove(self._key(file_path))
+
+    def _remove(self, key: str) -> bool:
+        row = self._db.execute(
+            "SELECT id FROM documents WHERE path = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return False
+        (doc,) = row
+        self._db.execute(
+            "UPDATE frequencies SET df = df - 1 WHERE (kind, term) IN "
+            "(SELECT kind, term FROM postings WHERE doc = ?)",
+            (doc,),
+        )
+        self._db.execute("DELETE FROM frequencies WHERE df <= 0")
+        self._db.execute("DELETE FROM postings WHERE doc = ?", (doc,))
+        self._db.execute("DELETE FROM documents WHERE id = ?", (doc,))
+        return True
+
+    def update(self, file_path: str | Path) -> bool:
+        """
+        文档有变化时重新统计，文件已删除时从索引中删除
+
+        Returns:
+            索引是否发生了变化
+        """
+        if not Path(file_path).exists():
+            return self.remove(file_path)
+        if self.is_current(file_path):
+            return False
+        self.add(file_path)
+        return True
+
+    def sync(self, files: list[Path], jobs: int | None = None) -> dict:
+        """
+        让索引与 files 一致：统计新增和有变化的文档，删除不在 files 中的文档
+
+        Args:
+            files: 文档树中当前的全部 markdown 文件
+            jobs: 统计术语的进程数，默认等于 CPU 核数
+
+        Returns:
+            {"added": 新增或更新的文档数, "removed": 删除的文档数}
+        """
+        keys = {self._key(f): f for f in files}
+        with self._lock:
+            indexed = {
+                path for (path,) in self._db.execute("SELECT path FROM documents")
+            }
+        gone = indexed - keys.keys()
+        with self._lock, self._db:
+            for key in gone:
+                self._remove(key)
+
+        stale = [f for f in files if not self.is_current(f)]
+        for file_path, counts in zip(stale, _count_all(stale, jobs)):
+            self.add(file_path, counts)
+        return {"added": len(stale), "removed": len(gone)}
+
+    def rank(self, kind: str, counts: dict[str, int], limit: int) -> list[str]:
+        """
+        按 TF-IDF 排序一篇文档的术语
+
+        Args:
+            kind: 术语种类（TERM_KINDS 之一）
+            counts: 术语 → 该文档中的出现次数，分数相同时保持其中的顺序
+            limit: 返回的最大数量
+        """
+        if not counts:
+            return []
+        terms = list(counts)
+        with self._lock:
+            (total,) = self._db.execute("SELECT COUNT(*) FROM documents").fetchone()
+            df: dict[str, int] = {}
+            for i in range(0, len(terms), _SQL_VARIABLES):
+                batch = terms[i : i + _SQL_VARIABLES]
+                marks = ",".join("?" * len(batch))
+                df.update(
+                    self._db.execute(
+                        "SELECT term, df FROM frequencies "
+                        f"WHERE kind = ? AND term IN ({marks})",
+                        (kind, *batch),
+                    )
+                )
+
+        def score(term: str) -> float:
+            # 平滑的逆文档频率：未索引的术语文档频率为 0，区分度最高
+            idf = math.log((1 + total) / (1 + df.get(term, 0))) + 1
+            return (1 + math.log(counts[term])) * idf
+
+        # sorted 是稳定排序，分数相同的术语保持 counts 中的顺序
+        return sorted(terms, key=score, reverse=True)[:limit]
+
+    def postings(self, file_path: str | Path, kind: str) -> dict[str, int] | None:
+        """索引中一篇文档的 术语 → 出现次数（按首次出现的顺序），未索引时返回 None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id FROM documents WHERE path = ?", (self._key(file_path),)
+            ).fetchone()
+            if row is None:
+                return None
+            return dict(
+                self._db.execute(
+                    "SELECT term, tf FROM postings WHERE doc = ? AND kind = ? "
+                    "ORDER BY position",
+                    (row[0], kind),
+                )
+            )
+
+    def key_terms(
+        self,
+        file_path: str | Path,
+        limit: int = KEY_TERMS_LIMIT,
+        counts: dict | None = None,
+    ) -> list[str] | None:
+        """
+        按 TF-IDF 排序的关键术语，只读取索引，不修改它
+
+        文档已索引且未变化时使用索引中的词频；未索引或已变化时用 counts
+        （count_document_terms 的结果，None 时现在统计）与索引中的文档频率排序。
+
+        Returns:
+            术语列表；文档不在索引目录下或已不存在时返回 None
+        """
+        try:
+            terms = None
+            if self.is_current(file_path):
+                terms = self.postings(file_path, "terms")
+            if terms is None:
+                if counts is None:
+                    counts = count_document_terms(file_path)
+                terms = counts["terms"]
+            return self.rank("terms", terms, limit)
+        except (ValueError, OSError, sqlite3.Error):
+            return None
+
+    def _clear(self) -> None:
+        self._db.execute("DELETE FROM postings")
+        self._db.execute("DELETE FROM frequencies")
+        self._db.execute("DELETE FROM documents")
+        self._db.execute(
+            "INSERT OR REPLACE INTO meta VALUES ('version', ?)", (INDEX_VERSION,)
+        )
+
+    def clear(self) -> None:
+        """清空索引"""
+        with self._lock, self._db:
+            self._clear()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def _count_all(files: list[Path], jobs: int | None = None):
+    """逐个产出 files 的术语统计，文件较多时用进程池并行"""
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(files)))
+    if jobs == 1:
+        yield from map(count_document_terms, files)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    chunksize = max(1, len(files) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(count_document_terms, files, chunksize=chunksize)
+
+
+def build_index(
+    root: str | Path, files: list[Path], jobs: int | None = None
+) -> TermIndex:
+    """为 root 下的 files 重建索引（保存在 root/INDEX_FILENAME）"""
+    index = TermIndex(Path(root) / INDEX_FILENAME)
+    index.clear()
+    index.sync(files, jobs)
+    return index
+
+
+_open_indexes: dict[Path, TermIndex | None] = {}
+_index_lock = threading.Lock()
+
+
+def find_index(file_path: str | Path) -> TermIndex | None:
+    """
+    从文档所在目录向上查找 INDEX_FILENAME，找到时打开（进程内复用）
+
+    Returns:
+        索引；没有索引或索引无法打开时返回 None
+    """
+    for directory in Path(file_path).resolve().parents:
+        path = directory / INDEX_FILENAME
+        if not path.is_file():
+            continue
+        with _index_lock:
+            if path not in _open_indexes:
+                try:
+                    _open_indexes[path] = TermIndex(path)
+                except sqlite3.Error:
+                    # 索引损坏时不使用索引
+                    _open_indexes[path] = None
+            return _open_indexes[path]
+    return None
+
+
+def _open_for(file_path: str, index_path: str | None) -> TermIndex:
+    if index_path:
+        return TermIndex(index_path)
+    index = find_index(file_path)
+    if index is None:
+        sys.exit(f"❌ 错误: 未找到 {file_path} 所在目录树的术语索引，请先运行 build")
+    return index
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="语料级术语索引（TF-IDF）")
+    parser.add_argument("command", choices=("build", "sync", "add", "remove", "terms"))
+    parser.add_argument("paths", nargs="+", help="build / sync 为目录，其他为文件")
+    parser.add_argument("--jobs", type=int, default=None, help="统计术语的进程数")
+    parser.add_argument(
+        "--index",
+        default=None,
+        help=f"索引文件（默认：目录下的 {INDEX_FILENAME}，或向上查找）",
+    )
+    parser.add_argument(
+        "--limit", type=int, default=KEY_TERMS_LIMIT, help="terms 输出的最大数量"
+    )
+    args = parser.parse_args()
+
+    # 与批量模式相同的查找规则：跳过 img、隐藏目录等
+    from organize_markdown import find_markdown_files
+
+    if args.command in ("build", "sync"):
+        if len(args.paths) != 1 or not Path(args.paths[0]).is_dir():
+            parser.error(f"{args.command} 需要一个目录")
+        root = Path(args.paths[0]).resolve()
+        files = find_markdown_files([str(root)])
+        if args.command == "build":
+            index = build_index(root, files, args.jobs)
+            print(f"✅ 已索引 {len(index)} 篇文档: {index.path}")
+        else:
+            index = TermIndex(args.index or root / INDEX_FILENAME)
+            result = index.sync(files, args.jobs)
+            print(
+                f"✅ 更新 {result['added']} 篇，删除 {result['removed']} 篇，"
+                f"共 {len(index)} 篇文档"
+            )
+    elif args.command == "terms":
+        file_path = args.paths[0]
+        terms = _open_for(file_path, args.index).key_terms(file_path, args.limit)
+        if terms is None:
+            sys.exit(f"❌ 错误: {file_path} 不在索引目录下")
+        print(", ".join(terms) or "无")
+    else:
+        for file_path in args.paths:
+            index = _open_for(file_path, args.index)
+            try:
+                if args.command == "add":
+                    index.add(file_path)
+                    print(f"✅ 已添加: {file_path}")
+                elif index.remove(file_path):
+                    print(f"✅ 已删除: {file_path}")
+                else:
+                    print(f"⏭️ 不在索引中: {file_path}")
+            except (ValueError, OSError) as e:
+                print(f"❌ 错误: {e}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+常驻 worker：用 JSON-lines 协议处理 organize / analyze / suggest / enhance 请求
+
+每次直接运行脚本都要启动解释器、导入 requests、编译正则，并丢掉已建立的
+HTTP 连接和各类缓存。worker 只启动一次：共享的 HTTP 连接池、图片仓库、
+分析缓存和编译好的匹配器在请求之间保持可用。
+
+请求（每行一个 JSON 对象）：
+    {"id": 1, "command": "organize", "args": ["doc.md", "--force"],
+     "cwd": "/path", "env": {"CLAUDE_WORKING_DIR": "..."}}
+    env 中没有的转发变量（见 worker_client.FORWARDED_ENV）在请求期间视为未设置。
+    command 为 organize / analyze / suggest / enhance 时，args 与对应脚本的
+    命令行参数相同（analyze 等不含 --analyze 本身）；另有 ping 和 shutdown。
+
+响应（每行一个 JSON 对象，id 与请求相同）：
+    {"id", "event": "output", "stream": "stdout" | "stderr", "text"}  流式输出
+    {"id", "event": "done", "exit_code", "seconds", "result"}        请求结束
+    {"id", "event": "error", "error"}                                请求无效
+
+请求按到达顺序逐个执行（单个 organize 内部的图片下载仍然并发）。
+
+用法:
+    python worker.py --stdio                      # 从 stdin 读请求，结果写到 stdout
+    python worker.py --socket [路径] [--idle-timeout 秒]
+"""
+
+import argparse
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from contextlib import contextmanager, redirect_stderr, redirect_stdout
+from pathlib import Path
+
+import enhance_content
+import organize_markdown
+from fetch_client import get_client
+from worker_client import COMMANDS, FORWARDED_ENV, default_socket_path
+
+DEFAULT_IDLE_TIMEOUT = 1800  # 套接字模式空闲多久后退出（秒），0 表示不退出
+
+
+class _EventWriter(io.TextIOBase):
+    """把写入的文本按行转换为 output 事件（下载线程也会打印，需要加锁）"""
+
+    def __init__(self, emit, request_id, stream: str):
+        self._emit = emit
+        self._id = request_id
+        self._stream = stream
+        self._buffer = ""
+        self._lock = threading.Lock()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        with self._lock:
+            self._buffer += text
+            if "\n" in self._buffer:
+                complete, _, self._buffer = self._buffer.rpartition("\n")
+                self._send(complete + "\n")
+        return len(text)
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._buffer:
+                self._send(self._buffer)
+                self._buffer = ""
+
+    def _send(self, text: str) -> None:
+        self._emit(
+            {"id": self._id, "event": "output", "stream": self._stream, "text": text}
+        )
+
+
+class Worker:
+    """执行请求，事件通过每个请求的 emit 回调（负责序列化和发送）返回"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.last_active = time.monotonic()
+        self.stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def handle(self, message: dict, emit) -> None:
+        """处理一个请求"""
+        request_id = message.get("id")
+        command = message.get("command")
+        args = message.get("args", [])
+
+        if command in ("ping", "shutdown"):
+            if command == "shutdown":
+                self.stopping.set()
+            emit(_done(request_id, 0, 0.0, self.status()))
+            return
+        if command not in COMMANDS:
+            emit(_error(request_id, f"未知命令: {command}"))
+            return
+        if not isinstance(args, list) or not all(isinstance(a, str) for a in args):
+            emit(_error(request_id, "args 必须是字符串列表"))
+            return
+
+        # 工作目录、环境变量和标准输出都是进程级的，请求逐个执行
+        with self._lock:
+            self.requests += 1
+            start = time.perf_counter()
+            stdout = _EventWriter(emit, request_id, "stdout")
+            stderr = _EventWriter(emit, request_id, "stderr")
+            try:
+                with _request_context(message.get("cwd"), message.get("env") or {}):
+                    with redirect_stdout(stdout), redirect_stderr(stderr):
+                        exit_code = _run(command, args)
+            except FileNotFoundError as e:
+                stderr.write(f"❌ 错误: {e}\n")
+                exit_code = 1
+            finally:
+                stdout.flush()
+                stderr.flush()
+                self.last_active = time.monotonic()
+            emit(_done(request_id, exit_code, time.perf_counter() - start))
+
+    def status(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "requests": self.requests,
+            "uptime": time.time() - self.started,
+        }
+
+
+def _done(request_id, exit_code: int, seconds: float, result=None) -> dict:
+    return {
+        "id": request_id,
+        "event": "done",
+        "exit_code": exit_code,
+        "seconds": seconds,
+        "result": result,
+    }
+
+
+def _error(request_id, error: str) -> dict:
+    return {"id": request_id, "event": "error", "error": error}
+
+
+def _run(command: str, args: list[str]) -> int:
+    """调用对应脚本的 main，返回退出码（未捕获的异常打印到 stderr）"""
+    script, prefix = COMMANDS[command]
+    main = organize_markdown.main if command == "organize" else enhance_content.main
+    # argparse 用 sys.argv[0] 作为用法说明中的程序名
+    saved_argv = sys.argv
+    sys.argv = [script, *prefix, *args]
+    try:
+        main([*prefix, *args])
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    except Exception as e:
+        print(f"❌ {type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+    finally:
+        sys.argv = saved_argv
+    return 0
+
+
+@contextmanager
+def _request_context(cwd: str | None, env: dict):
+    """
+    请求期间切换工作目录和环境变量，结束后恢复
+
+    FORWARDED_ENV 中客户端没有发送的变量在请求期间删除，否则会沿用 worker
+    启动时的环境（例如启动时设置的图片仓库）。
+    """
+    saved_cwd = os.getcwd()
+    keys = {*FORWARDED_ENV, *env}
+    saved_env = {key: os.environ.get(key) for key in keys}
+    try:
+        if cwd:
+            os.chdir(cwd)
+        for key in keys:
+            if key in env:
+                os.environ[key] = str(env[key])
+            else:
+                os.environ.pop(key, None)
+        yield
+    finally:
+        os.chdir(saved_cwd)
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def _parse(line: str):
+    """解析一行请求，无效时返回 (None, 错误信息)"""
+    try:
+        message = json.loads(line)
+    except json.JSONDecodeError as e:
+        return None, f"无效的 JSON: {e}"
+    if not isinstance(message, dict):
+        return None, "请求必须是 JSON 对象"
+    return message, None
+
+
+def serve_stdio(worker: Worker) -> None:
+    """从 stdin 逐行读取请求，事件写到 stdout，直到 EOF 或 shutdown"""
+    out = sys.stdout
+    out_lock = threading.Lock()
+
+    def emit(event: dict) -> None:
+        with out_lock:
+            out.write(json.dumps(event, ensure_ascii=False) + "\n")
+            out.flush()
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        message, error = _parse(line)
+        if message is None:
+            emit(_error(None, error))
+            continue
+        worker.handle(message, emit)
+        if worker.stopping.is_set():
+            break
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        worker: Worker = self.server.worker
+        send_lock = threading.Lock()
+
+        def emit(event: dict) -> None:
+            data = json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n"
+            with send_lock:
+                try:
+                    self.wfile.write(data)
+                    self.wfile.flush()
+                except OSError:
+                    pass  # 客户端已断开，请求仍执行完
+
+        for raw in self.rfile:
+            line = raw.decode("utf-8", errors="replace")
+            if not line.strip():
+                continue
+            message, error = _parse(line)
+            if message is None:
+                emit(_error(None, error))
+                continue
+            worker.handle(message, emit)
+            if worker.stopping.is_set():
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve_socket(worker: Worker, path: Path, idle_timeout: float) -> None:
+    """在 Unix 套接字上服务，空闲超过 idle_timeout 秒或收到 shutdown 时退出"""
+    if path.exists():
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(path))
+        except OSError:
+            path.unlink()  # 上次异常退出留下的套接字文件
+        else:
+            probe.close()
+            sys.exit(f"❌ worker 已在运行: {path}")
+
+    server = _Server(str(path), _Handler)
+    server.worker = worker
+    os.chmod(path, 0o600)
+
+    def watch_idle():
+        while not worker.stopping.wait(10):
+            if idle_timeout and time.monotonic() - worker.last_active > idle_timeout:
+                worker.stopping.set()
+                server.shutdown()
+
+    threading.Thread(target=watch_idle, daemon=True).start()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        path.unlink(missing_ok=True)
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="常驻 worker（JSON-lines 协议）")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--stdio", action="store_true", help="从 stdin 读取请求")
+    mode.add_argument(
+        "--socket",
+        nargs="?",
+        const="",
+        metavar="路径",
+        help=f"监听 Unix 套接字（默认 {default_socket_path()}）",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=DEFAULT_IDLE_TIMEOUT,
+        help=f"套接字模式空闲多少秒后退出，0 表示不退出（默认 {DEFAULT_IDLE_TIMEOUT}）",
+    )
+    args = parser.parse_args()
+
+    # 预先导入 requests 并创建连接池会话，第一个请求不再付出这部分开销
+    get_client().session
+    worker = Worker()
+    if args.stdio:
+        serve_stdio(worker)
+    else:
+        path = Path(args.socket) if args.socket else default_socket_path()
+        serve_socket(worker, path, args.idle_timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+worker 客户端：把命令行调用转发给常驻的 worker 进程
+
+worker（worker.py）在运行时，通过 Unix 套接字发送一行 JSON 请求，把 worker
+流式返回的输出原样写到 stdout / stderr，并以 worker 给出的退出码结束；worker
+未运行时直接执行原脚本，行为与直接调用相同。本模块只依赖标准库，启动开销
+很小。
+
+用法:
+    python worker_client.py organize <file_path> [base_url] [选项...]
+    python worker_client.py analyze|suggest|enhance <file_path> [--no-cache] [--terms]
+    python worker_client.py start|stop|status
+"""
+
+import json
+import os
+import socket
+import sys
+import time
+from pathlib import Path
+
+from file_index import get_cache_dir
+
+# 环境变量：worker 套接字路径（默认 <缓存目录>/worker/worker.sock）
+SOCKET_ENV_VAR = "MARKDOWN_ORGANIZER_WORKER"
+
+# 命令 → (脚本, 追加在参数前的选项)
+COMMANDS = {
+    "organize": ("organize_markdown.py", []),
+    "analyze": ("enhance_content.py", ["--analyze"]),
+    "suggest": ("enhance_content.py", ["--suggest"]),
+    "enhance": ("enhance_content.py", ["--enhance"]),
+}
+
+# 随请求转发给 worker 的环境变量（影响文件查找、图片仓库和缓存目录）；
+# 客户端未设置的变量在 worker 处理该请求期间同样视为未设置
+FORWARDED_ENV = (
+    "CLAUDE_WORKING_DIR",
+    "MARKDOWN_ORGANIZER_STORE",
+    "MARKDOWN_ORGANIZER_CACHE",
+)
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+
+def default_socket_path() -> Path:
+    """worker 套接字路径"""
+    path = os.environ.get(SOCKET_ENV_VAR)
+    if path:
+        return Path(path).expanduser()
+    return get_cache_dir("worker") / "worker.sock"
+
+
+def connect(path: Path | None = None, timeout: float | None = None):
+    """连接 worker，未运行时返回 None"""
+    path = path or default_socket_path()
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(str(path))
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def request(sock: socket.socket, message: dict):
+    """发送一个请求，逐个产出 worker 返回的事件，直到 done / error"""
+    sock.sendall(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+    with sock.makefile("r", encoding="utf-8") as lines:
+        for line in lines:
+            event = json.loads(line)
+            yield event
+            if event.get("event") in ("done", "error"):
+                return
+    raise ConnectionError("worker 连接意外关闭")
+
+
+def forward(command: str, args: list[str]) -> int | None:
+    """
+    把一次命令行调用转发给 worker
+
+    Returns:
+        退出码；worker 未运行时返回 None
+    """
+    sock = connect()
+    if sock is None:
+        return None
+    message = {
+        "id": os.getpid(),
+        "command": command,
+        "args": args,
+        "cwd": os.getcwd(),
+        "env": {k: os.environ[k] for k in FORWARDED_ENV if k in os.environ},
+    }
+    with sock:
+        for event in request(sock, message):
+            kind = event.get("event")
+            if kind == "output":
+                stream = sys.stderr if event.get("stream") == "stderr" else sys.stdout
+                stream.write(event["text"])
+                stream.flush()
+            elif kind == "error":
+                print(f"❌ worker 错误: {event['error']}", file=sys.stderr)
+                return 2
+            elif kind == "done":
+                return event["exit_code"]
+    return 1
+
+
+def run_locally(command: str, args: list[str]) -> None:
+    """worker 未运行时直接执行原脚本（替换当前进程）"""
+    script, prefix = COMMANDS[command]
+    argv = [sys.executable, str(SCRIPTS_DIR / script), *prefix, *args]
+    os.execv(sys.executable, argv)
+
+
+def start(wait: float = 10.0) -> bool:
+    """在后台启动 worker（已运行时直接返回），等待其开始监听"""
+    import subprocess
+
+    sock = connect()
+    if sock is not None:
+        sock.close()
+        return True
+    subprocess.Popen(
+        [sys.executable, str(SCRIPTS_DIR / "worker.py"), "--socket"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        sock = connect()
+        if sock is not None:
+            sock.close()
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def control(command: str) -> dict | None:
+    """发送 ping / shutdown，返回 done 事件；worker 未运行时返回 None"""
+    sock = connect(timeout=10)
+    if sock is None:
+        return None
+    try:
+        with sock:
+            events = list(request(sock, {"id": 0, "command": command}))
+    except OSError:
+        # worker 正在退出
+        return None
+    return events[-1]
+
+
+def main():
+    """命令行入口"""
+    if len(sys.argv) < 2 or sys.argv[1] not in (*COMMANDS, "start", "stop", "status"):
+        print(__doc__.strip().split("用法:")[1].strip("\n"))
+        sys.exit(1)
+
+    command, args = sys.argv[1], sys.argv[2:]
+    if command == "start":
+        if not start():
+            print("❌ worker 启动失败", file=sys.stderr)
+            sys.exit(1)
+        print(f"✅ worker 已运行: {default_socket_path()}")
+    elif command == "stop":
+        print("✅ worker 已停止" if control("shutdown") else "worker 未运行")
+    elif command == "status":
+        done = control("ping")
+        if done is None:
+            print("worker 未运行")
+            sys.exit(1)
+        result = done["result"]
+        print(
+            f"worker 运行中: pid {result['pid']}，已处理 {result['requests']} 个请求，"
+            f"运行 {result['uptime']:.0f} 秒"
+        )
+    else:
+        exit_code = forward(command, args)
+        if exit_code is None:
+            run_locally(command, args)
+        sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()